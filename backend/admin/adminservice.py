@@ -1,58 +1,38 @@
 import base64
+import binascii
+import json
 import logging
 import uuid
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
+from itertools import islice
+from typing import BinaryIO, Optional, Dict, Any
+from sqlalchemy import or_, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 
 from backend.admin.model import Admin, AdminAuditLog
+from backend.database.config import SessionLocal, estimate_count
+from backend.database.routing import read_only
+from backend.security.config import settings
 from backend.student.model import Student
+from backend.student.backfill import MATRIC_INDEX, matric_is_unique
+from backend.student.blobstore import photo_store
+from backend.student.pages import student_pages
+from backend.student.bulk import merge_students, read_import_rows, staged_values
+from backend.student.thumbnails import THUMBNAIL_MEDIA_TYPE, thumbnail_path, thumbnail_size
+from backend.student.search import find_students
+from backend.student.suggest import refresh_suggest_index, suggest_from_database, suggest_index
+from backend.student.upload import PhotoUpload, prepare_photo
+from backend.student.util import (
+    StudentImage, decode_image_data, encode_student_qr, etag_matches, set_student_photo, student_etag, student_filter
+)
 
 logger = logging.getLogger(__name__)
 
-def process_image_data(base64_data: str) -> str:
-    """
-    Validate and process base64-encoded image data for storage in the database.
-    The input should be a string that may include a header (e.g., "data:image/jpeg;base64,...").
-
-    Args:
-        base64_data (str): The base64-encoded image data.
-
-    Returns:
-        str: The validated base64 image data.
-
-    Raises:
-        ValueError: If the image data is not valid base64.
-    """
-    # Return empty string for None or empty input
-    if not base64_data:
-        return ""
-        
-    # Optionally split header and encoded parts
-    if ',' in base64_data:
-        header, encoded = base64_data.split(',', 1)
-        # Validate the header format
-        if not header.startswith('data:image/') or not header.endswith(';base64'):
-            raise ValueError("Invalid image data format. Must be a valid image data URL.")
-    else:
-        header, encoded = '', base64_data
-
-    # Attempt to decode to validate that it's proper base64 data
-    try:
-        decoded_data = base64.b64decode(encoded)
-        # Validate that we have actual image data of reasonable size
-        if len(decoded_data) < 10:  # Extremely small data is suspicious
-            raise ValueError("Image data too small to be valid")
-        if len(decoded_data) > 10 * 1024 * 1024:  # Limit to 10MB
-            raise ValueError("Image data exceeds maximum size of 10MB")
-        
-        # Return the original data with validation passed
-        return base64_data
-    except Exception as e:
-        raise ValueError(f"Invalid base64 image data: {str(e)}")
-
 def validate_student_data(data: Dict[str, Any]) -> None:
     """
     Validate student data to ensure all required fields are present and valid.
@@ -78,16 +58,83 @@ def validate_student_data(data: Dict[str, Any]) -> None:
     if data['gender'] not in ['M', 'F', 'Male', 'Female', 'Other']:
         raise ValueError("Gender must be one of: M, F, Male, Female, Other")
 
+def _is_matric_conflict(error: IntegrityError) -> bool:
+    """Whether an insert / update was rejected by the unique Matric index."""
+    orig = error.orig
+    if getattr(orig, "sqlstate", None) == "23505":
+        # asyncpg's own exception, with the constraint name, is the cause of the adapted one
+        return getattr(orig.__cause__, "constraint_name", None) == MATRIC_INDEX
+    # SQLite (tests, local runs) names the column instead
+    return "UNIQUE constraint failed: Student.Matric" in str(orig)
+
+
+def _check_if_match(student: Student, if_match: Optional[str]) -> None:
+    """412 if an If-Match header was sent and doesn't name the student's current version."""
+    if if_match is not None and not etag_matches(if_match, student_etag(student)):
+        raise HTTPException(status_code=412, detail="Student has changed since it was read; reload and try again")
+
+
+def _stale_write(student_matric: str, if_match: Optional[str]) -> HTTPException:
+    """
+    The error for a write that lost a race (another admin's change committed
+    between the read and the write): 412 for a conditional request, else 409.
+    """
+    status_code = 412 if if_match is not None else 409
+    return HTTPException(
+        status_code=status_code,
+        detail=f"Student {student_matric} was changed by someone else; reload and try again"
+    )
+
+
+# Sort orders for the paginated listing; each is also its keyset
+STUDENT_LIST_ORDERS = ("id", "course")
+
+# Columns the listing returns (StudentResponse), so image data is never loaded
+STUDENT_LIST_COLUMNS = (
+    Student.id, Student.Matric, Student.Firstname, Student.Lastname, Student.gender,
+    Student.course, Student.level, Student.section, Student.qr_code, Student.has_image,
+)
+
+
+def encode_cursor(order: str, student: Student) -> str:
+    """Opaque cursor pointing just after student in the given order."""
+    key = {"o": order, "id": student.id}
+    if order == "course":
+        key["course"] = student.course
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order: str) -> Dict[str, Any]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors or another order."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, dict) or key.get("o") != order or not isinstance(key.get("id"), int):
+        raise ValueError("Invalid cursor for this sort order")
+    # A NULL course is encoded as null (those students sort last)
+    if order == "course" and ("course" not in key or not isinstance(key["course"], (str, type(None)))):
+        raise ValueError("Invalid cursor for this sort order")
+    return key
+
+
 class AdminStudentService:
-    """Service for admin operations on student records."""
+    """
+    Service for admin operations on student records.
+
+    Methods are coroutines on an AsyncSession. Photo processing, QR encoding
+    and file access run in worker threads, so none of them blocks the event
+    loop; helpers written for a sync Session (search, estimates) go through
+    AsyncSession.run_sync. Methods marked read_only may read from a replica.
+    """
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
         self.logger = logging.getLogger(__name__)
 
-    def register_student(self, data: Dict[str, Any], admin_user: Admin) -> Student:
+    async def register_student(self, data: Dict[str, Any], admin_user: Admin) -> Student:
         """
-        Register a new student, including processing the image to store it as a base64 string.
+        Register a new student, saving the photo (if any) to the photo blob store.
 
         Args:
             data: Student data dictionary.
@@ -111,28 +158,17 @@ class AdminStudentService:
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
         
+        # Decode, validate and normalize the photo before taking any locks
+        photo = None
+        if data.get("image"):
+            try:
+                photo = await run_in_threadpool(prepare_photo, data["image"])
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
         # Start explicit transaction
         try:
-            # Acquire row lock when checking for duplicate to prevent race conditions
-            existing_student = self.db.query(Student).filter(
-                Student.Matric == data['Matric']
-            ).with_for_update().first()
-            
-            if existing_student:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Student '{data['Matric']}' is already registered"
-                )
-            
-            # Process image data if provided
-            image_data = ""
-            if "image" in data and data["image"]:
-                try:
-                    image_data = process_image_data(data["image"])
-                except ValueError as e:
-                    # Explicitly raise an HTTP exception with the validation error
-                    raise HTTPException(status_code=400, detail=str(e))
-            
+            await self._check_matric_free(data['Matric'])
             # Create the new student record
             new_student = Student(
                 Matric=data['Matric'],
@@ -142,12 +178,25 @@ class AdminStudentService:
                 course=data['course'],
                 level=data['level'],
                 section=data['section'],
-                image=image_data,
                 qr_code=data.get('qr_code', '')
             )
+            # Photo bytes go to the blob store; the row keeps only the hash
+            await run_in_threadpool(set_student_photo, new_student, photo)
+            # Store the encoded QR matrix so read paths never re-encode
+            await run_in_threadpool(encode_student_qr, new_student)
             
             self.db.add(new_student)
-            self.db.flush()  # Flush to get the ID but don't commit yet
+            # Flush to get the ID but don't commit yet. The unique Matric index
+            # rejects a duplicate here, so there is no separate check to race
+            try:
+                await self.db.flush()
+            except IntegrityError as e:
+                if _is_matric_conflict(e):
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Student '{data['Matric']}' is already registered"
+                    )
+                raise
             
             # Create audit log within the same transaction
             audit_log = self._create_audit_log_entry(
@@ -163,42 +212,301 @@ class AdminStudentService:
                     "course": new_student.course,
                     "level": new_student.level,
                     "section": new_student.section,
-                    "image_provided": bool(new_student.image),
+                    "image_provided": new_student.photo_hash is not None,
                     "registered_at": datetime.now().isoformat()
                 }
             )
             self.db.add(audit_log)
             
             # Now commit everything together
-            self.db.commit()
-            self.db.refresh(new_student)
+            await self.db.commit()
+            await self.db.refresh(new_student)
+            suggest_index.add(new_student.id, new_student.Matric, new_student.Firstname, new_student.Lastname)
+            student_pages.invalidate(new_student.Matric)
             
             self.logger.info(f"Admin {admin_user.email} registered student: {new_student.Firstname} {new_student.Lastname}")
             return new_student
             
         except HTTPException:
-            self.db.rollback()
+            await self.db.rollback()
             raise
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             self.logger.error(f"Database error during registration: {str(e)}")
             raise HTTPException(status_code=500, detail="Database error during registration")
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             self.logger.error(f"Unexpected error during registration: {str(e)}")
             raise HTTPException(status_code=500, detail="An error occurred during registration")
 
-    def get_all_students(self) -> List[Student]:
-        """Retrieve all registered students."""
-        return self.db.query(Student).all()
+    async def import_students(
+        self, upload: BinaryIO, fmt: str, admin_user: Admin, update_existing: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Register every valid row of a CSV / NDJSON upload, in batches of
+        BULK_IMPORT_CHUNK_SIZE rows (see backend/student/bulk.py). With
+        update_existing, rows whose Matric is registered update that
+        student; otherwise they are reported as errors. A batch that fails
+        to commit is reported row by row and the import carries on.
+
+        Returns:
+            Counts of rows read / inserted / updated / failed, and the
+            errors as {"line", "Matric", "error"} (at most BULK_IMPORT_MAX_ERRORS).
+
+        Raises:
+            HTTPException: On missing privileges or an unreadable CSV header.
+        """
+        if not admin_user.is_admin:
+            raise HTTPException(status_code=403, detail="Admin privileges required")
+        if not admin_user.has_full_access:
+            raise HTTPException(status_code=403, detail="Admin account must be active")
+        try:
+            rows = await run_in_threadpool(read_import_rows, upload, fmt)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        import_id = uuid.uuid4().hex
+        report = {"import_id": import_id, "rows": 0, "inserted": 0, "updated": 0, "failed": 0,
+                  "errors": [], "errors_truncated": False}
+        first_line: Dict[str, int] = {}
+
+        def fail(line: int, matric: Optional[str], error: str) -> None:
+            report["failed"] += 1
+            if len(report["errors"]) < settings.BULK_IMPORT_MAX_ERRORS:
+                report["errors"].append({"line": line, "Matric": matric, "error": error})
+            else:
+                report["errors_truncated"] = True
+
+        def read_batch():
+            """The next batch of rows, and the valid ones' staged values and lines by Matric."""
+            batch = list(islice(rows, settings.BULK_IMPORT_CHUNK_SIZE))
+            staged, lines = [], {}
+            for row in batch:
+                if row.data is None:
+                    fail(row.line, None, row.error)
+                    continue
+                matric = row.data["Matric"] or None
+                try:
+                    validate_student_data(row.data)
+                    values = staged_values(row.data)
+                except ValueError as e:
+                    fail(row.line, matric, str(e))
+                    continue
+                if matric in first_line:
+                    fail(row.line, matric, f"Duplicate Matric (first on line {first_line[matric]})")
+                    continue
+                first_line[matric] = lines[matric] = row.line
+                staged.append(values)
+            return batch, staged, lines
+
+        batch_number = 0
+        while True:
+            # Reading the upload and encoding QR codes is file and CPU work
+            batch, staged, lines = await run_in_threadpool(read_batch)
+            if not batch:
+                break
+            batch_number += 1
+            report["rows"] += len(batch)
+            if not staged:
+                continue
+
+            try:
+                inserted, updated = await merge_students(self.db, staged, update_existing)
+                merged = {matric for _, matric, _, _ in inserted + updated}
+                self.db.add(self._create_audit_log_entry(
+                    admin_user.id,
+                    "STUDENTS_IMPORTED",
+                    "STUDENT",
+                    f"import:{import_id}:{batch_number}",
+                    {
+                        "import_id": import_id,
+                        "batch": batch_number,
+                        "lines": [batch[0].line, batch[-1].line],
+                        "inserted": [matric for _, matric, _, _ in inserted],
+                        "updated": [matric for _, matric, _, _ in updated],
+                        "failed": len(batch) - len(merged),
+                        "imported_at": datetime.now().isoformat(),
+                        "imported_by": admin_user.email
+                    }
+                ))
+                await self.db.commit()
+            except SQLAlchemyError as e:
+                await self.db.rollback()
+                self.logger.error(f"Database error in batch {batch_number} of import {import_id}: {str(e)}")
+                for matric, line in lines.items():
+                    fail(line, matric, "Database error while saving this batch")
+                continue
+
+            suggest_index.add_many(inserted + updated)
+            student_pages.invalidate(*merged)
+            report["inserted"] += len(inserted)
+            report["updated"] += len(updated)
+            for matric, line in lines.items():
+                if matric not in merged:
+                    fail(line, matric, f"Student '{matric}' is already registered")
+
+        report["errors"].sort(key=lambda error: error["line"])
+        self.logger.info(
+            f"Admin {admin_user.email} imported students ({import_id}): {report['inserted']} inserted, "
+            f"{report['updated']} updated, {report['failed']} failed"
+        )
+        return report
+
+    @read_only
+    async def list_students(
+        self,
+        course: Optional[str] = None,
+        level: Optional[str] = None,
+        section: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        order: str = "id",
+        with_total: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        One page of students, optionally filtered by course / level / section.
+
+        Uses keyset pagination on (id) or (course, id): pass the returned
+        next_cursor back to get the following page. Only the listed columns
+        are loaded. with_total adds the planner's row estimate for the
+        filtered set, which costs no table scan.
+        """
+        if order not in STUDENT_LIST_ORDERS:
+            raise HTTPException(status_code=400, detail=f"Order must be one of: {', '.join(STUDENT_LIST_ORDERS)}")
+        limit = min(limit or settings.STUDENT_PAGE_SIZE, settings.STUDENT_PAGE_SIZE_MAX)
+        if limit < 1:
+            raise HTTPException(status_code=400, detail="Limit must be at least 1")
+
+        query = student_filter(
+            select(Student).options(load_only(*STUDENT_LIST_COLUMNS)), course, level, section
+        )
+        total = await self.db.run_sync(estimate_count, query) if with_total else None
+
+        if cursor:
+            try:
+                key = decode_cursor(cursor, order)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if order == "course" and key["course"] is None:
+                query = query.filter(Student.course.is_(None), Student.id > key["id"])
+            elif order == "course":
+                query = query.filter(or_(
+                    tuple_(Student.course, Student.id) > tuple_(key["course"], key["id"]),
+                    Student.course.is_(None),
+                ))
+            else:
+                query = query.filter(Student.id > key["id"])
+
+        # NULLS LAST is PostgreSQL's default for ASC, so the (course, id) index still applies
+        ordering = (Student.course.asc().nulls_last(), Student.id) if order == "course" else (Student.id,)
+        # One extra row tells whether there is a next page
+        students = (await self.db.scalars(query.order_by(*ordering).limit(limit + 1))).all()
+        next_cursor = encode_cursor(order, students[limit - 1]) if len(students) > limit else None
+        return {"items": students[:limit], "next_cursor": next_cursor, "estimated_total": total}
     
-    def get_student_by_id(self, student_matric: str) -> Optional[Student]:
+    @read_only
+    async def search_students(
+        self,
+        query: str,
+        course: Optional[str] = None,
+        level: Optional[str] = None,
+        section: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        One page of students matching query by matric number, name or
+        course, best matches first (typos tolerated), optionally within a
+        course / level / section. See backend/student/search.py.
+        """
+        limit = min(limit or settings.STUDENT_PAGE_SIZE, settings.STUDENT_PAGE_SIZE_MAX)
+        if limit < 1:
+            raise HTTPException(status_code=400, detail="Limit must be at least 1")
+        def search(db: Session):
+            base = student_filter(db.query(Student).options(load_only(*STUDENT_LIST_COLUMNS)), course, level, section)
+            return find_students(db, query, base, cursor, limit)
+
+        try:
+            students, next_cursor = await self.db.run_sync(search)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"items": students, "next_cursor": next_cursor, "estimated_total": None}
+
+    @read_only
+    async def suggest_students(self, prefix: str, limit: int = 10) -> Dict[str, Any]:
+        """
+        Type-ahead: up to limit students whose matric number, last name or
+        first name starts with prefix. Served from the in-memory index,
+        or the database while the index is incomplete.
+        """
+        refresh_suggest_index(SessionLocal)
+        if suggest_index.complete:
+            return {"items": suggest_index.suggest(prefix, limit), "source": "index"}
+        return {"items": await self.db.run_sync(suggest_from_database, prefix, limit), "source": "database"}
+
+    @read_only
+    async def get_student_image(self, student_matric: str, size: Optional[int] = None) -> StudentImage:
+        """
+        Locate a student's photo in the blob store (or its nearest thumbnail
+        when a size is given), or decode it from the legacy image column for
+        rows the photo migration hasn't reached yet.
+        """
+        row = (await self.db.execute(
+            select(Student.photo_hash, Student.photo_type, Student.image).filter(Student.Matric == student_matric)
+        )).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Student not found")
+        # File checks, thumbnail rendering and legacy base64 decoding
+        return await run_in_threadpool(self._locate_image, student_matric, row, size)
+
+    def _locate_image(self, student_matric: str, row, size: Optional[int]) -> StudentImage:
+        if row.photo_hash:
+            path = photo_store.path(row.photo_hash)
+            if not path.is_file():
+                self.logger.error(f"Photo {row.photo_hash} of {student_matric} is missing from the blob store")
+                raise HTTPException(status_code=404, detail="Student has no image")
+            if size:
+                thumbnail = thumbnail_path(row.photo_hash, size)
+                if thumbnail is not None:
+                    etag = f'"{row.photo_hash}-w{thumbnail_size(size)}"'
+                    return StudentImage(THUMBNAIL_MEDIA_TYPE, etag, path=thumbnail)
+            return StudentImage(row.photo_type or "application/octet-stream", f'"{row.photo_hash}"', path=path)
+        if not row.image:
+            raise HTTPException(status_code=404, detail="Student has no image")
+        try:
+            return decode_image_data(row.image)
+        except ValueError as e:
+            self.logger.error(f"Stored image for {student_matric} is unreadable: {str(e)}")
+            raise HTTPException(status_code=500, detail="Stored image is unreadable")
+
+    @read_only
+    async def get_student_by_id(self, student_matric: str) -> Optional[Student]:
         """Retrieve a single student using the matric number."""
-        student = self.db.query(Student).filter(Student.Matric == student_matric).first()
+        return await self.get_current_student(student_matric)
+
+    async def get_current_student(self, student_matric: str) -> Student:
+        """
+        get_student_by_id read from the primary, for results that get cached:
+        a lagging replica could miss a new student or return an old version.
+        """
+        student = await self.db.scalar(select(Student).filter(Student.Matric == student_matric).limit(1))
         if not student:
             raise HTTPException(status_code=404, detail="Student not found")
         return student
     
+    async def _check_matric_free(self, matric: str) -> None:
+        """
+        Duplicate check for databases without the unique Matric index
+        (backfill.unique_matric hasn't built it yet), where nothing else
+        catches one. Locks the table for the rest of the transaction, as the
+        bulk import does then, so no one can insert the Matric after the check.
+        """
+        if await self.db.run_sync(matric_is_unique):
+            return
+        await self.db.execute(text('LOCK TABLE "Student" IN SHARE ROW EXCLUSIVE MODE'))
+        if await self.db.scalar(select(Student.id).filter(Student.Matric == matric).limit(1)) is not None:
+            raise HTTPException(status_code=400, detail=f"Student '{matric}' is already registered")
+
     def _create_audit_log_entry(
         self,
         admin_id: uuid.UUID,
@@ -222,13 +530,56 @@ class AdminStudentService:
             created_at=datetime.now()
         )
 
-    def delete_student(self, student_matric: str, admin_user: Admin) -> bool:
+    async def replace_student_photo(self, student_matric: str, photo: PhotoUpload, admin_user: Admin) -> Student:
+        """Store an already normalized photo as the student's photo."""
+        if not admin_user.is_admin:
+            raise HTTPException(status_code=403, detail="Admin privileges required")
+        try:
+            student = await self.db.scalar(select(Student).filter(Student.Matric == student_matric).limit(1))
+            if not student:
+                raise HTTPException(status_code=404, detail="Student not found")
+
+            had_image = student.has_image
+            await run_in_threadpool(set_student_photo, student, photo)
+            self.db.add(self._create_audit_log_entry(
+                admin_user.id,
+                "STUDENT_UPDATED",
+                "STUDENT",
+                str(student.id),
+                {
+                    "original_data": {"image_provided": had_image},
+                    "updated_data": {"image": True},
+                    "updated_at": datetime.now().isoformat(),
+                    "updated_by": admin_user.email
+                }
+            ))
+            await self.db.commit()
+            await self.db.refresh(student)
+
+            student_pages.invalidate(student_matric)
+
+            self.logger.info(f"Admin {admin_user.email} replaced the photo of student {student_matric}")
+            return student
+        except HTTPException:
+            await self.db.rollback()
+            raise
+        except StaleDataError:
+            await self.db.rollback()
+            raise _stale_write(student_matric, None)
+        except Exception as e:
+            await self.db.rollback()
+            self.logger.error(f"Error replacing photo of {student_matric}: {str(e)}")
+            raise HTTPException(status_code=500, detail="An error occurred while saving the photo")
+
+    async def delete_student(self, student_matric: str, admin_user: Admin, if_match: Optional[str] = None) -> bool:
         """
         Delete a student record.
 
         Args:
             student_matric: The student's matric number.
             admin_user: The admin performing the deletion.
+            if_match: If-Match header; the deletion only happens if it names
+                the student's current ETag.
 
         Returns:
             bool: True if deletion is successful.
@@ -240,13 +591,12 @@ class AdminStudentService:
             raise HTTPException(status_code=403, detail="Admin privileges required")
         
         try:
-            # Start explicit transaction and use row locking
-            student = self.db.query(Student).filter(
-                Student.Matric == student_matric
-            ).with_for_update().first()
+            # No row lock: the versioned DELETE fails if the row changed since this read
+            student = await self.db.scalar(select(Student).filter(Student.Matric == student_matric).limit(1))
             
             if not student:
                 raise HTTPException(status_code=404, detail="Student not found")
+            _check_if_match(student, if_match)
             
             matric = student.Matric
             student_id = str(student.id)
@@ -268,27 +618,34 @@ class AdminStudentService:
             self.db.add(audit_log)
             
             # Delete the student
-            self.db.delete(student)
+            await self.db.delete(student)
             
             # Commit everything together
-            self.db.commit()
+            await self.db.commit()
+            suggest_index.remove(int(student_id))
+            student_pages.invalidate(matric)
             
             self.logger.info(f"Admin {admin_user.email} deleted student {matric}")
             return True
             
         except HTTPException:
-            self.db.rollback()
+            await self.db.rollback()
             raise
+        except StaleDataError:
+            await self.db.rollback()
+            raise _stale_write(student_matric, if_match)
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             self.logger.error(f"Database error during deletion: {str(e)}")
             raise HTTPException(status_code=500, detail="Database error during deletion")
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             self.logger.error(f"Unexpected error during deletion: {str(e)}")
             raise HTTPException(status_code=500, detail="An error occurred during deletion")
 
-    def update_student(self, student_matric: str, data: Dict[str, Any], admin_user: Admin) -> Student:
+    async def update_student(
+        self, student_matric: str, data: Dict[str, Any], admin_user: Admin, if_match: Optional[str] = None
+    ) -> Student:
         """
         Update an existing student record, including reprocessing image data if necessary.
 
@@ -296,12 +653,15 @@ class AdminStudentService:
             student_matric: The matric number of the student to update.
             data: A dictionary of fields to update.
             admin_user: The admin performing the update.
+            if_match: If-Match header; the update only happens if it names
+                the student's current ETag.
 
         Returns:
             Student: The updated student object.
 
         Raises:
-            HTTPException: When the student is not found or an error occurs during the update.
+            HTTPException: When the student is not found, has changed since it
+                was read (412 / 409), or an error occurs during the update.
         """
         if not admin_user.is_admin:
             raise HTTPException(status_code=403, detail="Admin privileges required")
@@ -309,18 +669,30 @@ class AdminStudentService:
         # Only validate fields that are being updated
         update_fields = {k: v for k, v in data.items() 
                         if k in ["Matric", "Firstname", "Lastname", "gender", "course", "level", "section", "image", "qr_code"]}
+        # A missing (null) image leaves the photo as it is
+        if update_fields.get("image", "") is None:
+            del update_fields["image"]
         
         if not update_fields:
             raise HTTPException(status_code=400, detail="No valid fields to update")
+        
+        # Decode, validate and normalize a new photo before touching the database
+        photo = None
+        if update_fields.get("image"):
+            try:
+                photo = await run_in_threadpool(prepare_photo, update_fields["image"])
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
             
         try:
-            # Start explicit transaction and use row locking
-            student = self.db.query(Student).filter(
-                Student.Matric == student_matric
-            ).with_for_update().first()
+            # No row lock: the versioned UPDATE fails if the row changed since this read
+            student = await self.db.scalar(select(Student).filter(Student.Matric == student_matric).limit(1))
             
             if not student:
                 raise HTTPException(status_code=404, detail="Student not found")
+            _check_if_match(student, if_match)
+            if update_fields.get("Matric", student.Matric) != student.Matric:
+                await self._check_matric_free(update_fields["Matric"])
             
             # Save original data for audit log
             original_data = {
@@ -331,23 +703,20 @@ class AdminStudentService:
                 "course": student.course,
                 "level": student.level,
                 "section": student.section,
-                "image_provided": bool(student.image)
+                "image_provided": student.has_image
             }
             
-            # Process updated image data if provided
+            # Replace the photo, or remove it when image is an empty string
             if "image" in update_fields:
-                try:
-                    if update_fields["image"] == "":  # Empty string means remove image
-                        update_fields["image"] = ""
-                    else:
-                        update_fields["image"] = process_image_data(update_fields["image"])
-                except ValueError as e:
-                    # Explicitly raise HTTP exception with the error message
-                    raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
+                await run_in_threadpool(set_student_photo, student, photo)
             
             # Update the student with validated fields
             for field, value in update_fields.items():
-                setattr(student, field, value)
+                if field != "image":
+                    setattr(student, field, value)
+            
+            # Re-encode the stored QR matrix if the Matric (and so the URL) changed
+            await run_in_threadpool(encode_student_qr, student)
             
             # Create audit log within the same transaction
             audit_data = {
@@ -367,20 +736,36 @@ class AdminStudentService:
             self.db.add(audit_log)
             
             # Commit everything together
-            self.db.commit()
-            self.db.refresh(student)
+            await self.db.commit()
+            await self.db.refresh(student)
+            suggest_index.add(student.id, student.Matric, student.Firstname, student.Lastname)
+            # Under the old and (if renamed) new matric number
+            student_pages.invalidate(student_matric, student.Matric)
             
             self.logger.info(f"Admin {admin_user.email} updated student {student_matric}")
             return student
             
         except HTTPException:
-            self.db.rollback()
+            await self.db.rollback()
             raise
+        except StaleDataError:
+            await self.db.rollback()
+            raise _stale_write(student_matric, if_match)
+        except IntegrityError as e:
+            await self.db.rollback()
+            # Renamed to a Matric another student has (the unique index detects it)
+            if _is_matric_conflict(e):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Student '{update_fields.get('Matric')}' is already registered"
+                )
+            self.logger.error(f"Database error during update: {str(e)}")
+            raise HTTPException(status_code=500, detail="Database error during update")
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             self.logger.error(f"Database error during update: {str(e)}")
             raise HTTPException(status_code=500, detail="Database error during update")
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             self.logger.error(f"Unexpected error during update: {str(e)}")
             raise HTTPException(status_code=500, detail="An error occurred during update")
\ No newline at end of file
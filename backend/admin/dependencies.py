@@ -1,17 +1,18 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.admin.model import Admin
-from backend.database.config import get_db
+from backend.database.config import get_async_db
 from backend.security.token import verify_access_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/admin/login")
 
 async def get_current_admin(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Admin:
     """
     Dependency to get current authenticated admin user
@@ -30,7 +31,7 @@ async def get_current_admin(
             raise credentials_exception
             
         # Get admin from database
-        admin = db.query(Admin).filter(Admin.id == admin_id).first()
+        admin = await db.scalar(select(Admin).filter(Admin.id == admin_id).limit(1))
         if admin is None:
             raise credentials_exception
             
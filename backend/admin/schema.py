@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
 from pydantic import BaseModel, EmailStr, Field
 
@@ -13,6 +13,8 @@ class StudentCreate(BaseModel):
     level: str = Field(..., example="Year 2")
     section: str = Field(..., example="Section A")
     qr_code: Optional[str] = Field(None)
+    # Data URL or bare base64; "" removes the photo on update, null keeps it
+    image: Optional[str] = Field(None)
 
 
 class StudentResponse(BaseModel):
@@ -25,6 +27,41 @@ class StudentResponse(BaseModel):
     level: str
     section: str
     qr_code: Optional[str] = None
+    has_image: bool = False  # fetch it from /api/v1/admin/students/{Matric}/image
+
+
+class StudentPage(BaseModel):
+    items: List[StudentResponse]
+    next_cursor: Optional[str] = None  # pass as ?cursor= to get the next page
+    estimated_total: Optional[int] = None
+
+
+class StudentSuggestion(BaseModel):
+    id: int
+    Matric: str
+    Firstname: str
+    Lastname: str
+
+
+class StudentSuggestions(BaseModel):
+    items: List[StudentSuggestion]
+    source: str  # "index" (in memory) or "database"
+
+
+class StudentImportError(BaseModel):
+    line: int  # line of the upload the row ends on
+    Matric: Optional[str] = None
+    error: str
+
+
+class StudentImportReport(BaseModel):
+    import_id: str  # entity_id prefix of the batch audit entries
+    rows: int
+    inserted: int
+    updated: int
+    failed: int
+    errors: List[StudentImportError]
+    errors_truncated: bool = False
 
 
 
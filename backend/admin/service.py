@@ -2,11 +2,14 @@ from datetime import datetime, timedelta
 import logging
 from typing import Optional, Dict, Any
 
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.admin.model import Admin, AdminAuditLog
-from backend.database.config import SessionLocal
+from backend.database.config import AsyncSessionLocal
+from backend.database.routing import read_only
 from backend.database.data import PasswordValidator
 from backend.student.entities import Status, Tier
 from backend.security.password import hash_password, verify_password
@@ -18,27 +21,29 @@ from backend.security.token import create_access_token
 class AdminService:
     """Service for admin user management and initialization."""
 
-    def __init__(self, db: Optional[Session] = None):
+    def __init__(self, db: Optional[AsyncSession] = None):
         # Use provided session or create a new one
-        self.db = db or SessionLocal()
+        self.db = db or AsyncSessionLocal()
         self.logger = logging.getLogger(__name__)
 
-    def get_admin_by_id(self, admin_id: str) -> Optional[Admin]:
+    @read_only
+    async def get_admin_by_id(self, admin_id: str) -> Optional[Admin]:
         """Get admin by ID."""
-        return self.db.query(Admin).filter(Admin.id == admin_id).first()
+        return await self.db.scalar(select(Admin).filter(Admin.id == admin_id).limit(1))
 
-    def get_admin_by_email(self, email: str) -> Optional[Admin]:
+    async def get_admin_by_email(self, email: str) -> Optional[Admin]:
         """Get admin by email."""
-        return self.db.query(Admin).filter(Admin.email == email).first()
+        return await self.db.scalar(select(Admin).filter(Admin.email == email).limit(1))
 
-    def authenticate_admin(self, email: str, password: str) -> Optional[Admin]:
+    async def authenticate_admin(self, email: str, password: str) -> Optional[Admin]:
         """Authenticate admin with email and password."""
-        admin = self.get_admin_by_email(email)
+        admin = await self.get_admin_by_email(email)
         if not admin:
             self.logger.warning(f"Failed login attempt for non-existent admin: {email}")
             return None
 
-        if not verify_password(password, admin.hashed_password):
+        # bcrypt is deliberately slow: keep it off the event loop
+        if not await run_in_threadpool(verify_password, password, admin.hashed_password):
             self.logger.warning(f"Failed login attempt for admin: {email}")
             return None
 
@@ -60,7 +65,7 @@ class AdminService:
         """
         try:
             # Authenticate admin
-            admin = self.authenticate_admin(email, password)
+            admin = await self.authenticate_admin(email, password)
             if not admin:
                 raise AuthenticationException("Incorrect email or password")
 
@@ -74,7 +79,7 @@ class AdminService:
 
             # Update last login timestamp
             admin.last_login = datetime.now()
-            self.db.commit()
+            await self.db.commit()
 
             # Generate access token
             access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -84,8 +89,8 @@ class AdminService:
             )
 
             # Create audit log for successful login
-            self.create_admin_audit_log(
-                admin_id=str(admin.id),
+            await self.create_admin_audit_log(
+                admin_id=admin.id,
                 action="LOGIN",
                 entity_type="ADMIN",
                 entity_id=str(admin.id),
@@ -106,7 +111,7 @@ class AdminService:
             self.logger.error(f"Login error: {str(e)}")
             raise AuthenticationException("Login failed")
 
-    def create_admin_audit_log(
+    async def create_admin_audit_log(
         self,
         admin_id: str,
         action: str,
@@ -125,14 +130,14 @@ class AdminService:
                 created_at=datetime.now()
             )
             self.db.add(audit_log)
-            self.db.commit()
+            await self.db.commit()
             self.logger.info(f"Created audit log for action: {action}")
         except SQLAlchemyError as e:
             self.logger.error(f"Failed to create audit log: {e}")
-            self.db.rollback()
+            await self.db.rollback()
             raise
 
-    def create_admin(self) -> Optional[Admin]:
+    async def create_admin(self) -> Optional[Admin]:
         """Create initial admin user if it doesn't exist."""
         try:
             # Get the raw password string from SecretStr and validate complexity
@@ -142,12 +147,12 @@ class AdminService:
                 raise SecurityError(f"Invalid initial admin password: {error_msg}")
 
             admin_email = settings.INITIAL_ADMIN_EMAIL
-            existing_admin = self.db.query(Admin).filter(Admin.email == admin_email).first()
+            existing_admin = await self.get_admin_by_email(admin_email)
 
             if not existing_admin:
                 admin_user = Admin(
                     email=admin_email,
-                    hashed_password=hash_password(admin_password),
+                    hashed_password=await run_in_threadpool(hash_password, admin_password),
                     full_name=settings.INITIAL_ADMIN_NAME,
                     tier=Tier.ADMIN,
                     status=Status.ACTIVE,
@@ -155,11 +160,11 @@ class AdminService:
                 )
 
                 self.db.add(admin_user)
-                self.db.commit()
-                self.db.refresh(admin_user)
+                await self.db.commit()
+                await self.db.refresh(admin_user)
 
                 # Create audit log for admin creation
-                self.create_admin_audit_log(
+                await self.create_admin_audit_log(
                     admin_id=admin_user.id,
                     action="ADMIN_CREATED",
                     entity_type="USER",
@@ -181,16 +186,16 @@ class AdminService:
             raise
         except SQLAlchemyError as e:
             self.logger.error(f"Database error creating admin: {e}")
-            self.db.rollback()
+            await self.db.rollback()
             raise
         except Exception as e:
             self.logger.error(f"Unexpected error creating admin: {e}")
             raise
 
-    def init_data(self) -> None:
+    async def init_data(self) -> None:
         """Initialize all required initial data."""
         try:
-            admin_user = self.create_admin()
+            admin_user = await self.create_admin()
             if admin_user:
                 self.logger.info("Data initialization completed successfully")
             # Add other initialization functions here if needed.
@@ -1,36 +1,259 @@
 
 #backend/route
 
-from fastapi import APIRouter, HTTPException
+import asyncio
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database.config import get_async_db
+from backend.database.routing import on_replica
+from backend.qrcode.cache import QRCache
+from backend.qrcode.pool import QRProcessPool
 from backend.qrcode.qservice import QRService
+from backend.qrcode.raster import RASTER_FORMATS
+from backend.security.config import settings
+from backend.student.model import Student
+from backend.student.util import STUDENT_QR_ECC, STUDENT_QR_OPTIMIZE, etag_matches, student_public_url
 from fastapi import Form
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
-qr_service = QRService()
+qr_cache = QRCache(
+    max_entries=settings.QR_CACHE_MAX_ENTRIES,
+    max_bytes=settings.QR_CACHE_MAX_BYTES,
+)
+qr_pool = (
+    QRProcessPool(max_workers=settings.QR_PROCESS_POOL_WORKERS or None, engine=settings.QR_ENGINE)
+    if settings.QR_PROCESS_POOL_ENABLED else None
+)
+qr_service = QRService(
+    cache=qr_cache,
+    pool=qr_pool,
+    engine=settings.QR_ENGINE,
+    max_size=settings.QR_MAX_SIZE,
+    max_border=settings.QR_MAX_BORDER,
+)
 
 class QRRequest(BaseModel):
     content: str
     size: int = 10
+    renderer: str = "path"
+    error_correction: str = "Q"
+    border: int = 4
+    format: str = "svg"
+    optimize: bool = False
+
+class QRBatchRequest(BaseModel):
+    contents: List[str] = []
+    matrics: List[str] = []
+    size: int = 10
+    renderer: str = "path"
+    error_correction: str = "Q"
+    border: int = 4
+    optimize: bool = False
+
 
 @router.post("/generate")
-def generate_qr(
+async def generate_qr(
+    response: Response,
     content: str = Form(...),
-    size: int = Form(10)
+    size: int = Form(10),
+    renderer: str = Form("path"),
+    error_correction: str = Form("Q"),
+    border: int = Form(4),
+    output_format: str = Form("svg", alias="format"),
+    optimize: bool = Form(False),
+    if_none_match: Optional[str] = Header(None)
 ):
     try:
-        # Validate and generate SVG
-        svg = qr_service.create_qr(content, size)
+        # The key only depends on the inputs, so a matching ETag can be
+        # answered before anything is encoded or rendered
+        etag = f'"{qr_service.cache_key(content, size, renderer, error_correction, border, output_format, optimize)}"'
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        # Both are served from the cache when possible, else computed off the event loop
+        version, output = await asyncio.gather(
+            qr_service.symbol_version_async(content, error_correction, optimize),
+            qr_service.create_qr_async(content, size, renderer, error_correction, border, output_format, optimize),
+        )
+        modules = 4 * version + 17
+
+        # Raster formats are returned as the image itself
+        if output_format in RASTER_FORMATS:
+            return Response(
+                content=output,
+                media_type=RASTER_FORMATS[output_format],
+                headers={
+                    "ETag": etag,
+                    "Content-Disposition": f'inline; filename="qr_code.{output_format}"',
+                    "X-QR-Version": str(version),
+                    "X-QR-Modules": str(modules),
+                }
+            )
+
+        response.headers["ETag"] = etag
         
         # Return JSON response with SVG
         return {
-            "svg": svg,
+            "svg": output,
             "content": content,
-            "size": size
+            "size": size,
+            "renderer": renderer,
+            "error_correction": error_correction,
+            "border": border,
+            "optimize": optimize,
+            "version": version,
+            "modules": modules
         }
     except ValueError as ve:
         # Handle specific validation errors
         raise HTTPException(status_code=400, detail=str(ve))
-    except Exception as e:
+    except Exception:
         # Catch-all for other unexpected errors
-        raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
+        logger.exception("QR generation failed")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    """Hit/miss counters and memory usage of the QR cache."""
+    return qr_cache.stats()
+
+
+@router.post("/generate/batch")
+async def generate_qr_batch(
+    batch: QRBatchRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Generate QR codes for a list of contents and/or student matric numbers
+    in one request, one result per requested item. Students are rendered
+    from their stored QR matrix when it was encoded with the requested ECC
+    level and optimize flag, otherwise their public page URL is encoded.
+    Each distinct content is only encoded once and unknown matrics are
+    reported under "missing".
+    """
+    if not batch.contents and not batch.matrics:
+        raise HTTPException(status_code=400, detail="Provide at least one content or matric number")
+    if len(batch.contents) + len(batch.matrics) > settings.QR_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch cannot contain more than {settings.QR_BATCH_MAX_ITEMS} items"
+        )
+
+    items = [{"content": content} for content in batch.contents]
+    # content -> (packed matrix, version) of students rendered from their stored matrix
+    stored = {}
+    missing = []
+    if batch.matrics:
+        unique_matrics = list(dict.fromkeys(batch.matrics))
+        with on_replica(db):
+            found = {
+                row.Matric: row for row in
+                await db.execute(select(
+                    Student.Matric, Student.qr_content, Student.qr_matrix, Student.qr_version, Student.qr_ecc
+                ).filter(Student.Matric.in_(unique_matrics)))
+            }
+        missing = [matric for matric in unique_matrics if matric not in found]
+        for matric in batch.matrics:
+            row = found.get(matric)
+            if row is None:
+                continue
+            # Stored matrices were encoded with STUDENT_QR_OPTIMIZE
+            if (
+                row.qr_matrix is not None
+                and row.qr_ecc == batch.error_correction
+                and batch.optimize == STUDENT_QR_OPTIMIZE
+            ):
+                stored[row.qr_content] = (row.qr_matrix, row.qr_version)
+                items.append({"matric": matric, "content": row.qr_content})
+            else:
+                items.append({"matric": matric, "content": student_public_url(matric)})
+
+    try:
+        stored_svgs = await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: {
+                content: qr_service.render_stored(packed, version, batch.size, batch.renderer, batch.border)
+                for content, (packed, version) in stored.items()
+            },
+        )
+        svgs = await qr_service.create_many_async(
+            [item["content"] for item in items if item["content"] not in stored],
+            batch.size,
+            batch.renderer,
+            batch.error_correction,
+            batch.border,
+            settings.QR_BATCH_WORKERS,
+            optimize=batch.optimize,
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception:
+        logger.exception("QR batch generation failed")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    # Items with the same content share one rendered SVG
+    svgs.update(stored_svgs)
+    results = [{**item, "svg": svgs[item["content"]]} for item in items]
+
+    return {
+        "items": results,
+        "missing": missing,
+        "requested": len(batch.contents) + len(batch.matrics),
+        "generated": len(results),
+        "size": batch.size,
+        "renderer": batch.renderer
+    }
+
+
+@router.get("/student/{student_matric:path}")
+async def get_student_qr(
+    student_matric: str,
+    size: int = 10,
+    renderer: str = "path",
+    border: int = 4,
+    output_format: str = Query("svg", alias="format"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Render a student's QR code from the matrix stored on their record,
+    as SVG or as a raster image. Students not backfilled yet are encoded
+    on the fly.
+    """
+    with on_replica(db):
+        row = (await db.execute(select(
+            Student.Matric, Student.qr_matrix, Student.qr_version
+        ).filter(Student.Matric == student_matric))).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    try:
+        if row.qr_matrix is not None:
+            etag = f'"{qr_service.stored_cache_key(row.qr_matrix, row.qr_version, size, renderer, border, output_format)}"'
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            output = await asyncio.get_running_loop().run_in_executor(
+                None, qr_service.render_stored,
+                row.qr_matrix, row.qr_version, size, renderer, border, output_format,
+            )
+        else:
+            content = student_public_url(row.Matric)
+            etag = f'"{qr_service.cache_key(content, size, renderer, STUDENT_QR_ECC, border, output_format, STUDENT_QR_OPTIMIZE)}"'
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            output = await qr_service.create_qr_async(
+                content, size, renderer, STUDENT_QR_ECC, border, output_format, STUDENT_QR_OPTIMIZE
+            )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    media_type = RASTER_FORMATS.get(output_format, "image/svg+xml")
+    return Response(content=output, media_type=media_type, headers={"ETag": etag})
@@ -1,18 +1,32 @@
 from datetime import datetime, timedelta
-from typing import Any, List
+from typing import Any, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status,Path, Body
+from fastapi import APIRouter, Depends, File, HTTPException, status,Path, Body, Header, Query, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 from pydantic import BaseModel, EmailStr
 
 from backend.admin.adminservice import AdminStudentService
 from backend.admin.service import AdminService
 from backend.admin.model import Admin
-from backend.admin.schema import AdminCreate, AdminLogin, AdminResponse, StudentCreate, StudentResponse, Token
-from backend.database.config import get_db
+from backend.admin.schema import AdminCreate, AdminLogin, AdminResponse, StudentCreate, StudentImportReport, StudentPage, StudentResponse, StudentSuggestions, Token
+from backend.database.config import get_async_db
+from backend.database.routing import on_replica
+from backend.student.cards import (
+    CARD_FORMATS, CARD_LAYOUTS, PhotoCache, card_data, render_card_svg, stream_cards, stream_pdf
+)
+from backend.student.bulk import import_format
+from backend.student.export import DATA_EXPORT_FORMATS, export_fields, stream_qr_zip, stream_students, validate_export
 from backend.student.model import Student
+from backend.student.pages import student_pages
+from backend.student.suggest import suggest_index
+from backend.student.upload import normalize_photo, read_upload
+from backend.student.util import etag_matches, student_etag, student_filter
 
 from backend.security.permissions import admin_required
 from backend.security.token import create_access_token, verify_access_token
@@ -27,7 +41,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="admin/login")
 # Dependency to get current admin user
 async def get_current_admin(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Admin:
     payload = verify_access_token(token)
     admin_id = payload.get("sub")
@@ -38,7 +52,7 @@ async def get_current_admin(
             headers={"WWW-Authenticate": "Bearer"},
         )
     admin_service = AdminService(db)
-    admin = admin_service.get_admin_by_id(admin_id)
+    admin = await admin_service.get_admin_by_id(admin_id)
     if not admin:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -52,7 +66,7 @@ async def get_current_admin(
 @router.post("/create", response_model=AdminResponse)
 async def create_admin(
     admin_data: AdminCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_admin: Admin = Depends(admin_required)
 ) -> Any:
     """Create a new admin (requires admin privileges)"""
@@ -62,7 +76,7 @@ async def create_admin(
             detail="Insufficient permissions to create admin"
         )
     admin_service = AdminService(db)
-    new_admin = admin_service.create_admin(
+    new_admin = await admin_service.create_admin(
         email=admin_data.email,
         password=admin_data.password,
         full_name=admin_data.full_name,
@@ -72,7 +86,7 @@ async def create_admin(
 
 @router.get("/me", response_model=AdminResponse)
 async def get_me(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Admin = Depends(get_current_admin)
 ):
     """
@@ -85,7 +99,7 @@ async def get_me(
 @router.post("/login", response_model=Token)
 async def login(
     form_data: AdminLogin,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     """Admin login endpoint"""
     admin_service = AdminService(db)
@@ -99,7 +113,7 @@ async def login(
 @router.post("/register-student", response_model=StudentResponse)
 async def register_student(
     student_data: StudentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
@@ -107,7 +121,7 @@ async def register_student(
     """
     service = AdminStudentService(db)
     try:
-        student = service.register_student(student_data.dict(), current_admin)
+        student = await service.register_student(student_data.dict(), current_admin)
         return student
     except HTTPException as e:
         raise e
@@ -117,28 +131,141 @@ async def register_student(
             detail=f"Failed to register student: {str(e)}"
         )
 
-@router.get("/students", response_model=List[StudentResponse])
+@router.post("/students/import", response_model=StudentImportReport)
+async def import_students(
+    file: UploadFile = File(...),
+    input_format: Optional[str] = Query(None, alias="format"),
+    update_existing: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """
+    Register students in bulk from a CSV (header row with Matric, Firstname,
+    Lastname, gender, course, level, section) or NDJSON upload (admin only).
+    format is csv or ndjson, guessed from the file name when omitted. Rows
+    with an already registered Matric update that student with
+    update_existing, and are reported as errors otherwise.
+    """
+    try:
+        fmt = import_format(input_format, file.filename, file.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    service = AdminStudentService(db)
+    # The upload is already spooled to disk; the service reads it row by row
+    return await service.import_students(file.file, fmt, current_admin, update_existing)
+
+@router.get("/students", response_model=StudentPage)
 async def get_all_students(
-    db: Session = Depends(get_db),
+    course: Optional[str] = None,
+    level: Optional[str] = None,
+    section: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    order: str = "id",
+    with_total: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """
+    List registered students one page at a time (admin only).
+    Filter by course / level / section, and follow next_cursor for more.
+    """
+    service = AdminStudentService(db)
+    return await service.list_students(course, level, section, cursor, limit, order, with_total)
+
+@router.get("/students/search", response_model=StudentPage)
+async def search_students(
+    query: str = Query(..., min_length=1, max_length=100),
+    course: Optional[str] = None,
+    level: Optional[str] = None,
+    section: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
-    Get all registered students (admin only).
+    Search students by matric number, name or course, best matches first
+    (typo tolerant). Optionally restricted to a course / level / section;
+    pass next_cursor back as cursor for more results.
     """
     service = AdminStudentService(db)
-    return service.get_all_students()
+    return await service.search_students(query, course, level, section, cursor, limit)
+
+
+@router.get("/students/suggest", response_model=StudentSuggestions)
+async def suggest_students(
+    prefix: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """
+    Type-ahead: students whose matric number, last name or first name
+    starts with prefix, from an in-memory index.
+    """
+    service = AdminStudentService(db)
+    return await service.suggest_students(prefix, limit)
+
+
+@router.get("/students/suggest/stats")
+async def get_suggest_stats(current_admin: Admin = Depends(get_current_admin)):
+    """Size, memory usage and age of the type-ahead index."""
+    return suggest_index.stats()
+
+
+@router.get("/students/pages/stats")
+async def get_student_page_stats(current_admin: Admin = Depends(get_current_admin)):
+    """Size and hit rate of the public student page cache."""
+    return student_pages.stats()
+
+
+@router.get("/students/export")
+async def export_students(
+    output_format: str = Query("csv", alias="format"),
+    fields: Optional[str] = None,
+    include_images: bool = False,
+    course: Optional[str] = None,
+    level: Optional[str] = None,
+    section: Optional[str] = None,
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """
+    Download every student matching the course / level / section filters
+    as CSV or NDJSON (admin only), streamed from a server-side cursor.
+    fields is a comma-separated column list (default: all of them);
+    include_images adds each photo as a data URL.
+    """
+    if output_format not in DATA_EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Format must be one of: {', '.join(DATA_EXPORT_FORMATS)}"
+        )
+    try:
+        selected = export_fields(fields)
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+
+    media_type = "text/csv; charset=utf-8" if output_format == "csv" else "application/x-ndjson"
+    filename = "_".join(part for part in ("students", course, level, section) if part).replace("/", "_")
+    return StreamingResponse(
+        stream_students(selected, output_format, course, level, section, include_images),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{output_format}"'}
+    )
+
 
 @router.get("/students/{student_id}", response_model=StudentResponse)
 async def get_student(
     student_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
     Get student by ID (admin only).
     """
     service = AdminStudentService(db)
-    student = service.get_student_by_id(student_id)
+    student = await service.get_student_by_id(student_id)
     if not student:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -147,69 +274,211 @@ async def get_student(
     return student
 
 
-@router.get("/students/search", response_model=List[StudentResponse])
-async def search_students(
-    query: str,
-    search_name: bool = True,
-    search_course: bool = True,
-    search_level: bool = True,
-    search_section: bool = True,
-    db: Session = Depends(get_db),
+@router.get("/students/export/qr")
+async def export_student_qr_codes(
+    course: Optional[str] = None,
+    level: Optional[str] = None,
+    section: Optional[str] = None,
+    output_format: str = Query("png", alias="format"),
+    size: int = 10,
+    renderer: str = "path",
+    border: int = 4,
+    db: AsyncSession = Depends(get_async_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
-    Search students by various criteria.
+    Download a ZIP archive with the QR code (SVG or PNG) of every student
+    matching the course / level / section filters (admin only).
+    The archive is streamed while the codes are rendered.
     """
-    if not any([search_name, search_course, search_level, search_section]):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="At least one search field must be selected"
+    try:
+        validate_export(output_format, size, renderer, border)
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+
+    # Checked up front: once streaming has started the status can't change
+    if await db.scalar(student_filter(select(Student.id), course, level, section).limit(1)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No students match the given filters")
+
+    filename = "_".join(part for part in ("qr_codes", course, level, section) if part).replace("/", "_")
+    return StreamingResponse(
+        stream_qr_zip(course, level, section, output_format, size, renderer, border),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.zip"'}
+    )
+
+
+@router.get("/students/export/cards")
+async def export_student_cards(
+    course: Optional[str] = None,
+    level: Optional[str] = None,
+    section: Optional[str] = None,
+    output_format: str = Query("pdf", alias="format"),
+    layout: str = "sheet",
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """
+    Print-ready ID cards for every student matching the filters (admin only).
+    layout=sheet puts 10 cards on each A4 page, layout=card gives one card
+    per page. PDF is a single document; SVG is a ZIP of page SVGs.
+    """
+    if output_format not in CARD_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Format must be one of: {', '.join(CARD_FORMATS)}")
+    if layout not in CARD_LAYOUTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Layout must be one of: {', '.join(CARD_LAYOUTS)}")
+    if await db.scalar(student_filter(select(Student.id), course, level, section).limit(1)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No students match the given filters")
+
+    filename = "_".join(part for part in ("id_cards", course, level, section) if part).replace("/", "_")
+    extension, media_type = ("pdf", "application/pdf") if output_format == "pdf" else ("zip", "application/zip")
+    return StreamingResponse(
+        stream_cards(course, level, section, output_format, layout),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'}
+    )
+
+
+@router.get("/students/card/{student_matric:path}")
+async def get_student_card(
+    student_matric: str = Path(..., description="Student matric number that may contain slashes"),
+    output_format: str = Query("svg", alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """A single student's ID card as SVG or as a card-sized PDF (admin only)."""
+    if output_format not in CARD_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Format must be one of: {', '.join(CARD_FORMATS)}")
+    # The legacy inline photo is loaded up front: there is no lazy loading under asyncio
+    with on_replica(db):
+        student = await db.scalar(
+            select(Student).options(undefer(Student.image)).filter(Student.Matric == student_matric).limit(1)
+        )
+    if not student:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
+
+    # Photo and QR rendering are file and CPU work
+    card = await run_in_threadpool(card_data, student, PhotoCache())
+    filename = f"id_card_{student.Matric.replace('/', '_')}.{output_format}"
+    if output_format == "pdf":
+        return Response(
+            content=await run_in_threadpool(lambda: b"".join(stream_pdf([card], layout="card"))),
+            media_type="application/pdf",
+            headers={"Content-Disposition": f'inline; filename="{filename}"'}
         )
-    from sqlalchemy import or_
-    student_query = db.query(Student)
-    filters = []
-    if search_name:
-        filters.append(Student.name.ilike(f"%{query}%"))
-    if search_course:
-        filters.append(Student.course.ilike(f"%{query}%"))
-    if search_level:
-        filters.append(Student.level.ilike(f"%{query}%"))
-    if search_section:
-        filters.append(Student.section.ilike(f"%{query}%"))
-    student_query = student_query.filter(or_(*filters))
-    return student_query.all()
+    return Response(
+        content=await run_in_threadpool(render_card_svg, card),
+        media_type="image/svg+xml",
+        headers={"Content-Disposition": f'inline; filename="{filename}"'}
+    )
+
+
+async def student_image_response(
+    db: AsyncSession,
+    student_matric: str,
+    if_none_match: Optional[str],
+    cache_control: str,
+    size: Optional[int] = None,
+) -> Response:
+    """
+    Student photo (or the thumbnail nearest to size) with a content-addressed
+    ETag (304 when it matches).
+    """
+    image = await AdminStudentService(db).get_student_image(student_matric, size)
+    headers = {"ETag": image.etag, "Cache-Control": cache_control}
+    if etag_matches(if_none_match, image.etag):
+        return Response(status_code=304, headers=headers)
+    if image.path is not None:
+        # Streamed from disk in chunks rather than loaded into memory
+        return FileResponse(image.path, media_type=image.media_type, headers=headers)
+    return Response(content=image.data, media_type=image.media_type, headers=headers)
+
+
+@router.get("/students/{student_matric:path}/image")
+async def get_student_image(
+    student_matric: str = Path(..., description="Student matric number that may contain slashes"),
+    size: Optional[int] = Query(None, ge=1, description="Longest side in pixels; serves the nearest thumbnail"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """A student's photo as an image file (admin only)."""
+    return await student_image_response(db, student_matric, if_none_match, "private, max-age=300", size)
+
+
+async def _upload_chunks(file: UploadFile, chunk_size: int = 64 * 1024):
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+@router.put("/students/{student_matric:path}/image", response_model=StudentResponse)
+async def upload_student_image(
+    response: Response,
+    student_matric: str = Path(..., description="Student matric number that may contain slashes"),
+    file: UploadFile = File(..., description="JPG, PNG, GIF or WebP photo"),
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """
+    Replace a student's photo with an uploaded file (admin only). The file
+    is read in chunks and rejected as soon as it is too large or not an image.
+    """
+    try:
+        upload = await read_upload(_upload_chunks(file))
+        photo = await run_in_threadpool(normalize_photo, upload)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    service = AdminStudentService(db)
+    student = await service.replace_student_photo(student_matric, photo, current_admin)
+    response.headers["ETag"] = student_etag(student)
+    return student
+
+
 @router.get("/students/{student_matric:path}", response_model=StudentResponse)
 async def get_student(
+    response: Response,
     student_matric: str = Path(..., description="Student matric number that may contain slashes"),
-    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
     Get student by matric number (admin only).
     Path parameter supports matric numbers containing slashes.
+    The ETag names the record's version: send it as If-None-Match to get a
+    304 while the student is unchanged, or as If-Match with PUT / DELETE.
     """
     service = AdminStudentService(db)
-    student = service.get_student_by_id(student_matric)
+    student = await service.get_student_by_id(student_matric)
     if not student:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Student not found"
         )
+    headers = {"ETag": student_etag(student), "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
     return student
 
 @router.delete("/students/{student_matric:path}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_student(
     student_matric: str = Path(..., description="Student matric number that may contain slashes"),
-    db: Session = Depends(get_db),
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
     Delete a student by matric number (admin only).
     Path parameter supports matric numbers containing slashes.
+    With If-Match, fails with 412 unless it names the student's current ETag.
     """
     service = AdminStudentService(db)
     try:
-        result = service.delete_student(student_matric, current_admin)
+        result = await service.delete_student(student_matric, current_admin, if_match)
         if result:
             return
         else:
@@ -220,7 +489,7 @@ async def delete_student(
     except HTTPException as e:
         raise e
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to delete student: {str(e)}"
@@ -228,23 +497,28 @@ async def delete_student(
 
 @router.put("/students/{student_matric:path}", response_model=StudentResponse)
 async def update_student(
+    response: Response,
     student_matric: str = Path(..., description="Student matric number that may contain slashes"),
     student_data: StudentCreate = Body(...),
-    db: Session = Depends(get_db),
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
     Update a student's details by matric number (admin only).
     Path parameter supports matric numbers containing slashes.
+    With If-Match, fails with 412 unless it names the student's current ETag
+    (from GET); the response carries the new one.
     """
     service = AdminStudentService(db)
     try:
-        student = service.update_student(student_matric, student_data.dict(), current_admin)
+        student = await service.update_student(student_matric, student_data.dict(), current_admin, if_match)
+        response.headers["ETag"] = student_etag(student)
         return student
     except HTTPException as e:
         raise e
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to update student: {str(e)}"
@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from datetime import datetime
-from backend.database.config import get_db
+from backend.database.config import get_async_db
 from backend.admin.model import Admin
 from backend.admin.dependencies import get_current_admin
 from backend.admin.adminservice import AdminStudentService
-from backend.admin.schema import StudentCreate, StudentResponse
+from backend.admin.schema import StudentCreate, StudentPage, StudentResponse
 
 router = APIRouter()
 
@@ -18,7 +18,7 @@ router = APIRouter()
 )
 async def register_student(
     student: StudentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
@@ -31,7 +31,7 @@ async def register_student(
     student_data = student.dict(exclude_unset=True)
     
     # Register student through service
-    new_student = student_service.register_student(
+    new_student = await student_service.register_student(
         data=student_data,
         admin_user=current_admin
     )
@@ -40,19 +40,27 @@ async def register_student(
 
 @router.get(
     "/",
-    response_model=List[StudentResponse],
-    description="Get all registered students (Admin only)"
+    response_model=StudentPage,
+    description="List registered students, one page at a time (Admin only)"
 )
 async def get_all_students(
-    db: Session = Depends(get_db),
+    course: Optional[str] = None,
+    level: Optional[str] = None,
+    section: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    order: str = "id",
+    with_total: bool = False,
+    db: AsyncSession = Depends(get_async_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
-    Retrieve all registered students.
+    Retrieve registered students with keyset pagination.
+    Pass next_cursor from the previous page as cursor to continue.
     Only accessible by authenticated admin users.
     """
     student_service = AdminStudentService(db)
-    return student_service.get_all_students()
+    return await student_service.list_students(course, level, section, cursor, limit, order, with_total)
 
 @router.get(
     "/{student_id}",
@@ -61,7 +69,7 @@ async def get_all_students(
 )
 async def get_student(
     student_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
@@ -69,4 +77,4 @@ async def get_student(
     Only accessible by authenticated admin users.
     """
     student_service = AdminStudentService(db)
-    return student_service.get_student_by_id(student_id)
\ No newline at end of file
+    return await student_service.get_student_by_id(student_id)
\ No newline at end of file
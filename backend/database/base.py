@@ -3,7 +3,9 @@ from backend.database.config import (
     Base, 
     engine, 
     SessionLocal, 
+    AsyncSessionLocal,
     get_db, 
+    get_async_db,
     init_db_extensions
 )
 from backend.admin.service import AdminService
@@ -11,13 +13,13 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-def init_database():
+async def init_database():
     """Initialize complete database setup."""
     try:
         init_db_extensions()
         # Instantiate AdminService and call init_data on that instance.
-        admin_service = AdminService()
-        admin_service.init_data()
+        async with AsyncSessionLocal() as db:
+            await AdminService(db).init_data()
         logger.info("Database initialization completed successfully")
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
@@ -38,7 +40,9 @@ __all__ = [
     'Base',
     'engine',
     'SessionLocal',
+    'AsyncSessionLocal',
     'get_db',
+    'get_async_db',
     'init_database',
     'test_database_connection'
 ]
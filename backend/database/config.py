@@ -1,10 +1,14 @@
 # src/infrastructure/database/base.py
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
 from sqlalchemy_utils import database_exists, create_database
+import json
 import logging
+from backend.database.routing import ReplicaSet, RoutingSession
 from backend.security.config import settings
 
 logger = logging.getLogger(__name__)
@@ -12,12 +16,13 @@ logger = logging.getLogger(__name__)
 # Create Base class for models
 Base = declarative_base()
 
-# Create SQLAlchemy engine with connection pooling
+# Create SQLAlchemy engine with connection pooling. Used by startup, the
+# backfill scripts and the streaming exports, which run in worker threads
 engine = create_engine(
     settings.DATABASE_URL,
     poolclass=QueuePool,
-    pool_size=10,
-    max_overflow=20,
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW,
     pool_timeout=30,
     pool_recycle=1800,
     pool_pre_ping=True
@@ -26,6 +31,66 @@ engine = create_engine(
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers for the sync drivers DATABASE_URL may name
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> URL:
+    """DATABASE_URL with its driver swapped for the async one (asyncpg for PostgreSQL)."""
+    url = make_url(url)
+    drivername = _ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    if drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        # libpq's sslmode is asyncpg's ssl
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": url.query["sslmode"]})
+    return url.set(drivername=drivername)
+
+
+# Pool settings shared by the primary and replica async engines
+_ASYNC_POOL = dict(
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW,
+    pool_timeout=30,
+    pool_recycle=1800,
+    pool_pre_ping=True
+)
+
+# Async engine the API runs on, so a request waiting on the database
+# doesn't hold up the event loop
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL), **_ASYNC_POOL
+)
+
+# Read replicas for read-only service methods (see backend/database/routing.py)
+replicas = ReplicaSet([
+    create_async_engine(async_database_url(url.strip()), **_ASYNC_POOL)
+    for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()
+])
+
+# Objects stay loaded after commit: lazy loading isn't available under asyncio
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, sync_session_class=RoutingSession, replicas=replicas, autoflush=False, expire_on_commit=False
+)
+
+# Columns and indexes added to existing tables after they were first created.
+# create_all() only creates missing tables, so these are applied on startup.
+SCHEMA_MIGRATIONS = [
+    'ALTER TABLE "Student" ADD COLUMN IF NOT EXISTS qr_content VARCHAR',
+    'ALTER TABLE "Student" ADD COLUMN IF NOT EXISTS qr_matrix BYTEA',
+    'ALTER TABLE "Student" ADD COLUMN IF NOT EXISTS qr_version INTEGER',
+    'ALTER TABLE "Student" ADD COLUMN IF NOT EXISTS qr_ecc VARCHAR(1)',
+    'CREATE INDEX IF NOT EXISTS ix_student_course_id ON "Student" (course, id)',
+    'CREATE INDEX IF NOT EXISTS ix_student_course_level_section_id ON "Student" (course, level, section, id)',
+    'ALTER TABLE "Student" ADD COLUMN IF NOT EXISTS photo_hash VARCHAR(64)',
+    'ALTER TABLE "Student" ADD COLUMN IF NOT EXISTS photo_type VARCHAR(32)',
+    'CREATE INDEX IF NOT EXISTS "ix_Student_photo_hash" ON "Student" (photo_hash)',
+    'ALTER TABLE "Student" ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1',
+]
+
 def init_db_extensions():
     """Initialize database with required extensions and functions"""
     try:
@@ -42,26 +107,52 @@ def init_db_extensions():
             # Create extensions
             conn.execute(text('CREATE EXTENSION IF NOT EXISTS "uuid-ossp";'))
             conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm;'))
+
+            # Add columns and indexes introduced after the tables were created
+            for statement in SCHEMA_MIGRATIONS:
+                conn.execute(text(statement))
             
-            # Create full-text search function
-            conn.execute(text("""
-                CREATE OR REPLACE FUNCTION tsvector_update_trigger() RETURNS trigger AS $$
-                BEGIN
-                    NEW.search_vector =
-                        setweight(to_tsvector('pg_catalog.english', COALESCE(NEW.title, '')), 'A') ||
-                        setweight(to_tsvector('pg_catalog.english', COALESCE(NEW.content, '')), 'B');
-                    RETURN NEW;
-                END;
-                $$ LANGUAGE plpgsql;
-            """))
+            # Student search: maintained search_vector column, trigger and GIN indexes
+            # (imported here because the student model imports this module)
+            from backend.student.search import SEARCH_SCHEMA
+            # Replaces the unused public.tsvector_update_trigger (title/content columns)
+            conn.execute(text("DROP FUNCTION IF EXISTS public.tsvector_update_trigger()"))
+            for statement in SEARCH_SCHEMA:
+                conn.execute(text(statement))
             
             conn.commit()
             logger.info("Initialized PostgreSQL extensions and functions")
+        
+        # Unique Matric on databases created before it was; built online, and
+        # left for later (with a report) while duplicate Matric numbers exist
+        from backend.student.backfill import unique_matric
+        unique_matric()
             
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
         raise
 
+def estimate_count(db, statement) -> int:
+    """
+    Row count estimate for a select() from the PostgreSQL planner (EXPLAIN
+    only, nothing is scanned). Other databases get an exact COUNT. Takes a
+    sync Session: call it through AsyncSession.run_sync from async code.
+    """
+    statement = statement.order_by(None)
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return db.scalar(select(func.count()).select_from(statement.subquery()))
+    # Sent as driver SQL with the statement's own bound parameters, so filter
+    # values are never rendered into (or reparsed from) the SQL text
+    compiled = statement.compile(dialect=bind.dialect)
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
@@ -69,3 +160,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
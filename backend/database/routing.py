@@ -0,0 +1,201 @@
+"""
+Read replica routing.
+
+Sessions from AsyncSessionLocal are RoutingSessions. Everything runs on
+the primary except the queries of code marked read-only (a service method
+decorated with read_only, or an on_replica block), which go to a healthy
+replica, taken in turn. Replicas are pinged every
+DATABASE_REPLICA_CHECK_INTERVAL seconds; one whose connection fails is
+left out until a ping succeeds again, and with none healthy (or none
+configured) reads stay on the primary. A session keeps the replica it
+was given until its transaction ends, so the statements of one read
+(say a set_config and the search it tunes) see the same backend.
+
+Read-your-writes: a session that has flushed reads from the primary from
+then on, and so does every request for DATABASE_REPLICA_STICKY_SECONDS
+after one that wrote (replica_sticky_middleware marks the client with a
+cookie), so nobody reads a replica that hasn't caught up with their own
+change yet.
+"""
+import asyncio
+import functools
+import itertools
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, List, Optional
+
+from fastapi import Request
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+from starlette.middleware.base import RequestResponseEndpoint
+
+logger = logging.getLogger(__name__)
+
+# Set on clients that just wrote; its presence pins their reads to the primary
+STICKY_COOKIE = "db_primary"
+
+
+class Replica:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.healthy = False
+
+    @property
+    def name(self) -> str:
+        return self.engine.url.render_as_string(hide_password=True)
+
+
+class ReplicaSet:
+    """Read replica engines with their health, handed out round-robin."""
+
+    def __init__(self, engines: List[AsyncEngine]):
+        self.replicas = [Replica(engine) for engine in engines]
+        self._turn = itertools.count()
+        self._checker: Optional[asyncio.Task] = None
+        for replica in self.replicas:
+            event.listen(replica.engine.sync_engine, "handle_error", functools.partial(self._on_error, replica))
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    def choose(self) -> Optional[AsyncEngine]:
+        """The next healthy replica's engine, or None if there is none."""
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)].engine
+
+    def _on_error(self, replica: Replica, context: Any) -> None:
+        if context.is_disconnect and replica.healthy:
+            replica.healthy = False
+            logger.warning(f"Read replica {replica.name} lost its connection; reading from the primary until it is back")
+
+    async def check(self, timeout: float = 5) -> None:
+        """Ping every replica and update its health."""
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as connection:
+                    await asyncio.wait_for(connection.execute(text("SELECT 1")), timeout)
+                healthy = True
+            except Exception as e:
+                healthy = False
+                if replica.healthy:
+                    logger.warning(f"Read replica {replica.name} failed its health check: {str(e)}")
+            if healthy and not replica.healthy:
+                logger.info(f"Read replica {replica.name} is healthy")
+            replica.healthy = healthy
+
+    async def start(self, interval: float) -> None:
+        """Check the replicas now, then every interval seconds in the background."""
+        if not self.replicas or self._checker is not None:
+            return
+        await self.check(timeout=interval)
+
+        async def check_forever() -> None:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.check(timeout=interval)
+                except Exception as e:
+                    logger.error(f"Read replica health check failed: {str(e)}")
+
+        self._checker = asyncio.create_task(check_forever())
+
+    async def close(self) -> None:
+        if self._checker is not None:
+            self._checker.cancel()
+            self._checker = None
+        for replica in self.replicas:
+            replica.healthy = False
+            await replica.engine.dispose()
+
+
+class _RequestRouting:
+    def __init__(self, pinned: bool):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# The current request's routing state (None outside replica_sticky_middleware)
+_request_routing: ContextVar[Optional[_RequestRouting]] = ContextVar("request_routing", default=None)
+
+
+class RoutingSession(Session):
+    """
+    Session that sends the queries of read-only code to a replica and
+    everything else to its own bind, the primary. Used as the
+    sync_session_class of AsyncSessions.
+    """
+
+    def __init__(self, *args, replicas: Optional[ReplicaSet] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        request = _request_routing.get()
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["wrote"] = True
+            if request is not None:
+                request.wrote = True
+        elif (
+            self.replicas
+            and self.info.get("read_only")
+            and not self.info.get("wrote")
+            and not (request is not None and request.pinned)
+        ):
+            if "replica" not in self.info:
+                self.info["replica"] = self.replicas.choose()
+            replica = self.info["replica"]
+            if replica is not None:
+                return replica.sync_engine
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _release_replica(session: Session, transaction: Any) -> None:
+    # The next transaction takes the next replica in turn
+    if transaction.parent is None:
+        session.info.pop("replica", None)
+
+
+@contextmanager
+def on_replica(db: AsyncSession) -> Iterator[None]:
+    """Run the session's queries in this block on a replica (see RoutingSession)."""
+    previous = db.info.get("read_only", False)
+    db.info["read_only"] = True
+    try:
+        yield
+    finally:
+        db.info["read_only"] = previous
+
+
+def read_only(method: Callable) -> Callable:
+    """Marks a service coroutine method whose queries (on self.db) may run on a replica."""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        with on_replica(self.db):
+            return await method(self, *args, **kwargs)
+    return wrapper
+
+
+def replica_sticky_middleware(sticky_seconds: int):
+    """
+    Middleware pinning the reads of a client that just wrote to the
+    primary for sticky_seconds, through a short-lived cookie.
+    """
+    async def middleware(request: Request, call_next: RequestResponseEndpoint):
+        state = _RequestRouting(pinned=STICKY_COOKIE in request.cookies)
+        # The app runs in a copy of this context, so it shares state
+        token = _request_routing.set(state)
+        try:
+            response = await call_next(request)
+        finally:
+            _request_routing.reset(token)
+        if state.wrote and sticky_seconds > 0:
+            response.set_cookie(STICKY_COOKIE, "1", max_age=sticky_seconds, httponly=True, samesite="lax")
+        return response
+
+    return middleware
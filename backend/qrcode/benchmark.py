@@ -0,0 +1,313 @@
+"""
+Benchmarks for the QR hot path (QRService.create_qr).
+
+Every case times the three phases of generating a code separately:
+
+    matrix  segment data, RS error correction and data placement
+    mask    trying the 8 mask patterns and keeping the lowest-penalty one
+    render  SVG rendering (quiet zone included)
+
+over a grid of payload lengths, ECC levels and box sizes, and records
+p50/p99 latency, output size per format and tracemalloc peak memory per
+phase. Payloads are generated from a fixed seed, so runs on the same
+machine are comparable.
+
+    python -m backend.qrcode.benchmark --output bench.json
+    python -m backend.qrcode.benchmark --compare bench.json --threshold 0.10
+
+With --compare the run is checked against an earlier result file and the
+process exits with status 1 if any phase's p50 (or any output size) grew
+by more than the threshold.
+"""
+import argparse
+import gc
+import json
+import math
+import platform
+import random
+import string
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import qrcode
+from qrcode import util
+
+from backend.qrcode import engine as numpy_engine
+from backend.qrcode.qservice import ERROR_CORRECTION_LEVELS, OUTPUT_FORMATS, QR_ENGINES, QRService
+
+DEFAULT_LENGTHS = (48, 128, 256, 512, 1024)
+DEFAULT_SIZES = (1, 10, 30)
+PHASES = ("matrix", "mask", "render")
+SEED = 18004
+
+_URL_PREFIX = "https://portal.example.edu/student/CSC/2019/0001"
+_QUERY_CHARS = string.ascii_letters + string.digits + "-_"
+
+
+def make_payload(length: int, seed: int = SEED) -> str:
+    """A student-URL-like payload of exactly length characters."""
+    if length <= len(_URL_PREFIX):
+        return _URL_PREFIX[:length]
+    rng = random.Random(seed + length)
+    query = "?ref=" + "".join(rng.choice(_QUERY_CHARS) for _ in range(length))
+    return (_URL_PREFIX + query)[:length]
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+    rank = max(1, math.ceil(percent / 100 * len(samples)))
+    return samples[rank - 1]
+
+
+def time_phase(fn: Callable[[], object], repeat: int, warmup: int) -> Dict[str, float]:
+    """Run fn warmup + repeat times with the GC off and summarize the timings in ms."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            fn()
+            samples.append((time.perf_counter_ns() - start) / 1e6)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    samples.sort()
+    return {
+        "p50_ms": round(percentile(samples, 50), 4),
+        "p99_ms": round(percentile(samples, 99), 4),
+        "mean_ms": round(sum(samples) / len(samples), 4),
+        "min_ms": round(samples[0], 4),
+        "runs": len(samples),
+    }
+
+
+def measure_allocations(fn: Callable[[], object]) -> Dict[str, int]:
+    """Peak traced memory during one call of fn, and what it left allocated."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {"peak_bytes": peak - before, "net_bytes": current - before}
+
+
+def _encode_phases(service: QRService, content: str, error_correction: str, optimize: bool):
+    """
+    The matrix and mask phases for the service's engine, as callables, plus
+    the final modules and version.
+    """
+    level = ERROR_CORRECTION_LEVELS[error_correction]
+    data_list, version = service._segments(content, error_correction, optimize)
+
+    if service.engine == "numpy":
+        data, version = numpy_engine.place_data(data_list, level, version)
+
+        def matrix():
+            return numpy_engine.place_data(data_list, level, version)
+
+        def mask():
+            return numpy_engine.select_mask(data, version, level)
+
+        modules, _ = mask()
+        return matrix, mask, modules.tolist(), version
+
+    if version is None:
+        version = numpy_engine.best_fit(data_list, level)
+
+    def build():
+        qr = qrcode.QRCode(version=version, error_correction=level, border=0)
+        for segment in data_list:
+            qr.add_data(segment)
+        return qr
+
+    built = build()
+    built.makeImpl(False, 0)
+
+    def matrix():
+        # One full symbol build with a fixed mask, including create_data
+        qr = build()
+        qr.makeImpl(False, 0)
+        return qr
+
+    def mask():
+        # The library builds and scores a trial symbol per mask pattern
+        return built.best_mask_pattern()
+
+    built.makeImpl(False, mask())
+    return matrix, mask, [[bool(cell) for cell in row] for row in built.modules], version
+
+
+def run(
+    engines=QR_ENGINES,
+    lengths=DEFAULT_LENGTHS,
+    levels=tuple(ERROR_CORRECTION_LEVELS),
+    sizes=DEFAULT_SIZES,
+    renderer: str = "path",
+    border: int = 4,
+    optimize: bool = False,
+    repeat: int = 30,
+    warmup: int = 3,
+    progress: Optional[Callable[[str], None]] = None,
+) -> Dict:
+    """Run the benchmark grid and return the results as a JSON-serializable dict."""
+    cases = []
+    for engine_name in engines:
+        service = QRService(engine=engine_name)
+        for length in lengths:
+            content = make_payload(length)
+            for error_correction in levels:
+                matrix, mask, modules, version = _encode_phases(service, content, error_correction, optimize)
+                # Encoding doesn't depend on the box size: time it once per payload / level
+                encode_timings = {
+                    "matrix": time_phase(matrix, repeat, warmup),
+                    "mask": time_phase(mask, repeat, warmup),
+                }
+                encode_allocations = {
+                    "matrix": measure_allocations(matrix),
+                    "mask": measure_allocations(mask),
+                }
+
+                for size in sizes:
+                    def render():
+                        return service.render_modules(modules, size, renderer, border, "svg")
+
+                    name = f"{engine_name}/{length}B/{error_correction}/x{size}"
+                    cases.append({
+                        "name": name,
+                        "engine": engine_name,
+                        "payload_bytes": len(util.to_bytestring(content)),
+                        "error_correction": error_correction,
+                        "size": size,
+                        "version": version,
+                        "modules": len(modules),
+                        "phases": dict(encode_timings, render=time_phase(render, repeat, warmup)),
+                        "allocations": dict(encode_allocations, render=measure_allocations(render)),
+                        "output_bytes": {
+                            output_format: len(service.render_modules(modules, size, renderer, border, output_format))
+                            for output_format in OUTPUT_FORMATS
+                        },
+                    })
+                    if progress is not None:
+                        progress(_format_case(cases[-1]))
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "qrcode": getattr(qrcode, "__version__", None) or _package_version("qrcode"),
+            "numpy": np.__version__,
+            "seed": SEED,
+            "repeat": repeat,
+            "warmup": warmup,
+            "renderer": renderer,
+            "border": border,
+            "optimize": optimize,
+        },
+        "cases": cases,
+    }
+
+
+def _package_version(name: str) -> Optional[str]:
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return None
+
+
+def _format_case(case: Dict) -> str:
+    phases = "  ".join(
+        f"{phase} {case['phases'][phase]['p50_ms']:.3f}/{case['phases'][phase]['p99_ms']:.3f}ms"
+        for phase in PHASES
+    )
+    return f"{case['name']:<24} v{case['version']:<3} {phases}  svg {case['output_bytes']['svg']}B"
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.10, min_delta_ms: float = 0.05) -> List[str]:
+    """
+    Compare two result dicts case by case. Returns one message per regression:
+    a phase p50 more than threshold (relative) and min_delta_ms (absolute)
+    slower, or an output that grew by more than threshold.
+    """
+    previous = {case["name"]: case for case in baseline["cases"]}
+    regressions = []
+    for case in current["cases"]:
+        old = previous.get(case["name"])
+        if old is None:
+            continue
+        for phase in PHASES:
+            new_ms = case["phases"][phase]["p50_ms"]
+            old_ms = old["phases"][phase]["p50_ms"]
+            if new_ms > old_ms * (1 + threshold) and new_ms - old_ms > min_delta_ms:
+                regressions.append(
+                    f"{case['name']} {phase}: p50 {old_ms:.3f}ms -> {new_ms:.3f}ms "
+                    f"(+{(new_ms / old_ms - 1) * 100:.0f}%)"
+                )
+        for output_format, new_bytes in case["output_bytes"].items():
+            old_bytes = old["output_bytes"].get(output_format)
+            if old_bytes and new_bytes > old_bytes * (1 + threshold):
+                regressions.append(f"{case['name']} {output_format}: {old_bytes}B -> {new_bytes}B")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark QR encoding and rendering")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown (0.10 = 10%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--engine", nargs="+", choices=QR_ENGINES, default=list(QR_ENGINES))
+    parser.add_argument("--lengths", nargs="+", type=int, default=list(DEFAULT_LENGTHS))
+    parser.add_argument("--ecc", nargs="+", choices=list(ERROR_CORRECTION_LEVELS), default=list(ERROR_CORRECTION_LEVELS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--renderer", choices=("path", "rect"), default="path")
+    parser.add_argument("--optimize", action="store_true", help="Use segment-optimized encoding")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results = run(
+        engines=args.engine,
+        lengths=args.lengths,
+        levels=args.ecc,
+        sizes=args.sizes,
+        renderer=args.renderer,
+        optimize=args.optimize,
+        repeat=args.repeat,
+        warmup=args.warmup,
+        progress=print,
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions over {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""
+NumPy QR encoding engine.
+
+Produces the same symbols as the ``qrcode`` library bit for bit. Segment
+data, RS block tables and function patterns come from the library itself;
+bit packing uses a Python int instead of a bit list, Reed-Solomon ECC is
+computed for all blocks at once, and data placement, the 8 mask candidates
+and the ISO 18004 penalty scoring are array operations over all masks
+instead of 8 passes of pure-Python loops.
+"""
+from bisect import bisect_left
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+import qrcode
+from qrcode import LUT, base, exceptions, util
+
+_GF_EXP = np.array(base.EXP_TABLE, dtype=np.int64)
+_GF_LOG = np.array(base.LOG_TABLE, dtype=np.int64)
+
+
+class _BitWriter:
+    """Drop-in for util.BitBuffer's put()/len(), accumulating into one int."""
+    __slots__ = ("value", "length")
+
+    def __init__(self):
+        self.value = 0
+        self.length = 0
+
+    def put(self, num, length):
+        self.value = (self.value << length) | (num & ((1 << length) - 1))
+        self.length += length
+
+    def __len__(self):
+        return self.length
+
+
+def _write_segments(data_list, version: int, mode_sizes=None) -> _BitWriter:
+    buffer = _BitWriter()
+    for data in data_list:
+        buffer.put(data.mode, 4)
+        if mode_sizes is None:
+            buffer.put(len(data), util.length_in_bits(data.mode, version))
+        else:
+            buffer.put(len(data), mode_sizes[data.mode])
+        data.write(buffer)
+    return buffer
+
+
+def best_fit(data_list, error_correction: int, start: int = 1) -> int:
+    """Smallest version that fits the segments (same search as QRCode.best_fit)."""
+    mode_sizes = util.mode_sizes_for_version(start)
+    needed_bits = len(_write_segments(data_list, start, mode_sizes))
+    version = bisect_left(util.BIT_LIMIT_TABLE[error_correction], needed_bits, start)
+    if version == 41:
+        raise exceptions.DataOverflowError()
+    if mode_sizes is not util.mode_sizes_for_version(version):
+        return best_fit(data_list, error_correction, version)
+    return version
+
+
+@lru_cache(maxsize=None)
+def _generator_logs(ec_count: int) -> np.ndarray:
+    """Log of the RS generator polynomial coefficients after the leading 1."""
+    if ec_count in LUT.rsPoly_LUT:
+        poly = LUT.rsPoly_LUT[ec_count]
+    else:
+        poly = base.Polynomial([1], 0)
+        for i in range(ec_count):
+            poly = poly * base.Polynomial([1, base.gexp(i)], 0)
+        poly = list(poly)
+    return _GF_LOG[np.array(poly[1:], dtype=np.int64)]
+
+
+def _error_correction(blocks: np.ndarray, ec_count: int) -> np.ndarray:
+    """
+    Reed-Solomon remainders for a (blocks, data) array of right-aligned
+    codewords (shorter blocks are left-padded with zeros, which doesn't
+    change the remainder). All blocks are divided in lockstep.
+    """
+    gen_logs = _generator_logs(ec_count)
+    remainder = np.zeros((blocks.shape[0], ec_count), dtype=np.int64)
+    for column in blocks.T:
+        factor = column ^ remainder[:, 0]
+        remainder[:, :-1] = remainder[:, 1:]
+        remainder[:, -1] = 0
+        nonzero = factor != 0
+        if nonzero.any():
+            terms = _GF_EXP[(_GF_LOG[factor[nonzero], None] + gen_logs) % 255]
+            remainder[nonzero] ^= terms
+    return remainder
+
+
+def create_data(version: int, error_correction: int, data_list) -> bytes:
+    """Final interleaved data + ECC codewords, identical to util.create_data."""
+    buffer = _write_segments(data_list, version)
+
+    rs_blocks = base.rs_blocks(version, error_correction)
+    bit_limit = sum(block.data_count * 8 for block in rs_blocks)
+    if len(buffer) > bit_limit:
+        raise exceptions.DataOverflowError(
+            "Code length overflow. Data size (%s) > size available (%s)"
+            % (len(buffer), bit_limit)
+        )
+
+    # Terminator, byte alignment, then alternating pad codewords
+    buffer.put(0, min(bit_limit - len(buffer), 4))
+    if len(buffer) % 8:
+        buffer.put(0, 8 - len(buffer) % 8)
+    payload = buffer.value.to_bytes(len(buffer) // 8, "big")
+    pad = bytes([util.PAD0, util.PAD1]) * (bit_limit // 16 + 1)
+    payload += pad[:bit_limit // 8 - len(payload)]
+
+    data_counts = [block.data_count for block in rs_blocks]
+    ec_counts = {block.total_count - block.data_count for block in rs_blocks}
+    max_data = max(data_counts)
+
+    # Rows are blocks; -1 marks the missing last codeword of short blocks
+    interleave = np.full((len(rs_blocks), max_data), -1, dtype=np.int64)
+    aligned = np.zeros((len(rs_blocks), max_data), dtype=np.int64)
+    codewords = np.frombuffer(payload, dtype=np.uint8).astype(np.int64)
+    offset = 0
+    for index, count in enumerate(data_counts):
+        interleave[index, :count] = codewords[offset:offset + count]
+        aligned[index, max_data - count:] = codewords[offset:offset + count]
+        offset += count
+
+    if len(ec_counts) == 1:
+        ec = _error_correction(aligned, ec_counts.pop())
+    else:  # not produced by the QR block tables, kept for safety
+        width = max(ec_counts)
+        ec = np.full((len(rs_blocks), width), -1, dtype=np.int64)
+        for index, block in enumerate(rs_blocks):
+            count = block.total_count - block.data_count
+            ec[index, :count] = _error_correction(aligned[index:index + 1], count)[0]
+
+    data = interleave.T.ravel()
+    ecc = ec.T.ravel()
+    return np.concatenate([data[data >= 0], ecc[ecc >= 0]]).astype(np.uint8).tobytes()
+
+
+@lru_cache(maxsize=None)
+def _layout(version: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-version constants: the function pattern values (with format and
+    version information left light, as the library scores masks), the mask
+    of reserved modules, and the coordinates of the data modules in the
+    order map_data fills them.
+    """
+    qr = qrcode.QRCode(version=version)
+    count = qr.modules_count = version * 4 + 17
+    qr.modules = [[None] * count for _ in range(count)]
+    qr.setup_position_probe_pattern(0, 0)
+    qr.setup_position_probe_pattern(count - 7, 0)
+    qr.setup_position_probe_pattern(0, count - 7)
+    qr.setup_position_adjust_pattern()
+    qr.setup_timing_pattern()
+    qr.setup_type_info(True, 0)
+    if version >= 7:
+        qr.setup_type_number(True)
+
+    reserved = np.array([[cell is not None for cell in row] for row in qr.modules])
+    values = np.array([[bool(cell) for cell in row] for row in qr.modules])
+
+    # Same zigzag walk as QRCode.map_data
+    rows, cols = [], []
+    inc = -1
+    row = count - 1
+    for col in range(count - 1, 0, -2):
+        if col <= 6:
+            col -= 1
+        while True:
+            for c in (col, col - 1):
+                if qr.modules[row][c] is None:
+                    rows.append(row)
+                    cols.append(c)
+            row += inc
+            if row < 0 or count <= row:
+                row -= inc
+                inc = -inc
+                break
+
+    for array in (reserved, values):
+        array.setflags(write=False)
+    return values, reserved, np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)
+
+
+@lru_cache(maxsize=None)
+def _mask_patterns(count: int) -> np.ndarray:
+    """The 8 mask patterns as an (8, count, count) boolean array (util.mask_func)."""
+    i, j = np.indices((count, count))
+    masks = np.stack([
+        (i + j) % 2 == 0,
+        i % 2 == 0,
+        j % 3 == 0,
+        (i + j) % 3 == 0,
+        (i // 2 + j // 3) % 2 == 0,
+        (i * j) % 2 + (i * j) % 3 == 0,
+        ((i * j) % 2 + (i * j) % 3) % 2 == 0,
+        ((i * j) % 3 + (i + j) % 2) % 2 == 0,
+    ])
+    masks.setflags(write=False)
+    return masks
+
+
+@lru_cache(maxsize=None)
+def _info_layer(version: int, error_correction: int, mask: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Coordinates and values of the final format (and version) information modules."""
+    qr = qrcode.QRCode(version=version, error_correction=error_correction)
+    count = qr.modules_count = version * 4 + 17
+    qr.modules = [[None] * count for _ in range(count)]
+    qr.setup_type_info(False, mask)
+    if version >= 7:
+        qr.setup_type_number(False)
+    cells = [(r, c, value) for r, row in enumerate(qr.modules) for c, value in enumerate(row) if value is not None]
+    rows, cols, values = zip(*cells)
+    return np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp), np.array(values, dtype=bool)
+
+
+def _run_penalty(lines: np.ndarray) -> np.ndarray:
+    """
+    Rule 1 for a stack of (masks, lines, length) arrays: every run of 5 or
+    more same-coloured modules costs (run length - 2). Returns one score per mask.
+    """
+    masks, count, length = lines.shape
+    edges = np.ones((masks * count, length + 1), dtype=bool)
+    flat = lines.reshape(masks * count, length)
+    edges[:, 1:length] = flat[:, 1:] != flat[:, :-1]
+    positions = np.flatnonzero(edges)
+    runs = np.diff(positions)
+    # Gaps between one line's end and the next line's start have length 1
+    # and fall below the threshold, so no per-line bookkeeping is needed.
+    long_runs = runs >= 5
+    owners = positions[:-1][long_runs] // (count * (length + 1))
+    return np.bincount(owners, weights=runs[long_runs] - 2, minlength=masks).astype(np.int64)
+
+
+def _finder_penalty(lines: np.ndarray) -> np.ndarray:
+    """Rule 3: 40 points per 1:1:3:1:1 finder-like pattern with a 4-module light side."""
+    length = lines.shape[2]
+    s = [lines[:, :, k:length - 10 + k] for k in range(11)]
+    core = ~s[1] & s[4] & ~s[5] & s[6] & ~s[9]
+    dark_first = s[0] & s[2] & s[3] & ~s[7] & ~s[8] & ~s[10]
+    light_first = ~s[0] & ~s[2] & ~s[3] & s[7] & s[8] & s[10]
+    return (core & (dark_first | light_first)).sum(axis=(1, 2)) * 40
+
+
+def penalty_scores(candidates: np.ndarray) -> List[int]:
+    """Total penalty (util.lost_point) for each symbol in an (n, count, count) stack."""
+    count = candidates.shape[1]
+    columns = candidates.transpose(0, 2, 1)
+
+    level1 = _run_penalty(candidates) + _run_penalty(columns)
+
+    top_left = candidates[:, :-1, :-1]
+    blocks = (
+        (top_left == candidates[:, 1:, :-1])
+        & (top_left == candidates[:, :-1, 1:])
+        & (top_left == candidates[:, 1:, 1:])
+    )
+    level2 = blocks.sum(axis=(1, 2)) * 3
+
+    level3 = _finder_penalty(candidates) + _finder_penalty(columns)
+
+    scores = []
+    dark_counts = candidates.sum(axis=(1, 2))
+    for index in range(candidates.shape[0]):
+        # Kept in plain float arithmetic to round exactly like the library
+        percent = float(dark_counts[index]) / (count ** 2)
+        level4 = int(abs(percent * 100 - 50) / 5) * 10
+        scores.append(int(level1[index]) + int(level2[index]) + int(level3[index]) + level4)
+    return scores
+
+
+def place_data(data_list, error_correction: int, version: Optional[int] = None) -> Tuple[np.ndarray, int]:
+    """
+    Encode the segments into codewords (with ECC) and lay the bits out in
+    the data area. Returns the unmasked data modules and the version used.
+    """
+    if version is None:
+        version = best_fit(data_list, error_correction)
+
+    _, _, rows, cols = _layout(version)
+    count = version * 4 + 17
+
+    codewords = np.frombuffer(create_data(version, error_correction, data_list), dtype=np.uint8)
+    bits = np.unpackbits(codewords)
+    data = np.zeros((count, count), dtype=bool)
+    placed = min(len(bits), len(rows))
+    data[rows[:placed], cols[:placed]] = bits[:placed]
+    return data, version
+
+
+def select_mask(data: np.ndarray, version: int, error_correction: int) -> Tuple[np.ndarray, int]:
+    """
+    Apply all 8 masks to the placed data, keep the one with the lowest
+    penalty and add the function patterns and format information.
+    Returns (modules, mask).
+    """
+    function_values, reserved, _, _ = _layout(version)
+    count = function_values.shape[0]
+
+    candidates = np.where(reserved, function_values, data ^ _mask_patterns(count))
+    scores = penalty_scores(candidates)
+    mask = scores.index(min(scores))
+
+    modules = candidates[mask].copy()
+    info_rows, info_cols, info_values = _info_layer(version, error_correction, mask)
+    modules[info_rows, info_cols] = info_values
+    return modules, mask
+
+
+def encode(data_list, error_correction: int, version: Optional[int] = None) -> Tuple[np.ndarray, int, int]:
+    """
+    Encode qrcode.util.QRData segments. Returns (modules, version, mask) where
+    modules is a boolean array without quiet zone, identical to what
+    qrcode.QRCode(...).make(fit=True) produces in ``modules``.
+    """
+    data, version = place_data(data_list, error_correction, version)
+    modules, mask = select_mask(data, version, error_correction)
+    return modules, version, mask
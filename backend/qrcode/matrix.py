@@ -0,0 +1,48 @@
+from typing import List, NamedTuple
+
+import numpy as np
+
+
+def modules_for_version(version: int) -> int:
+    """Number of modules per side for a QR version (without the quiet zone)."""
+    if not 1 <= version <= 40:
+        raise ValueError("QR version must be between 1 and 40")
+    return 17 + 4 * version
+
+
+class QRMatrix(NamedTuple):
+    """A QR symbol's modules (no quiet zone) with the parameters it was encoded with."""
+    modules: List[List[bool]]
+    version: int
+    error_correction: str
+
+
+def pack_matrix(modules) -> bytes:
+    """
+    Bit-pack a square module matrix (row-major, MSB first).
+    A version 5 symbol (37x37) packs into 172 bytes.
+    """
+    return np.packbits(np.asarray(modules, dtype=bool).ravel()).tobytes()
+
+
+def unpack_matrix(blob: bytes, version: int) -> List[List[bool]]:
+    """Inverse of pack_matrix for a symbol of the given version."""
+    side = modules_for_version(version)
+    if len(blob) != (side * side + 7) // 8:
+        raise ValueError("Packed matrix size does not match QR version")
+    bits = np.unpackbits(np.frombuffer(blob, dtype=np.uint8), count=side * side)
+    return bits.reshape(side, side).astype(bool).tolist()
+
+
+def add_border(modules, border: int = 4) -> List[List[bool]]:
+    """Surround the modules with a light quiet zone, like qrcode's get_matrix()."""
+    if border == 0:
+        return [list(row) for row in modules]
+    width = len(modules) + border * 2
+    blank = [False] * width
+    edge = [False] * border
+    return (
+        [list(blank) for _ in range(border)]
+        + [edge + list(row) + edge for row in modules]
+        + [list(blank) for _ in range(border)]
+    )
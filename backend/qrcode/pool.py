@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Per-process QRService used inside pool workers (no cache, no pool)
+_worker_service = None
+
+
+def _worker_init(engine: str = "qrcode") -> None:
+    """Import the encoder and build the worker's service once, at process start."""
+    global _worker_service
+    from backend.qrcode.qservice import QRService
+    _worker_service = QRService(engine=engine)
+
+
+def _worker_render(args: Tuple) -> Any:
+    """Render one QR code inside a worker process."""
+    if _worker_service is None:
+        _worker_init()
+    return _worker_service._render(*args)
+
+
+def _worker_ping() -> int:
+    return os.getpid()
+
+
+class QRProcessPool:
+    """
+    Process pool that runs QR encoding outside the web worker's GIL.
+
+    The executor is created per OS process: if the owning process forks
+    (e.g. pre-forking uvicorn/gunicorn workers), the child discards the
+    inherited handle and starts its own workers on first use. Workers are
+    started with the "spawn" method so they never inherit the web server's
+    threads, sockets or database connections.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, start_method: str = "spawn", engine: str = "qrcode"):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.start_method = start_method
+        self.engine = engine
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                # An executor inherited across fork is unusable in the child;
+                # drop the reference without shutting down the parent's workers.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_worker_init,
+                    initargs=(self.engine,),
+                )
+                self._pid = pid
+                logger.info(f"Started QR process pool with {self.max_workers} workers (pid {pid})")
+            return self._executor
+
+    def _reset(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def start(self) -> None:
+        """Warm start: spawn every worker and load the encoder before the first request."""
+        executor = self._get_executor()
+        pids = {future.result() for future in [executor.submit(_worker_ping) for _ in range(self.max_workers)]}
+        logger.info(f"QR process pool warm ({len(pids)} workers ready)")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the workers owned by this process."""
+        with self._lock:
+            executor, pid = self._executor, self._pid
+            self._executor = None
+        if executor is not None and pid == os.getpid():
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def submit(self, args: Tuple) -> Future:
+        """Submit render arguments (see QRService._render) to the pool."""
+        executor = self._get_executor()
+        try:
+            return executor.submit(_worker_render, args)
+        except BrokenProcessPool:
+            # A worker died (OOM kill etc.); rebuild the pool once and retry
+            logger.warning("QR process pool was broken, restarting it")
+            self._reset(executor)
+            return self._get_executor().submit(_worker_render, args)
+
+    async def run(self, args: Tuple) -> Any:
+        """Render in the pool and await the result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(args))
+
+    def map(self, arg_list: Iterable[Tuple]) -> List[Any]:
+        """Render several codes in the pool, blocking until all are done."""
+        futures = [self.submit(args) for args in arg_list]
+        return [future.result() for future in futures]
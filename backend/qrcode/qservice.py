@@ -1,43 +1,440 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
 import qrcode
+from qrcode.exceptions import DataOverflowError
+
+from backend.qrcode import engine as numpy_engine
+from backend.qrcode.cache import QRCache, make_cache_key
+from backend.qrcode.matrix import QRMatrix, add_border, unpack_matrix
+from backend.qrcode.pool import QRProcessPool
+from backend.qrcode.raster import RASTER_FORMATS, render_raster
+from backend.qrcode.segments import canonical_url_case, optimal_segments
+
+# Available SVG renderers. "path" merges runs of dark modules into a single
+# <path> element, "rect" is the original one-<rect>-per-module renderer.
+SVG_RENDERERS = ("path", "rect")
+
+# "svg" returns markup (str), the raster formats return encoded bytes.
+OUTPUT_FORMATS = ("svg",) + tuple(RASTER_FORMATS)
+
+ERROR_CORRECTION_LEVELS = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+# Encoding engines. "qrcode" runs the library's own make(), "numpy" is the
+# vectorized engine in backend/qrcode/engine.py (identical output, faster).
+QR_ENGINES = ("qrcode", "numpy")
+
+# Part of every cache key / ETag. Bump it whenever a renderer's output changes
+# so clients holding an old ETag don't get a 304 for stale markup.
+RENDER_VERSION = 1
+
+# Symbol versions remembered by symbol_version_async
+VERSION_CACHE_SIZE = 4096
+
 
 class QRService:
-    def create_qr(self, content: str, size: int = 10):
+    def __init__(
+        self,
+        cache: Optional[QRCache] = None,
+        pool: Optional[QRProcessPool] = None,
+        engine: str = "qrcode",
+        max_size: Optional[int] = None,
+        max_border: Optional[int] = None,
+    ):
+        if engine not in QR_ENGINES:
+            raise ValueError(f"Engine must be one of: {', '.join(QR_ENGINES)}")
+        self.cache = cache
+        self.pool = pool
+        self.engine = engine
+        # Upper bounds for render options taken from requests (None: no limit).
+        # Raster output is ((modules + 2 * border) * size) ** 2 bytes.
+        self.max_size = max_size
+        self.max_border = max_border
+        # (content, error_correction, optimize) -> symbol version, kept out of
+        # the render cache so it neither skews its stats nor takes its slots
+        self._versions: "OrderedDict[tuple, int]" = OrderedDict()
+
+    def _validate(
+        self,
+        content: str,
+        size: int,
+        renderer: str,
+        error_correction: str,
+        border: int,
+        output_format: str = "svg",
+    ):
+        if not content:
+            raise ValueError("Content cannot be empty")
+        if error_correction not in ERROR_CORRECTION_LEVELS:
+            raise ValueError(f"Error correction must be one of: {', '.join(ERROR_CORRECTION_LEVELS)}")
+        self._validate_render(size, renderer, border, output_format)
+
+    def _validate_render(self, size: int, renderer: str, border: int, output_format: str):
+        if size < 1:
+            raise ValueError("Size must be at least 1")
+        if self.max_size is not None and size > self.max_size:
+            raise ValueError(f"Size cannot be more than {self.max_size}")
+        if border < 0:
+            raise ValueError("Border cannot be negative")
+        if self.max_border is not None and border > self.max_border:
+            raise ValueError(f"Border cannot be more than {self.max_border}")
+        if renderer not in SVG_RENDERERS:
+            raise ValueError(f"Renderer must be one of: {', '.join(SVG_RENDERERS)}")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Format must be one of: {', '.join(OUTPUT_FORMATS)}")
+
+    def cache_key(
+        self,
+        content: str,
+        size: int = 10,
+        renderer: str = "path",
+        error_correction: str = "Q",
+        border: int = 4,
+        output_format: str = "svg",
+        optimize: bool = False,
+    ) -> str:
+        """
+        Return the content-addressed key for a QR request.
+        It is derived from the inputs only, so it can be used as a strong ETag
+        without rendering anything.
+        """
+        self._validate(content, size, renderer, error_correction, border, output_format)
+        # The SVG renderer choice doesn't affect raster output
+        if output_format != "svg":
+            renderer = None
+        return make_cache_key(
+            RENDER_VERSION, content, size, renderer, error_correction, border, output_format, bool(optimize)
+        )
+
+    def create_qr(
+        self,
+        content: str,
+        size: int = 10,
+        renderer: str = "path",
+        error_correction: str = "Q",
+        border: int = 4,
+        output_format: str = "svg",
+        optimize: bool = False,
+    ):
         """
         Generate a QR code for a given URL (or content).
         The content is now expected to be a short URL.
+        Returns SVG markup, or the encoded image bytes for raster formats.
+        Results are served from the cache when one is configured.
+        With optimize=True the content is segmented for the smallest version
+        (see encode_matrix).
+        """
+        key = self.cache_key(content, size, renderer, error_correction, border, output_format, optimize)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        output = self._render(content, size, renderer, error_correction, border, output_format, optimize)
+        if self.cache is not None:
+            self.cache.put(key, output)
+        return output
+
+    def _render(
+        self,
+        content: str,
+        size: int,
+        renderer: str,
+        error_correction: str,
+        border: int,
+        output_format: str = "svg",
+        optimize: bool = False,
+    ):
+        """Encode and render without touching the cache."""
+        encoded = self.encode_matrix(content, error_correction, optimize)
+        return self.render_modules(encoded.modules, size, renderer, border, output_format)
+
+    def _segments(self, content: str, error_correction: str, optimize: bool):
+        """
+        Data segments for content and the version to encode them at (None
+        means the smallest one that fits).
+        """
+        level = ERROR_CORRECTION_LEVELS[error_correction]
+        if optimize:
+            return optimal_segments(canonical_url_case(content), level)
+        qr = qrcode.QRCode(error_correction=level)
+        qr.add_data(content)
+        return qr.data_list, None
+
+    def encode_matrix(self, content: str, error_correction: str = "Q", optimize: bool = False) -> QRMatrix:
+        """
+        Encode content into a QR symbol and return its modules without the
+        quiet zone, plus the version and ECC level that were used. This is
+        the only step that runs the encoder; everything else renders from it.
+
+        With optimize=True the scheme and host of URLs are upper-cased and the
+        content is split into numeric / alphanumeric / byte segments so that
+        it fits the smallest possible version. By default the library's own
+        segmentation is used (byte mode except for long digit runs).
         """
         if not content:
             raise ValueError("Content cannot be empty")
-        
+        if error_correction not in ERROR_CORRECTION_LEVELS:
+            raise ValueError(f"Error correction must be one of: {', '.join(ERROR_CORRECTION_LEVELS)}")
+
         # If your content is just a URL, you likely don't need to perform any
         # truncation as URLs will be much shorter than 20,000 characters.
-        
-        qr = qrcode.QRCode(
-            version=None,  # Auto-detect version
-            error_correction=qrcode.constants.ERROR_CORRECT_Q,  # High error correction
-            box_size=size,
-            border=4,
+
+        try:
+            data_list, version = self._segments(content, error_correction, optimize)
+            if self.engine == "numpy":
+                modules, version, _ = numpy_engine.encode(
+                    data_list, ERROR_CORRECTION_LEVELS[error_correction], version
+                )
+                return QRMatrix(modules.tolist(), version, error_correction)
+
+            qr = qrcode.QRCode(
+                version=version,  # None: auto-detect version
+                error_correction=ERROR_CORRECTION_LEVELS[error_correction],
+                border=0,
+            )
+            for segment in data_list:
+                qr.add_data(segment)
+            qr.make(fit=version is None)
+        except DataOverflowError:
+            raise ValueError("Content is too long to fit in a QR code")
+
+        return QRMatrix([[bool(cell) for cell in row] for row in qr.modules], qr.version, error_correction)
+
+    def symbol_version(self, content: str, error_correction: str = "Q", optimize: bool = False) -> int:
+        """
+        Version the content is encoded at, without building the symbol.
+        The symbol is 4 * version + 17 modules wide.
+        """
+        if error_correction not in ERROR_CORRECTION_LEVELS:
+            raise ValueError(f"Error correction must be one of: {', '.join(ERROR_CORRECTION_LEVELS)}")
+        try:
+            data_list, version = self._segments(content, error_correction, optimize)
+            if version is None:
+                version = numpy_engine.best_fit(data_list, ERROR_CORRECTION_LEVELS[error_correction])
+        except DataOverflowError:
+            raise ValueError("Content is too long to fit in a QR code")
+        return version
+
+    async def symbol_version_async(self, content: str, error_correction: str = "Q", optimize: bool = False) -> int:
+        """
+        symbol_version run in the default thread executor (segmentation is
+        CPU work), remembered so repeat requests skip it. Only touched from
+        the event loop, so the LRU needs no lock.
+        """
+        key = (content, error_correction, bool(optimize))
+        version = self._versions.get(key)
+        if version is not None:
+            self._versions.move_to_end(key)
+            return version
+
+        version = await asyncio.get_running_loop().run_in_executor(
+            None, self.symbol_version, content, error_correction, optimize
         )
-        
-        qr.add_data(content)
-        qr.make(fit=True)
-        
-        return self.convert_to_svg(qr, size)
-    
-    def convert_to_svg(self, qr, pixel_size=10):
+        self._versions[key] = version
+        while len(self._versions) > VERSION_CACHE_SIZE:
+            self._versions.popitem(last=False)
+        return version
+
+    def render_modules(
+        self,
+        modules,
+        size: int = 10,
+        renderer: str = "path",
+        border: int = 4,
+        output_format: str = "svg",
+    ):
+        """Render already-encoded modules (no quiet zone) in any size or format."""
+        matrix = add_border(modules, border)
+        if output_format != "svg":
+            return render_raster(matrix, output_format, size)
+        if renderer == "rect":
+            return self.render_svg_rects(matrix, size)
+        return self.render_svg_path(matrix, size)
+
+    def stored_cache_key(
+        self,
+        packed: bytes,
+        version: int,
+        size: int = 10,
+        renderer: str = "path",
+        border: int = 4,
+        output_format: str = "svg",
+    ) -> str:
+        """Content-addressed key (and strong ETag) for rendering a stored matrix."""
+        self._validate_render(size, renderer, border, output_format)
+        if output_format != "svg":
+            renderer = None
+        return make_cache_key(RENDER_VERSION, "matrix", bytes(packed), version, size, renderer, border, output_format)
+
+    def render_stored(
+        self,
+        packed: bytes,
+        version: int,
+        size: int = 10,
+        renderer: str = "path",
+        border: int = 4,
+        output_format: str = "svg",
+    ):
+        """Render a bit-packed matrix persisted on a Student row, using the cache."""
+        key = self.stored_cache_key(packed, version, size, renderer, border, output_format)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        output = self.render_modules(unpack_matrix(bytes(packed), version), size, renderer, border, output_format)
+        if self.cache is not None:
+            self.cache.put(key, output)
+        return output
+
+    async def create_qr_async(
+        self,
+        content: str,
+        size: int = 10,
+        renderer: str = "path",
+        error_correction: str = "Q",
+        border: int = 4,
+        output_format: str = "svg",
+        optimize: bool = False,
+    ):
+        """
+        Async variant of create_qr for use in route handlers.
+        Encoding runs in the process pool when one is configured, otherwise
+        in the default thread executor, so the event loop is never blocked.
+        """
+        key = self.cache_key(content, size, renderer, error_correction, border, output_format, optimize)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        args = (content, size, renderer, error_correction, border, output_format, optimize)
+        if self.pool is not None:
+            output = await self.pool.run(args)
+        else:
+            output = await asyncio.get_running_loop().run_in_executor(None, self._render, *args)
+        if self.cache is not None:
+            self.cache.put(key, output)
+        return output
+
+    def _lookup_many(self, contents, size, renderer, error_correction, border, output_format, optimize):
+        """Deduplicate contents and split them into cache hits and pending work."""
+        unique = list(dict.fromkeys(contents))
+        keys = {
+            content: self.cache_key(content, size, renderer, error_correction, border, output_format, optimize)
+            for content in unique
+        }
+        results: Dict[str, Any] = {}
+        pending = []
+        for content in unique:
+            cached = self.cache.get(keys[content]) if self.cache is not None else None
+            results[content] = cached
+            if cached is None:
+                pending.append(content)
+        return keys, results, pending
+
+    def _store_many(self, keys, results, pending, outputs) -> Dict[str, Any]:
+        for content, output in zip(pending, outputs):
+            results[content] = output
+            if self.cache is not None:
+                self.cache.put(keys[content], output)
+        return results
+
+    def create_many(
+        self,
+        contents: List[str],
+        size: int = 10,
+        renderer: str = "path",
+        error_correction: str = "Q",
+        border: int = 4,
+        max_workers: int = 4,
+        output_format: str = "svg",
+        optimize: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Generate QR codes for several contents at once.
+
+        Duplicates are encoded only once. Cached codes are returned directly and
+        the rest are generated in the process pool if configured, otherwise on
+        up to max_workers threads. Returns a dict of content -> SVG (bytes for
+        raster formats) in first-seen order.
+        """
+        keys, results, pending = self._lookup_many(
+            contents, size, renderer, error_correction, border, output_format, optimize
+        )
+        arg_list = [
+            (content, size, renderer, error_correction, border, output_format, optimize)
+            for content in pending
+        ]
+
+        if self.pool is not None and arg_list:
+            outputs = self.pool.map(arg_list)
+        elif len(arg_list) == 1:
+            outputs = [self._render(*arg_list[0])]
+        elif arg_list:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(arg_list))) as executor:
+                outputs = list(executor.map(lambda args: self._render(*args), arg_list))
+        else:
+            outputs = []
+
+        return self._store_many(keys, results, pending, outputs)
+
+    async def create_many_async(
+        self,
+        contents: List[str],
+        size: int = 10,
+        renderer: str = "path",
+        error_correction: str = "Q",
+        border: int = 4,
+        max_workers: int = 4,
+        output_format: str = "svg",
+        optimize: bool = False,
+    ) -> Dict[str, Any]:
+        """Async variant of create_many; awaits the process pool directly when configured."""
+        if self.pool is None:
+            return await asyncio.get_running_loop().run_in_executor(
+                None,
+                self.create_many,
+                contents, size, renderer, error_correction, border, max_workers, output_format, optimize,
+            )
+
+        keys, results, pending = self._lookup_many(
+            contents, size, renderer, error_correction, border, output_format, optimize
+        )
+        outputs = await asyncio.gather(*[
+            self.pool.run((content, size, renderer, error_correction, border, output_format, optimize))
+            for content in pending
+        ])
+        return self._store_many(keys, results, pending, outputs)
+
+    def convert_to_svg(self, qr, pixel_size=10, renderer="path"):
         matrix = qr.get_matrix()
+        if renderer == "rect":
+            return self.render_svg_rects(matrix, pixel_size)
+        return self.render_svg_path(matrix, pixel_size)
+
+    def render_svg_rects(self, matrix, pixel_size=10):
+        """Render the matrix with one <rect> per dark module."""
         width = len(matrix)
         svg_width = width * pixel_size
-        
+
         svg = [
             f'<svg xmlns="http://www.w3.org/2000/svg" '
             f'width="{svg_width}" height="{svg_width}" '
             f'viewBox="0 0 {svg_width} {svg_width}" '
             f'shape-rendering="crispEdges">'
         ]
-        
+
         svg.append('<rect width="100%" height="100%" fill="white" fill-opacity="0.9"/>')
-        
+
         for y, row in enumerate(matrix):
             for x, cell in enumerate(row):
                 if cell:
@@ -45,6 +442,70 @@ class QRService:
                         f'<rect x="{x*pixel_size}" y="{y*pixel_size}" '
                         f'width="{pixel_size}" height="{pixel_size}" fill="black"/>'
                     )
-        
+
         svg.append('</svg>')
         return ''.join(svg)
+
+    def render_svg_path(self, matrix, pixel_size=10):
+        """
+        Render the matrix as a single <path> in one pass over the rows.
+
+        Horizontal runs of dark modules are merged, and a run that repeats
+        with the same start and end in the following rows is grown into a
+        rectangle instead of being emitted again. Coordinates are in module
+        units (the viewBox does the scaling) and every rectangle is written
+        as a relative move from the previous one, which keeps the numbers
+        in the path data short.
+        """
+        width = len(matrix)
+        svg_width = width * pixel_size
+
+        parts = []
+        # Pen position: the start of the last emitted subpath ("z" returns there).
+        pen = [0, 0]
+
+        def emit(x0, x1, y0, height):
+            run = x1 - x0
+            parts.append(f'm{x0 - pen[0]},{y0 - pen[1]}h{run}v{height}h-{run}z')
+            pen[0], pen[1] = x0, y0
+
+        # Runs still open from the previous row: (x0, x1) -> [y0, height]
+        open_runs = {}
+        for y, row in enumerate(matrix):
+            runs = []
+            x = 0
+            while x < width:
+                if row[x]:
+                    start = x
+                    while x < width and row[x]:
+                        x += 1
+                    runs.append((start, x))
+                else:
+                    x += 1
+
+            current = {}
+            for run in runs:
+                if run in open_runs:
+                    rect = open_runs.pop(run)
+                    rect[1] += 1
+                else:
+                    rect = [y, 1]
+                current[run] = rect
+
+            # Anything not continued by this row is finished
+            for (x0, x1), (y0, height) in sorted(open_runs.items(), key=lambda item: item[1][0]):
+                emit(x0, x1, y0, height)
+            open_runs = current
+
+        for (x0, x1), (y0, height) in sorted(open_runs.items(), key=lambda item: item[1][0]):
+            emit(x0, x1, y0, height)
+
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" '
+            f'width="{svg_width}" height="{svg_width}" '
+            f'viewBox="0 0 {width} {width}" '
+            f'shape-rendering="crispEdges">'
+            '<rect width="100%" height="100%" fill="white" fill-opacity="0.9"/>'
+            f'<path fill="black" d="{"".join(parts)}"/>'
+            '</svg>'
+        )
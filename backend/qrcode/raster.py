@@ -0,0 +1,102 @@
+import struct
+import zlib
+
+import numpy as np
+
+# Raster output formats and their media types
+RASTER_FORMATS = {
+    "png": "image/png",
+    "bmp": "image/bmp",
+    "pbm": "image/x-portable-bitmap",
+}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def scale_matrix(matrix, pixel_size: int) -> np.ndarray:
+    """
+    Turn a QR matrix (rows of booleans, True = dark) into a scaled 2D
+    uint8 bitmap where 1 is a dark pixel.
+    """
+    modules = np.asarray(matrix, dtype=np.uint8)
+    return np.repeat(np.repeat(modules, pixel_size, axis=0), pixel_size, axis=1)
+
+
+def pack_rows(bitmap: np.ndarray) -> np.ndarray:
+    """Pack a 0/1 bitmap into 1-bit rows, MSB first, padded to whole bytes."""
+    return np.packbits(bitmap, axis=1)
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + chunk_type
+        + data
+        + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+    )
+
+
+def render_png(matrix, pixel_size: int = 10, compression: int = 9) -> bytes:
+    """
+    Encode the matrix as a 1-bit palette PNG (index 0 = white, 1 = black).
+
+    The bitmap is built and bit-packed with array operations. Each scanline
+    gets filter type 0, and the whole image goes through one zlib call.
+    """
+    packed = pack_rows(scale_matrix(matrix, pixel_size))
+    height, row_bytes = packed.shape
+    width = len(matrix) * pixel_size
+
+    scanlines = np.zeros((height, row_bytes + 1), dtype=np.uint8)
+    scanlines[:, 1:] = packed
+
+    header = struct.pack(">IIBBBBB", width, height, 1, 3, 0, 0, 0)
+    palette = b"\xff\xff\xff\x00\x00\x00"
+    return b"".join([
+        PNG_SIGNATURE,
+        _png_chunk(b"IHDR", header),
+        _png_chunk(b"PLTE", palette),
+        _png_chunk(b"IDAT", zlib.compress(scanlines.tobytes(), compression)),
+        _png_chunk(b"IEND", b""),
+    ])
+
+
+def render_bmp(matrix, pixel_size: int = 10) -> bytes:
+    """Encode the matrix as an uncompressed 1-bit BMP (bottom-up rows, 4-byte aligned)."""
+    packed = pack_rows(scale_matrix(matrix, pixel_size))
+    height, row_bytes = packed.shape
+    width = len(matrix) * pixel_size
+    stride = (row_bytes + 3) & ~3
+
+    rows = np.zeros((height, stride), dtype=np.uint8)
+    rows[:, :row_bytes] = packed
+    pixels = rows[::-1].tobytes()
+
+    # Two-entry BGRA palette: index 0 white, index 1 black
+    palette = b"\xff\xff\xff\x00\x00\x00\x00\x00"
+    offset = 14 + 40 + len(palette)
+    file_header = struct.pack("<2sIHHI", b"BM", offset + len(pixels), 0, 0, offset)
+    info_header = struct.pack(
+        "<IiiHHIIiiII",
+        40, width, height, 1, 1, 0, len(pixels), 2835, 2835, 2, 2,
+    )
+    return file_header + info_header + palette + pixels
+
+
+def render_pbm(matrix, pixel_size: int = 10) -> bytes:
+    """Encode the matrix as a binary (P4) PBM, where 1 bits are black."""
+    packed = pack_rows(scale_matrix(matrix, pixel_size))
+    width = len(matrix) * pixel_size
+    return f"P4\n{width} {packed.shape[0]}\n".encode("ascii") + packed.tobytes()
+
+
+RASTER_RENDERERS = {
+    "png": render_png,
+    "bmp": render_bmp,
+    "pbm": render_pbm,
+}
+
+
+def render_raster(matrix, output_format: str, pixel_size: int = 10) -> bytes:
+    """Render the matrix to one of RASTER_FORMATS."""
+    return RASTER_RENDERERS[output_format](matrix, pixel_size)
@@ -0,0 +1,121 @@
+"""
+Payload-size-aware segmentation.
+
+The library encodes content as byte mode and only splits out numeric or
+alphanumeric runs of 20+ characters. Here the content is split into
+numeric / alphanumeric / byte segments with the fewest total bits
+(dynamic programming over the three modes, per version size class), and
+the smallest version that fits is chosen.
+"""
+from bisect import bisect_left
+from typing import List, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from qrcode import util
+from qrcode.exceptions import DataOverflowError
+
+_NUMERIC = frozenset(b"0123456789")
+_ALPHA_NUM = frozenset(util.ALPHA_NUM)
+
+# Modes in DP column order, and per-character cost in 1/6 bits
+_MODES = (util.MODE_8BIT_BYTE, util.MODE_ALPHA_NUM, util.MODE_NUMBER)
+_CHAR_COSTS = (48, 33, 20)
+
+# Character count field sizes change at versions 10 and 27
+_VERSION_CLASSES = ((1, 9), (10, 26), (27, 40))
+
+
+def canonical_url_case(content: str) -> str:
+    """
+    Upper-case the scheme and host of a URL so they fit alphanumeric mode.
+    Both are case-insensitive (RFC 3986); the path, query and fragment are
+    left untouched because the server may treat them case-sensitively.
+    Content that isn't an http(s) URL is returned unchanged.
+    """
+    parts = urlsplit(content)
+    if parts.scheme.lower() not in ("http", "https") or not parts.netloc or "@" in parts.netloc:
+        return content
+    return urlunsplit((parts.scheme.upper(), parts.netloc.upper(), parts.path, parts.query, parts.fragment))
+
+
+def _segment_modes(data: bytes, version: int) -> List[int]:
+    """Cheapest mode for every byte of data, given the count field sizes of version."""
+    infinity = float("inf")
+    head_costs = [(4 + util.length_in_bits(mode, version)) * 6 for mode in _MODES]
+    # costs[m]: fewest 1/6 bits to encode the data so far and end up in mode m
+    costs = list(head_costs)
+    # char_modes[i][m]: mode character i is encoded in on the cheapest way to state m
+    char_modes = []
+
+    for byte in data:
+        allowed = (True, byte in _ALPHA_NUM, byte in _NUMERIC)
+        direct = [costs[m] + _CHAR_COSTS[m] if allowed[m] else infinity for m in range(3)]
+        current = list(direct)
+        modes = [m if allowed[m] else None for m in range(3)]
+        # Or close the segment after this character and open one in another mode
+        for target in range(3):
+            for source in range(3):
+                if direct[source] == infinity:
+                    continue
+                switched = -(-direct[source] // 6) * 6 + head_costs[target]
+                if switched < current[target]:
+                    current[target] = switched
+                    modes[target] = source
+        costs = current
+        char_modes.append(modes)
+
+    result = []
+    state = min(range(3), key=lambda m: costs[m])
+    for modes in reversed(char_modes):
+        state = modes[state]
+        result.append(_MODES[state])
+    result.reverse()
+    return result
+
+
+def _to_segments(data: bytes, modes: List[int], version: int) -> List[util.QRData]:
+    """Group consecutive characters with the same mode into QRData segments."""
+    segments = []
+    start = 0
+    for end in range(1, len(data) + 1):
+        if end == len(data) or modes[end] != modes[start]:
+            mode = modes[start]
+            # Respect the character count field size
+            limit = (1 << util.length_in_bits(mode, version)) - 1
+            for chunk_start in range(start, end, limit):
+                chunk = data[chunk_start:min(end, chunk_start + limit)]
+                segments.append(util.QRData(chunk, mode=mode, check_data=False))
+            start = end
+    return segments
+
+
+def _bit_length(segments: List[util.QRData], version: int) -> int:
+    bits = 0
+    for segment in segments:
+        count = len(segment)
+        bits += 4 + util.length_in_bits(segment.mode, version)
+        if segment.mode == util.MODE_NUMBER:
+            bits += 10 * (count // 3) + (0, 4, 7)[count % 3]
+        elif segment.mode == util.MODE_ALPHA_NUM:
+            bits += 11 * (count // 2) + 6 * (count % 2)
+        else:
+            bits += 8 * count
+    return bits
+
+
+def optimal_segments(content: str, error_correction: int) -> Tuple[List[util.QRData], int]:
+    """
+    Split content into the segments that need the fewest bits and return
+    them with the smallest version that holds them at the given ECC level.
+
+    Raises DataOverflowError if the content doesn't fit in version 40.
+    """
+    data = util.to_bytestring(content)
+    limits = util.BIT_LIMIT_TABLE[error_correction]
+    for first, last in _VERSION_CLASSES:
+        modes = _segment_modes(data, first)
+        segments = _to_segments(data, modes, first)
+        version = bisect_left(limits, _bit_length(segments, first), first)
+        if version <= last:
+            return segments, version
+    raise DataOverflowError()
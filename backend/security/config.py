@@ -1,10 +1,24 @@
-from pydantic import EmailStr, Field, SecretStr
+from pydantic import EmailStr, Field, SecretStr, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
+from typing import Optional
 
 class Settings(BaseSettings):
     # Database settings
     DATABASE_URL: str
+    # URL of the async engine the API uses; derived from DATABASE_URL
+    # (postgresql:// -> postgresql+asyncpg://) when unset
+    ASYNC_DATABASE_URL: Optional[str] = None
+    # Connections kept open per engine, and extra ones allowed under load
+    DATABASE_POOL_SIZE: int = Field(10, ge=1)
+    DATABASE_MAX_OVERFLOW: int = Field(20, ge=0)
+    # Read replicas (comma-separated URLs) for the queries of read-only
+    # service methods; empty sends everything to DATABASE_URL. Replicas are
+    # pinged every CHECK_INTERVAL seconds, and a client's reads stay on the
+    # primary for STICKY_SECONDS after it writes
+    DATABASE_REPLICA_URLS: str = ""
+    DATABASE_REPLICA_CHECK_INTERVAL: int = Field(10, ge=1)
+    DATABASE_REPLICA_STICKY_SECONDS: int = Field(5, ge=0)
    
     # Application settings
     ENVIRONMENT: str = "development"
@@ -21,6 +35,57 @@ class Settings(BaseSettings):
     # Server settings
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    # Public origin used in the URLs encoded into student QR codes
+    PUBLIC_BASE_URL: str = "http://localhost:8000"
+    # Heading printed on student ID cards
+    ID_CARD_TITLE: str = "Student ID Card"
+    # Directory of the content-addressed student photo store
+    PHOTO_STORE_DIR: str = "data/photos"
+    # Uploaded photos: size limit, then re-encoded as PHOTO_FORMAT ("JPEG" or
+    # "WEBP") no larger than PHOTO_MAX_DIMENSION px on the longest side
+    PHOTO_MAX_UPLOAD_BYTES: int = Field(10 * 1024 * 1024, ge=1024)
+    PHOTO_MAX_PIXELS: int = Field(40_000_000, ge=1)
+    PHOTO_MAX_DIMENSION: int = Field(1024, ge=64)
+    PHOTO_FORMAT: str = "JPEG"
+    PHOTO_QUALITY: int = Field(85, ge=1, le=95)
+
+    # QR code cache settings
+    QR_CACHE_MAX_ENTRIES: int = Field(2048, ge=1)
+    QR_CACHE_MAX_BYTES: int = Field(32 * 1024 * 1024, ge=1024)
+    QR_BATCH_MAX_ITEMS: int = Field(500, ge=1)
+    QR_BATCH_WORKERS: int = Field(4, ge=1)
+    # Largest module size (px) and quiet zone (modules) a request may ask for
+    QR_MAX_SIZE: int = Field(50, ge=1)
+    QR_MAX_BORDER: int = Field(20, ge=0)
+    # Students read (and rendered) per round trip by the ZIP export
+    QR_EXPORT_CHUNK_SIZE: int = Field(500, ge=1)
+    # QR encoding engine: "numpy" (vectorized) or "qrcode" (library)
+    QR_ENGINE: str = "numpy"
+    # Opt-in process pool for QR encoding (0 workers = one per CPU)
+    QR_PROCESS_POOL_ENABLED: bool = False
+    QR_PROCESS_POOL_WORKERS: int = Field(0, ge=0)
+
+    # Student listing page size (default and upper bound for ?limit=)
+    STUDENT_PAGE_SIZE: int = Field(50, ge=1)
+    STUDENT_PAGE_SIZE_MAX: int = Field(200, ge=1)
+    # Students read per round trip by the CSV / NDJSON export
+    STUDENT_EXPORT_CHUNK_SIZE: int = Field(1000, ge=1)
+    # In-memory type-ahead index: students held (beyond it, suggestions come
+    # from the database) and seconds before it is rebuilt from the table (0 = never)
+    SUGGEST_INDEX_MAX_STUDENTS: int = Field(200_000, ge=1)
+    SUGGEST_INDEX_MAX_AGE: int = Field(600, ge=0)
+    # Bulk import: rows per batch (one transaction and audit entry each) and
+    # how many row errors the report lists
+    BULK_IMPORT_CHUNK_SIZE: int = Field(1000, ge=1)
+    BULK_IMPORT_MAX_ERRORS: int = Field(1000, ge=0)
+    # Public student page render cache: pages held, seconds before a cached
+    # page is checked against the database (writes through this process
+    # invalidate it at once), seconds an unknown matric stays cached (0 =
+    # not cached) and the max-age sent to browsers and proxies
+    STUDENT_PAGE_CACHE_MAX_ENTRIES: int = Field(10_000, ge=1)
+    STUDENT_PAGE_CACHE_TTL: int = Field(30, ge=0)
+    STUDENT_PAGE_MISSING_TTL: int = Field(30, ge=0)
+    STUDENT_PAGE_MAX_AGE: int = Field(60, ge=0)
 
     # Initial admin settings
     INITIAL_ADMIN_EMAIL: EmailStr
@@ -34,6 +99,14 @@ class Settings(BaseSettings):
         case_sensitive=True
     )
 
+    @field_validator("PHOTO_FORMAT")
+    @classmethod
+    def validate_photo_format(cls, v: str) -> str:
+        """Photos are re-encoded as JPEG or WebP only (see backend/student/upload.py)"""
+        if v.upper() not in ("JPEG", "WEBP"):
+            raise ValueError("PHOTO_FORMAT must be JPEG or WEBP")
+        return v.upper()
+
     @classmethod
     def validate_environment(cls, v: str) -> str:
         """Validate environment setting"""
@@ -175,13 +175,12 @@ async def admin_security_middleware(request: Request, call_next: RequestResponse
             # Check admin privileges using dependency-based approach
             if decoded_token.get('sub'):
                 # Import here to avoid circular imports
-                from backend.database.base import SessionLocal
+                from backend.database.base import AsyncSessionLocal
                 
-                # Create a new session for this request
-                db = SessionLocal()
-                try:
+                # Create a new session for this request (closed when done)
+                async with AsyncSessionLocal() as db:
                     admin_service = AdminService(db)
-                    admin_user = admin_service.get_admin_by_id(uuid.UUID(decoded_token['sub']))
+                    admin_user = await admin_service.get_admin_by_id(uuid.UUID(decoded_token['sub']))
                     
                     if not admin_user or not admin_user.is_admin:
                         raise HTTPException(status_code=403, detail="Admin privileges required")
@@ -192,9 +191,6 @@ async def admin_security_middleware(request: Request, call_next: RequestResponse
                     # Set admin user in request state
                     request.state.admin_user = admin_user
                     request.state.user = decoded_token
-                finally:
-                    # Always close the session when done
-                    db.close()
             
         except HTTPException:
             raise
@@ -236,14 +232,13 @@ class PasswordChangeMiddleware(BaseHTTPMiddleware):
         if user and 'sub' in user:
             try:
                 # Import database session here
-                from backend.database.base import SessionLocal
+                from backend.database.base import AsyncSessionLocal
                 
-                # Create a new session for this request
-                db = SessionLocal()
-                try:
+                # Create a new session for this request (closed when done)
+                async with AsyncSessionLocal() as db:
                     admin_service = AdminService(db)
                     
-                    admin_user = admin_service.get_admin_by_id(uuid.UUID(user['sub']))
+                    admin_user = await admin_service.get_admin_by_id(uuid.UUID(user['sub']))
                     # Check if attribute exists before accessing it
                     if admin_user and hasattr(admin_user, 'requires_password_change') and admin_user.requires_password_change:
                         raise HTTPException(
@@ -253,9 +248,6 @@ class PasswordChangeMiddleware(BaseHTTPMiddleware):
                                 "code": "PASSWORD_CHANGE_REQUIRED"
                             }
                         )
-                finally:
-                    # Always close the session when done
-                    db.close()
             except HTTPException:
                 raise
             except Exception as e:
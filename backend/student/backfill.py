@@ -0,0 +1,419 @@
+"""
+Backfill jobs for existing Student rows.
+
+Each job walks the table in id order, one chunk per transaction, and only
+touches rows that still need work, so an interrupted run can simply be
+started again (or resumed from a given id with --start-after).
+
+    python -m backend.student.backfill qr --chunk-size 500
+    python -m backend.student.backfill search --chunk-size 1000
+    python -m backend.student.backfill photos --chunk-size 200
+    python -m backend.student.backfill thumbnails --chunk-size 200
+    python -m backend.student.backfill prune-photos --min-age-hours 24
+    python -m backend.student.backfill unique-matric
+"""
+import argparse
+import logging
+from itertools import islice
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, func, literal, or_, text
+from sqlalchemy.orm import Session, load_only
+
+from backend.database.config import SessionLocal
+from backend.security.config import settings
+from backend.student.model import Student
+from backend.student.blobstore import photo_store
+from backend.student.thumbnails import make_thumbnails
+from backend.student.upload import prepare_photo
+from backend.student.util import encode_student_qr, set_student_photo
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_qr_matrices(
+    chunk_size: int = 500,
+    start_after: int = 0,
+    limit: Optional[int] = None,
+    db: Optional[Session] = None,
+) -> int:
+    """
+    Encode and store QR matrices for students that have none, or whose
+    stored matrix encodes an outdated URL (e.g. after PUBLIC_BASE_URL changed).
+
+    Returns the number of rows updated.
+    """
+    db = db or SessionLocal()
+    url_prefix = f"{settings.PUBLIC_BASE_URL.rstrip('/')}/student/"
+    needs_qr = or_(
+        Student.qr_matrix.is_(None),
+        Student.qr_content.is_distinct_from(literal(url_prefix) + Student.Matric),
+    )
+
+    last_id = start_after
+    updated = 0
+    try:
+        while limit is None or updated < limit:
+            batch_size = chunk_size if limit is None else min(chunk_size, limit - updated)
+            students = (
+                db.query(Student)
+                .options(load_only(
+                    Student.id, Student.Matric, Student.qr_content,
+                    Student.qr_matrix, Student.qr_version, Student.qr_ecc,
+                ))
+                .filter(Student.id > last_id, needs_qr)
+                .order_by(Student.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not students:
+                break
+
+            for student in students:
+                encode_student_qr(student)
+            db.commit()
+
+            last_id = students[-1].id
+            updated += len(students)
+            logger.info(f"QR backfill: {updated} students updated (last id {last_id})")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"QR backfill stopped after id {last_id}: {e}")
+        raise
+    finally:
+        db.close()
+
+    logger.info(f"QR backfill complete: {updated} students updated")
+    return updated
+
+
+def backfill_search_vectors(
+    chunk_size: int = 1000,
+    start_after: int = 0,
+    limit: Optional[int] = None,
+    db: Optional[Session] = None,
+) -> int:
+    """
+    Fill search_vector (see backend/student/search.py) for students that
+    existed before its trigger, by touching their Matric so the trigger
+    runs. PostgreSQL only.
+
+    Returns the number of rows updated.
+    """
+    db = db or SessionLocal()
+    last_id = start_after
+    updated = 0
+    try:
+        if db.get_bind().dialect.name != "postgresql":
+            logger.info("Search backfill: nothing to do, search vectors are PostgreSQL only")
+            return 0
+        while limit is None or updated < limit:
+            batch_size = chunk_size if limit is None else min(chunk_size, limit - updated)
+            ids = db.execute(text(
+                'WITH chunk AS ('
+                ' SELECT id FROM "Student" WHERE id > :last_id AND search_vector IS NULL'
+                ' ORDER BY id LIMIT :batch_size'
+                ') '
+                'UPDATE "Student" AS s SET "Matric" = s."Matric" FROM chunk WHERE s.id = chunk.id '
+                'RETURNING s.id'
+            ), {"last_id": last_id, "batch_size": batch_size}).scalars().all()
+            if not ids:
+                break
+            db.commit()
+
+            last_id = max(ids)
+            updated += len(ids)
+            logger.info(f"Search backfill: {updated} students updated (last id {last_id})")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Search backfill stopped after id {last_id}: {e}")
+        raise
+    finally:
+        db.close()
+
+    logger.info(f"Search backfill complete: {updated} students updated")
+    return updated
+
+
+def migrate_photos(
+    chunk_size: int = 200,
+    start_after: int = 0,
+    limit: Optional[int] = None,
+    db: Optional[Session] = None,
+) -> int:
+    """
+    Move base64 photos out of the image column into the photo blob store
+    (normalized like new uploads), leaving only their hash on the row. Rows
+    whose image can't be decoded are logged and left as they are.
+
+    Returns the number of photos moved.
+    """
+    db = db or SessionLocal()
+    has_inline_image = and_(Student.image.isnot(None), Student.image != "")
+
+    last_id = start_after
+    moved = 0
+    try:
+        while limit is None or moved < limit:
+            batch_size = chunk_size if limit is None else min(chunk_size, limit - moved)
+            students = (
+                db.query(Student)
+                .options(load_only(Student.id, Student.Matric, Student.image, Student.photo_hash, Student.photo_type))
+                .filter(Student.id > last_id, has_inline_image)
+                .order_by(Student.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not students:
+                break
+
+            for student in students:
+                try:
+                    set_student_photo(student, prepare_photo(student.image))
+                    moved += 1
+                except ValueError as e:
+                    logger.warning(f"Photo migration: skipping student {student.Matric}: {e}")
+            # Files are written before the commit; a crash in between leaves
+            # only unreferenced blobs for prune-photos
+            db.commit()
+
+            last_id = students[-1].id
+            logger.info(f"Photo migration: {moved} photos moved (last id {last_id})")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Photo migration stopped after id {last_id}: {e}")
+        raise
+    finally:
+        db.close()
+
+    logger.info(f"Photo migration complete: {moved} photos moved")
+    return moved
+
+
+def backfill_thumbnails(
+    chunk_size: int = 200,
+    start_after: int = 0,
+    overwrite: bool = False,
+    db: Optional[Session] = None,
+) -> int:
+    """
+    Make the thumbnails missing for stored photos (all of them with
+    overwrite, e.g. after changing the sizes or quality).
+
+    Returns the number of thumbnails written.
+    """
+    db = db or SessionLocal()
+    last_id = start_after
+    written = 0
+    try:
+        while True:
+            rows = (
+                db.query(Student.id, Student.photo_hash)
+                .filter(Student.id > last_id, Student.photo_hash.isnot(None))
+                .order_by(Student.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                break
+            for digest in {row.photo_hash for row in rows}:
+                written += make_thumbnails(digest, overwrite=overwrite)
+            last_id = rows[-1].id
+            logger.info(f"Thumbnail backfill: {written} thumbnails written (last id {last_id})")
+    except Exception as e:
+        logger.error(f"Thumbnail backfill stopped after id {last_id}: {e}")
+        raise
+    finally:
+        db.close()
+
+    logger.info(f"Thumbnail backfill complete: {written} thumbnails written")
+    return written
+
+
+def prune_photos(min_age_hours: float = 24, chunk_size: int = 500, db: Optional[Session] = None) -> int:
+    """
+    Delete blobs no student references any more (replaced or removed
+    photos). Blobs written in the last min_age_hours are kept, so uploads
+    whose transaction hasn't committed yet are never pruned.
+
+    Returns the number of blobs deleted.
+    """
+    db = db or SessionLocal()
+    deleted = 0
+    try:
+        digests = photo_store.digests(older_than=min_age_hours * 3600)
+        while True:
+            chunk = list(islice(digests, chunk_size))
+            if not chunk:
+                break
+            referenced = {
+                row.photo_hash
+                for row in db.query(Student.photo_hash).filter(Student.photo_hash.in_(chunk)).distinct()
+            }
+            for digest in chunk:
+                if digest not in referenced and photo_store.delete(digest):
+                    deleted += 1
+    finally:
+        db.close()
+
+    logger.info(f"Photo prune complete: {deleted} unreferenced blobs deleted")
+    return deleted
+
+
+# Name create_all() gives the unique index on a new database (Column(unique=True, index=True))
+MATRIC_INDEX = "ix_Student_Matric"
+
+
+# Held while unique_matric runs, so only one process builds the index
+_UNIQUE_MATRIC_LOCK = 0x4D415452
+# Set once the index exists; it is never dropped again
+_matric_unique = False
+
+
+def matric_is_unique(db: Session) -> bool:
+    """
+    Whether the database enforces unique Matric numbers. False on a
+    PostgreSQL database whose unique index unique_matric hasn't built yet;
+    callers then guard against duplicates themselves.
+    """
+    global _matric_unique
+    if _matric_unique:
+        return True
+    if db.get_bind().dialect.name != "postgresql":
+        # Created by create_all() with the table
+        return True
+    _matric_unique = bool(db.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = '\"Student\"'::regclass AND i.indisunique AND c.relname = :name"
+    ), {"name": MATRIC_INDEX}).scalar())
+    return _matric_unique
+
+
+def find_duplicate_matrics(db: Session) -> Dict[str, List[int]]:
+    """Matric numbers held by more than one student, with those students' ids."""
+    duplicates = (
+        db.query(Student.Matric)
+        .filter(Student.Matric.isnot(None))
+        .group_by(Student.Matric)
+        .having(func.count(Student.id) > 1)
+        .subquery()
+    )
+    found: Dict[str, List[int]] = {}
+    for matric, student_id in (
+        db.query(Student.Matric, Student.id).join(duplicates, duplicates.c.Matric == Student.Matric).order_by(Student.id)
+    ):
+        found.setdefault(matric, []).append(student_id)
+    return found
+
+
+def unique_matric(db: Optional[Session] = None) -> bool:
+    """
+    Make Student.Matric unique on a database created before it was: build
+    the unique index CONCURRENTLY (writes carry on meanwhile), then drop the
+    plain index it replaces. Existing duplicates are logged instead, and
+    the job can be run again once they are resolved.
+
+    Returns True if Matric is unique (already, or now); False also while
+    another process is running the job.
+    """
+    db = db or SessionLocal()
+    try:
+        engine = db.get_bind()
+        if engine.dialect.name != "postgresql":
+            return False
+        # CREATE / DROP INDEX CONCURRENTLY can't run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            # Every worker runs this at startup; the cleanup below would drop
+            # an index another one is still building
+            if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _UNIQUE_MATRIC_LOCK}).scalar():
+                logger.info("Matric index is being built by another process")
+                return False
+            try:
+                return _build_unique_matric(db, conn)
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _UNIQUE_MATRIC_LOCK})
+    finally:
+        db.close()
+
+
+def _build_unique_matric(db: Session, conn) -> bool:
+    """unique_matric with the lock held; conn is in autocommit mode."""
+    if matric_is_unique(db):
+        db.rollback()
+        return True
+
+    duplicates = find_duplicate_matrics(db)
+    # The index build waits for open transactions, this one included
+    db.rollback()
+    if duplicates:
+        for matric, ids in list(duplicates.items())[:100]:
+            logger.error(f"Duplicate Matric {matric!r}: students {ids}")
+        logger.error(
+            f"Matric is not unique yet: {len(duplicates)} matric numbers are shared. Rename or delete the "
+            "extra students, then run: python -m backend.student.backfill unique-matric"
+        )
+        return False
+
+    # Left INVALID by an earlier build that failed part way
+    conn.execute(text('DROP INDEX CONCURRENTLY IF EXISTS "ux_Student_Matric"'))
+    try:
+        conn.execute(text('CREATE UNIQUE INDEX CONCURRENTLY "ux_Student_Matric" ON "Student" ("Matric")'))
+    except Exception as e:
+        # A duplicate registered while the index was being built
+        logger.error(f"Could not make Matric unique: {e}")
+        conn.execute(text('DROP INDEX CONCURRENTLY IF EXISTS "ux_Student_Matric"'))
+        return False
+    conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{MATRIC_INDEX}"'))
+    conn.execute(text(f'ALTER INDEX "ux_Student_Matric" RENAME TO "{MATRIC_INDEX}"'))
+    logger.info("Matric is now unique")
+    return True
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Backfill derived data on Student rows")
+    subparsers = parser.add_subparsers(dest="job", required=True)
+
+    qr_parser = subparsers.add_parser("qr", help="Encode and store QR matrices")
+    qr_parser.add_argument("--chunk-size", type=int, default=500)
+    qr_parser.add_argument("--start-after", type=int, default=0, help="Resume after this student id")
+    qr_parser.add_argument("--limit", type=int, default=None, help="Stop after this many rows")
+
+    search_parser = subparsers.add_parser("search", help="Fill the search vectors of older students")
+    search_parser.add_argument("--chunk-size", type=int, default=1000)
+    search_parser.add_argument("--start-after", type=int, default=0, help="Resume after this student id")
+    search_parser.add_argument("--limit", type=int, default=None, help="Stop after this many rows")
+
+    photos_parser = subparsers.add_parser("photos", help="Move inline photos to the photo blob store")
+    photos_parser.add_argument("--chunk-size", type=int, default=200)
+    photos_parser.add_argument("--start-after", type=int, default=0, help="Resume after this student id")
+    photos_parser.add_argument("--limit", type=int, default=None, help="Stop after this many photos")
+
+    thumbnails_parser = subparsers.add_parser("thumbnails", help="Make missing photo thumbnails")
+    thumbnails_parser.add_argument("--chunk-size", type=int, default=200)
+    thumbnails_parser.add_argument("--start-after", type=int, default=0, help="Resume after this student id")
+    thumbnails_parser.add_argument("--overwrite", action="store_true", help="Remake existing thumbnails too")
+
+    prune_parser = subparsers.add_parser("prune-photos", help="Delete photo blobs no student references")
+    prune_parser.add_argument("--min-age-hours", type=float, default=24, help="Keep blobs newer than this")
+
+    subparsers.add_parser("unique-matric", help="Report duplicate Matric numbers, or make Matric unique")
+
+    args = parser.parse_args(argv)
+    if args.job == "qr":
+        backfill_qr_matrices(args.chunk_size, args.start_after, args.limit)
+    elif args.job == "search":
+        backfill_search_vectors(args.chunk_size, args.start_after, args.limit)
+    elif args.job == "photos":
+        migrate_photos(args.chunk_size, args.start_after, args.limit)
+    elif args.job == "thumbnails":
+        backfill_thumbnails(args.chunk_size, args.start_after, args.overwrite)
+    elif args.job == "prune-photos":
+        prune_photos(args.min_age_hours)
+    elif args.job == "unique-matric":
+        if not unique_matric():
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
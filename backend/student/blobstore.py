@@ -0,0 +1,105 @@
+"""
+Content-addressed file store.
+
+Every blob is saved under the SHA-256 of its bytes, fanned out over two
+directory levels (<root>/ab/cd/abcd...), so identical uploads share one
+file and a row only has to keep the 64-character digest. Files derived from
+a blob (e.g. thumbnails) are kept next to it as variants named
+<digest>.<variant> and are removed together with it. Files are written
+to a temporary name and renamed into place, so readers never see a partial
+blob. Blobs are never modified; unreferenced ones are removed by a separate
+sweep (see backend/student/backfill.py) rather than on update, so a blob
+that is re-uploaded concurrently can't be deleted underneath it.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator, Union
+
+from backend.security.config import settings
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+_VARIANT = re.compile(r"[0-9A-Za-z_-]+(\.[0-9A-Za-z]+)?")
+
+
+class BlobStore:
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+
+    def path(self, digest: str) -> Path:
+        """Location of a blob. Raises ValueError for anything that isn't a SHA-256 hex digest."""
+        if not _DIGEST.fullmatch(digest or ""):
+            raise ValueError(f"Invalid blob digest: {digest!r}")
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def variant_path(self, digest: str, variant: str) -> Path:
+        if not _VARIANT.fullmatch(variant or ""):
+            raise ValueError(f"Invalid blob variant: {variant!r}")
+        path = self.path(digest)
+        return path.with_name(f"{path.name}.{variant}")
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).is_file()
+
+    def put(self, data: bytes) -> str:
+        """Store data (once) and return its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if path.is_file():
+            # Deduplicated; refresh the mtime so a running sweep keeps it
+            os.utime(path)
+            return digest
+        self._write(path, data)
+        return digest
+
+    def put_variant(self, digest: str, variant: str, data: bytes) -> Path:
+        """Store a file derived from blob digest, replacing any earlier version."""
+        path = self.variant_path(digest, variant)
+        self._write(path, data)
+        return path
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            try:
+                os.unlink(temporary)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def read(self, digest: str) -> bytes:
+        return self.path(digest).read_bytes()
+
+    def delete(self, digest: str) -> bool:
+        """Remove a blob and its variants; False if the blob wasn't there."""
+        path = self.path(digest)
+        for variant in path.parent.glob(f"{digest}.*"):
+            variant.unlink(missing_ok=True)
+        try:
+            path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def digests(self, older_than: float = 0) -> Iterator[str]:
+        """Digests of the stored blobs last written more than older_than seconds ago."""
+        if not self.root.is_dir():
+            return
+        cutoff = time.time() - older_than
+        for path in self.root.glob("??/??/*"):
+            if _DIGEST.fullmatch(path.name) and path.stat().st_mtime < cutoff:
+                yield path.name
+
+
+photo_store = BlobStore(settings.PHOTO_STORE_DIR)
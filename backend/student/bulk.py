@@ -0,0 +1,250 @@
+"""
+Bulk student import.
+
+Uploads (CSV with a header row, or NDJSON, one object per line) are read
+row by row from the spooled upload file, so only one batch of rows is in
+memory at a time. AdminStudentService validates each batch, then
+merge_students loads it with asyncpg's binary COPY into a temporary
+staging table and merges it into "Student" with one INSERT ... ON CONFLICT
+("Matric"), which skips or (if asked for) updates the students that
+already exist. Until the unique Matric index exists (see
+backfill.unique_matric) the batch is merged under a table lock instead.
+Each batch is one transaction with one summarized audit entry.
+"""
+import codecs
+import csv
+import json
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.student.backfill import matric_is_unique
+from backend.student.model import Student
+from backend.student.util import encode_student_qr
+
+IMPORT_FORMATS = ("csv", "ndjson")
+IMPORT_FIELDS = ("Matric", "Firstname", "Lastname", "gender", "course", "level", "section")
+# Written alongside the imported fields, so imported rows need no QR backfill
+_QR_FIELDS = ("qr_content", "qr_matrix", "qr_version", "qr_ecc")
+_STAGED_FIELDS = IMPORT_FIELDS + _QR_FIELDS
+
+# Emptied at every commit, so one table per connection serves every batch
+_CREATE_STAGING = """
+CREATE TEMPORARY TABLE IF NOT EXISTS student_import (
+    "Matric" varchar, "Firstname" varchar, "Lastname" varchar, gender varchar,
+    course varchar, level varchar, section varchar,
+    qr_content varchar, qr_matrix bytea, qr_version integer, qr_ecc varchar(1)
+) ON COMMIT DELETE ROWS
+"""
+_COLUMNS = ", ".join(f'"{field}"' for field in _STAGED_FIELDS)
+_STAGED_COLUMNS = ", ".join(f's."{field}"' for field in _STAGED_FIELDS)
+_UPDATED_COLUMNS = ", ".join(
+    [f'"{field}" = EXCLUDED."{field}"' for field in IMPORT_FIELDS[1:]] + ["version = t.version + 1"]
+)
+# For databases whose Matric isn't unique yet (see backfill.unique_matric)
+_UPDATED_FROM_STAGING = ", ".join(
+    [f'"{field}" = s."{field}"' for field in IMPORT_FIELDS[1:]] + ["version = t.version + 1"]
+)
+_RETURNING = 'RETURNING t.id, t."Matric", t."Firstname", t."Lastname"'
+
+# Bytes read from the upload at a time, and the longest line accepted
+_READ_SIZE = 64 * 1024
+_MAX_LINE = 1024 * 1024
+
+# (id, Matric, Firstname, Lastname) of a merged row
+MergedRow = Tuple[int, str, str, str]
+
+
+class ImportRow(NamedTuple):
+    line: int
+    data: Optional[Dict[str, Any]]  # None when the row couldn't be read
+    error: Optional[str] = None
+
+
+def import_format(requested: Optional[str], filename: Optional[str], content_type: Optional[str]) -> str:
+    """The upload format: as requested, else from the file name or content type."""
+    if requested:
+        fmt = requested.lower()
+    elif (filename or "").lower().endswith((".ndjson", ".jsonl")) or "json" in (content_type or ""):
+        fmt = "ndjson"
+    else:
+        fmt = "csv"
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Format must be one of: {', '.join(IMPORT_FORMATS)}")
+    return fmt
+
+
+def _clean(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """The import fields of a row as stripped strings (missing ones empty)."""
+    data = {}
+    for field in IMPORT_FIELDS:
+        value = raw.get(field)
+        if isinstance(value, (dict, list)):
+            raise ValueError(f"Field {field} must be a string")
+        data[field] = "" if value is None else str(value).strip()
+    return data
+
+
+def read_import_rows(upload: BinaryIO, fmt: str) -> Iterator[ImportRow]:
+    """
+    Rows of an upload in file order, numbered by the line they end on.
+    Rows that can't be read are yielded with an error instead of data.
+
+    Raises:
+        ValueError: If a CSV header lacks a required column (checked before
+            any row is returned).
+    """
+    lines = _lines(upload)
+    if fmt == "ndjson":
+        return _read_ndjson(lines)
+    reader = csv.DictReader(lines)
+    missing = [field for field in IMPORT_FIELDS if field not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV header is missing columns: {', '.join(missing)}")
+    return _read_csv(reader)
+
+
+def _lines(upload: BinaryIO) -> Iterator[str]:
+    """
+    Decoded lines, ends kept. Split on "\n" only, as csv expects (quoted
+    fields may hold "\r" or other line breaks).
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    while True:
+        chunk = upload.read(_READ_SIZE)
+        try:
+            pending += decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError:
+            raise ValueError("File is not valid UTF-8")
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+        if len(pending) > _MAX_LINE:
+            raise ValueError(f"Line longer than {_MAX_LINE} characters")
+        if not chunk:
+            break
+    if pending:
+        yield pending
+
+
+def _read_csv(reader: csv.DictReader) -> Iterator[ImportRow]:
+    try:
+        for raw in reader:
+            try:
+                yield ImportRow(reader.line_num, _clean(raw))
+            except ValueError as e:
+                yield ImportRow(reader.line_num, None, str(e))
+    except (ValueError, csv.Error) as e:
+        # Undecodable or malformed past this point; nothing more can be read
+        yield ImportRow(reader.line_num + 1, None, f"Unreadable from here on: {str(e)}")
+
+
+def _read_ndjson(lines: Iterator[str]) -> Iterator[ImportRow]:
+    line_number = 0
+    try:
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+                if not isinstance(raw, dict):
+                    raise ValueError("Each line must be a JSON object")
+                yield ImportRow(line_number, _clean(raw))
+            except ValueError as e:
+                yield ImportRow(line_number, None, str(e))
+    except ValueError as e:
+        yield ImportRow(line_number + 1, None, f"Unreadable from here on: {str(e)}")
+
+
+def staged_values(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Import fields plus the encoded QR matrix of the student's public URL."""
+    student = Student(**data)
+    encode_student_qr(student)
+    return {field: getattr(student, field) for field in _STAGED_FIELDS}
+
+
+async def merge_students(
+    db: AsyncSession, rows: List[Dict[str, Any]], update_existing: bool = False
+) -> Tuple[List[MergedRow], List[MergedRow]]:
+    """
+    Insert staged_values() rows whose Matric isn't registered yet, and
+    update the ones that are if update_existing. Runs in the caller's
+    transaction. Returns the (inserted, updated) rows; a Matric in neither
+    was already registered and left alone.
+    """
+    if db.get_bind().dialect.driver != "asyncpg":
+        return await db.run_sync(_merge_fallback, rows, update_existing)
+
+    connection = await db.connection()
+    await connection.execute(text(_CREATE_STAGING))
+    # Same connection and transaction as the statements around it
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        "student_import",
+        records=[tuple(row[field] for field in _STAGED_FIELDS) for row in rows],
+        columns=list(_STAGED_FIELDS),
+    )
+
+    if not await db.run_sync(matric_is_unique):
+        return await _merge_locked(connection, update_existing)
+
+    # One statement either way; the unique Matric index detects the conflicts.
+    # xmax is 0 only in a row version this statement inserted.
+    conflict = f"DO UPDATE SET {_UPDATED_COLUMNS}" if update_existing else "DO NOTHING"
+    merged = (await connection.execute(text(
+        f'INSERT INTO "Student" AS t ({_COLUMNS}) SELECT {_STAGED_COLUMNS} FROM student_import s '
+        f'ON CONFLICT ("Matric") {conflict} {_RETURNING}, (t.xmax = 0) AS inserted'
+    ))).all()
+    return (
+        [tuple(row[:4]) for row in merged if row.inserted],
+        [tuple(row[:4]) for row in merged if not row.inserted],
+    )
+
+
+async def _merge_locked(connection, update_existing: bool) -> Tuple[List[MergedRow], List[MergedRow]]:
+    """
+    The merge without ON CONFLICT, which needs the unique Matric index: the
+    table lock keeps concurrent registrations and imports from inserting
+    the same Matric between the existence check and the insert.
+    """
+    await connection.execute(text('LOCK TABLE "Student" IN SHARE ROW EXCLUSIVE MODE'))
+    updated = []
+    if update_existing:
+        updated = (await connection.execute(text(
+            f'UPDATE "Student" AS t SET {_UPDATED_FROM_STAGING} FROM student_import s '
+            f'WHERE t."Matric" = s."Matric" {_RETURNING}'
+        ))).all()
+    inserted = (await connection.execute(text(
+        f'INSERT INTO "Student" AS t ({_COLUMNS}) SELECT {_STAGED_COLUMNS} FROM student_import s '
+        f'WHERE NOT EXISTS (SELECT 1 FROM "Student" e WHERE e."Matric" = s."Matric") {_RETURNING}'
+    ))).all()
+    return [tuple(row) for row in inserted], [tuple(row) for row in updated]
+
+
+def _merge_fallback(
+    db: Session, rows: List[Dict[str, Any]], update_existing: bool
+) -> Tuple[List[MergedRow], List[MergedRow]]:
+    """Row-by-row ORM merge for databases without COPY (a sync Session, through run_sync)."""
+    existing = {
+        student.Matric: student
+        for student in db.query(Student).filter(Student.Matric.in_([row["Matric"] for row in rows]))
+    }
+    inserted, updated = [], []
+    for row in rows:
+        student = existing.get(row["Matric"])
+        if student is None:
+            student = Student(**row)
+            db.add(student)
+            inserted.append(student)
+        elif update_existing:
+            for field in IMPORT_FIELDS[1:]:
+                setattr(student, field, row[field])
+            updated.append(student)
+    db.flush()
+    return (
+        [(s.id, s.Matric, s.Firstname, s.Lastname) for s in inserted],
+        [(s.id, s.Matric, s.Firstname, s.Lastname) for s in updated],
+    )
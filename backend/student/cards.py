@@ -0,0 +1,400 @@
+"""
+Server-side student ID cards and multi-up A4 print sheets.
+
+A card is laid out once, in millimetres from the top-left corner, against
+a small canvas interface that is implemented for SVG and for PDF page
+content. Photos are decoded, cropped and downscaled once per render job
+(and embedded once per PDF); QR codes come from the matrices stored on
+the Student rows. Multi-card jobs are generators that yield each page as
+soon as it has been drawn.
+"""
+import base64
+import hashlib
+import io
+import logging
+import zipfile
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from PIL import Image, ImageOps
+from sqlalchemy.orm import Session
+
+from backend.database.config import SessionLocal
+from backend.qrcode.matrix import add_border, unpack_matrix
+from backend.qrcode.qservice import QRService
+from backend.security.config import settings
+from backend.student.blobstore import photo_store
+from backend.student.export import ZipStream
+from backend.student.model import Student
+from backend.student.pdf import MM, PdfWriter, pdf_color, pdf_string
+from backend.student.util import STUDENT_QR_ECC, STUDENT_QR_OPTIMIZE, student_filter, student_public_url
+
+logger = logging.getLogger(__name__)
+
+_qr_service = QRService(engine=settings.QR_ENGINE)
+
+CARD_FORMATS = ("svg", "pdf")
+CARD_LAYOUTS = ("card", "sheet")
+
+# ISO/IEC 7810 ID-1 (bank card) and A4, in millimetres
+CARD_WIDTH, CARD_HEIGHT = 85.6, 54.0
+PAGE_WIDTH, PAGE_HEIGHT = 210.0, 297.0
+SHEET_COLUMNS, SHEET_ROWS = 2, 5
+SHEET_GAP = 3.0
+CARDS_PER_SHEET = SHEET_COLUMNS * SHEET_ROWS
+
+PHOTO_X, PHOTO_Y, PHOTO_WIDTH, PHOTO_HEIGHT = 4.0, 11.0, 19.0, 24.0
+PHOTO_DPI = 300
+QR_BOX = 24.0
+
+ACCENT = "#3730a3"
+TEXT = "#111827"
+MUTED = "#4b5563"
+FONT_FAMILY = "Helvetica, Arial, sans-serif"
+
+
+class Photo(NamedTuple):
+    key: str
+    jpeg: bytes
+    width: int
+    height: int
+
+
+class CardData(NamedTuple):
+    matric: str
+    name: str
+    course: str
+    level: str
+    section: str
+    photo: Optional[Photo]
+    modules: List[List[bool]]  # QR modules including the quiet zone
+
+
+class PhotoCache:
+    """Decode, crop and downscale each distinct photo once per render job."""
+
+    def __init__(self):
+        self._photos: Dict[str, Optional[Photo]] = {}
+        self.size = (round(PHOTO_WIDTH / 25.4 * PHOTO_DPI), round(PHOTO_HEIGHT / 25.4 * PHOTO_DPI))
+
+    def get(self, photo_hash: Optional[str], image: Optional[str] = None) -> Optional[Photo]:
+        """Photo from the blob store, or from a legacy inline image."""
+        if photo_hash:
+            if photo_hash not in self._photos:
+                self._photos[photo_hash] = self._downscale(photo_hash, lambda: photo_store.read(photo_hash))
+            return self._photos[photo_hash]
+        if not image:
+            return None
+        key = hashlib.sha1(image.encode()).hexdigest()
+        if key not in self._photos:
+            encoded = image.split(",", 1)[1] if "," in image else image
+            self._photos[key] = self._downscale(key, lambda: base64.b64decode(encoded))
+        return self._photos[key]
+
+    def _downscale(self, key: str, load: Callable[[], bytes]) -> Optional[Photo]:
+        try:
+            with Image.open(io.BytesIO(load())) as source:
+                picture = ImageOps.exif_transpose(source).convert("RGB")
+            picture = ImageOps.fit(picture, self.size, Image.LANCZOS)
+            output = io.BytesIO()
+            picture.save(output, "JPEG", quality=85, optimize=True)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable student photo: {e}")
+            return None
+        return Photo(key, output.getvalue(), *picture.size)
+
+
+def _fit(text: str, width: float, size: float, minimum: float = 1.8) -> Tuple[str, float]:
+    """Shrink the font size (then truncate) so text fits the width; ~0.6 em per character."""
+    if not text:
+        return "", size
+    size = max(minimum, min(size, width / (0.6 * len(text))))
+    limit = int(width / (0.6 * size))
+    if len(text) > limit:
+        text = text[:max(1, limit - 3)] + "..."
+    return text, size
+
+
+def _dark_runs(modules) -> Iterator[Tuple[int, int, int]]:
+    """(row, column, length) of every horizontal run of dark modules."""
+    for y, row in enumerate(modules):
+        x = 0
+        width = len(row)
+        while x < width:
+            if row[x]:
+                start = x
+                while x < width and row[x]:
+                    x += 1
+                yield y, start, x - start
+            else:
+                x += 1
+
+
+class SvgCanvas:
+    def __init__(self, width: float, height: float):
+        self.width = width
+        self.height = height
+        self.parts: List[str] = []
+
+    def rect(self, x, y, width, height, fill=None, stroke=None, stroke_width=0.2):
+        self.parts.append(
+            f'<rect x="{x:.2f}" y="{y:.2f}" width="{width:.2f}" height="{height:.2f}" '
+            f'fill="{fill or "none"}"'
+            + (f' stroke="{stroke}" stroke-width="{stroke_width}"' if stroke else "")
+            + "/>"
+        )
+
+    def text(self, x, y, text, size, color=TEXT, bold=False):
+        weight = ' font-weight="bold"' if bold else ""
+        self.parts.append(
+            f'<text x="{x:.2f}" y="{y:.2f}" font-size="{size:.2f}" fill="{color}"{weight}>{escape(text)}</text>'
+        )
+
+    def image(self, x, y, width, height, photo: Photo):
+        href = "data:image/jpeg;base64," + base64.b64encode(photo.jpeg).decode("ascii")
+        self.parts.append(
+            f'<image x="{x:.2f}" y="{y:.2f}" width="{width:.2f}" height="{height:.2f}" href={quoteattr(href)}/>'
+        )
+
+    def modules(self, x, y, box, modules):
+        scale = box / len(modules)
+        path = "".join(
+            f"M{x + column * scale:.3f},{y + row * scale:.3f}h{length * scale:.3f}v{scale:.3f}h{-length * scale:.3f}z"
+            for row, column, length in _dark_runs(modules)
+        )
+        self.parts.append(f'<path d="{path}" fill="#000"/>')
+
+    def svg(self) -> str:
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}mm" height="{self.height}mm" '
+            f'viewBox="0 0 {self.width} {self.height}" font-family="{FONT_FAMILY}">'
+            + "".join(self.parts)
+            + "</svg>"
+        )
+
+
+class PdfCanvas:
+    """PDF page content in millimetres with a top-left origin (the CTM is flipped once)."""
+
+    def __init__(self, width: float, height: float):
+        self.width = width
+        self.height = height
+        self.ops: List[str] = [f"{MM:.6f} 0 0 {-MM:.6f} 0 {height * MM:.3f} cm"]
+        self.photos: Dict[str, Photo] = {}
+
+    def rect(self, x, y, width, height, fill=None, stroke=None, stroke_width=0.2):
+        if fill:
+            self.ops.append(f"{pdf_color(fill)} rg {x:.2f} {y:.2f} {width:.2f} {height:.2f} re f")
+        if stroke:
+            self.ops.append(f"{pdf_color(stroke)} RG {stroke_width} w {x:.2f} {y:.2f} {width:.2f} {height:.2f} re S")
+
+    def text(self, x, y, text, size, color=TEXT, bold=False):
+        font = "F2" if bold else "F1"
+        self.ops.append(
+            f"BT /{font} {size:.2f} Tf {pdf_color(color)} rg 1 0 0 -1 {x:.2f} {y:.2f} Tm {pdf_string(text)} Tj ET"
+        )
+
+    def image(self, x, y, width, height, photo: Photo):
+        self.photos[photo.key] = photo
+        self.ops.append(f"q {width:.2f} 0 0 {-height:.2f} {x:.2f} {y + height:.2f} cm /Im{photo.key[:12]} Do Q")
+
+    def modules(self, x, y, box, modules):
+        scale = box / len(modules)
+        self.ops.append("0 0 0 rg")
+        self.ops.extend(
+            f"{x + column * scale:.3f} {y + row * scale:.3f} {length * scale:.3f} {scale:.3f} re"
+            for row, column, length in _dark_runs(modules)
+        )
+        self.ops.append("f")
+
+    def content(self) -> bytes:
+        return "\n".join(self.ops).encode("latin-1")
+
+
+def draw_card(canvas, card: CardData, x: float = 0.0, y: float = 0.0) -> None:
+    """Draw one ID card with its top-left corner at (x, y)."""
+    canvas.rect(x, y, CARD_WIDTH, CARD_HEIGHT, fill="#ffffff", stroke="#d1d5db")
+    canvas.rect(x, y, CARD_WIDTH, 8.0, fill=ACCENT)
+    title, size = _fit(settings.ID_CARD_TITLE.upper(), CARD_WIDTH - 8, 3.6)
+    canvas.text(x + 4, y + 5.6, title, size, color="#ffffff", bold=True)
+
+    if card.photo is not None:
+        canvas.image(x + PHOTO_X, y + PHOTO_Y, PHOTO_WIDTH, PHOTO_HEIGHT, card.photo)
+    else:
+        canvas.rect(x + PHOTO_X, y + PHOTO_Y, PHOTO_WIDTH, PHOTO_HEIGHT, fill="#e0e7ff")
+        canvas.text(x + PHOTO_X + 3.5, y + PHOTO_Y + 13, "No photo", 2.4, color=MUTED)
+
+    details_x = x + PHOTO_X + PHOTO_WIDTH + 3
+    details_width = CARD_WIDTH - QR_BOX - 2 - (PHOTO_X + PHOTO_WIDTH + 3) - 1
+    for line, (label, value) in enumerate((
+        ("Matric", card.matric),
+        ("Course", card.course),
+        ("Level", card.level),
+        ("Section", card.section),
+    )):
+        text, size = _fit(f"{label}: {value or '-'}", details_width, 2.6)
+        canvas.text(details_x, y + 15 + line * 5.5, text, size, color=MUTED if line else TEXT, bold=not line)
+
+    canvas.modules(x + CARD_WIDTH - QR_BOX - 2, y + 10, QR_BOX, card.modules)
+
+    name, size = _fit(card.name, CARD_WIDTH - 8, 4.2)
+    canvas.text(x + 4, y + 43, name, size, bold=True)
+    canvas.rect(x, y + CARD_HEIGHT - 4, CARD_WIDTH, 4, fill=ACCENT)
+
+
+def _sheet_origin(index: int) -> Tuple[float, float]:
+    """Top-left corner of the index-th card on an A4 sheet (centred grid)."""
+    grid_width = SHEET_COLUMNS * CARD_WIDTH + (SHEET_COLUMNS - 1) * SHEET_GAP
+    grid_height = SHEET_ROWS * CARD_HEIGHT + (SHEET_ROWS - 1) * SHEET_GAP
+    row, column = divmod(index, SHEET_COLUMNS)
+    return (
+        (PAGE_WIDTH - grid_width) / 2 + column * (CARD_WIDTH + SHEET_GAP),
+        (PAGE_HEIGHT - grid_height) / 2 + row * (CARD_HEIGHT + SHEET_GAP),
+    )
+
+
+def card_data(student, photos: PhotoCache) -> CardData:
+    """CardData for a Student row (or a query row with the same attributes)."""
+    if student.qr_matrix is not None:
+        modules = unpack_matrix(bytes(student.qr_matrix), student.qr_version)
+    else:
+        modules = _qr_service.encode_matrix(
+            student_public_url(student.Matric), STUDENT_QR_ECC, STUDENT_QR_OPTIMIZE
+        ).modules
+    return CardData(
+        matric=student.Matric or "",
+        name=" ".join(part for part in (student.Firstname, student.Lastname) if part),
+        course=student.course or "",
+        level=student.level or "",
+        section=student.section or "",
+        photo=photos.get(student.photo_hash, student.image),
+        modules=add_border(modules, 4),
+    )
+
+
+def _pages(cards: Iterable[CardData], layout: str) -> Iterator[List[CardData]]:
+    per_page = CARDS_PER_SHEET if layout == "sheet" else 1
+    cards = iter(cards)
+    while True:
+        page = list(islice(cards, per_page))
+        if not page:
+            return
+        yield page
+
+
+def _draw_page(canvas, page: List[CardData], layout: str) -> None:
+    if layout == "card":
+        draw_card(canvas, page[0])
+        return
+    for index, card in enumerate(page):
+        draw_card(canvas, card, *_sheet_origin(index))
+
+
+def _page_size(layout: str) -> Tuple[float, float]:
+    return (CARD_WIDTH, CARD_HEIGHT) if layout == "card" else (PAGE_WIDTH, PAGE_HEIGHT)
+
+
+def render_card_svg(card: CardData) -> str:
+    """A single ID card as an SVG document (85.6 x 54 mm)."""
+    canvas = SvgCanvas(CARD_WIDTH, CARD_HEIGHT)
+    draw_card(canvas, card)
+    return canvas.svg()
+
+
+def stream_pdf(cards: Iterable[CardData], layout: str = "sheet") -> Iterator[bytes]:
+    """
+    Yield a PDF with one card per page ("card") or multi-up A4 sheets
+    ("sheet"), page by page. Each photo is embedded once and shared by
+    every page that shows it.
+    """
+    pdf = PdfWriter()
+    yield pdf.header()
+    catalog = pdf.reserve()
+    page_tree = pdf.reserve()
+    regular, data = pdf.add("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    yield data
+    bold, data = pdf.add("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+    yield data
+
+    width, height = _page_size(layout)
+    images: Dict[str, int] = {}
+    kids = []
+    for page in _pages(cards, layout):
+        canvas = PdfCanvas(width, height)
+        _draw_page(canvas, page, layout)
+
+        for key, photo in canvas.photos.items():
+            if key not in images:
+                images[key], data = pdf.add(
+                    f"/Type /XObject /Subtype /Image /Width {photo.width} /Height {photo.height} "
+                    f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode",
+                    photo.jpeg,
+                    compress=False,
+                )
+                yield data
+        xobjects = " ".join(f"/Im{key[:12]} {images[key]} 0 R" for key in canvas.photos)
+
+        contents, data = pdf.add("", canvas.content())
+        yield data
+        number, data = pdf.add(
+            f"<< /Type /Page /Parent {page_tree} 0 R /MediaBox [0 0 {width * MM:.2f} {height * MM:.2f}] "
+            f"/Resources << /Font << /F1 {regular} 0 R /F2 {bold} 0 R >> /XObject << {xobjects} >> >> "
+            f"/Contents {contents} 0 R >>"
+        )
+        kids.append(number)
+        yield data
+
+    yield pdf.write(page_tree, f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>")
+    yield pdf.write(catalog, f"<< /Type /Catalog /Pages {page_tree} 0 R >>")
+    yield pdf.close(catalog)
+
+
+def stream_svg_pages(cards: Iterable[CardData], layout: str = "sheet") -> Iterator[bytes]:
+    """Yield a ZIP archive with one SVG document per page (or per card), page by page."""
+    stream = ZipStream()
+    width, height = _page_size(layout)
+    with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for number, page in enumerate(_pages(cards, layout), start=1):
+            canvas = SvgCanvas(width, height)
+            _draw_page(canvas, page, layout)
+            name = f"card_{page[0].matric.replace('/', '_')}.svg" if layout == "card" else f"sheet_{number:03d}.svg"
+            archive.writestr(name, canvas.svg())
+            yield stream.drain()
+    yield stream.drain()
+
+
+def stream_cards(
+    course: Optional[str] = None,
+    level: Optional[str] = None,
+    section: Optional[str] = None,
+    output_format: str = "pdf",
+    layout: str = "sheet",
+    db: Optional[Session] = None,
+) -> Iterator[bytes]:
+    """
+    Render the cards of every student matching the filters, streaming pages
+    as they are produced. PDF output is a single document; SVG output is a
+    ZIP archive of page SVGs.
+    """
+    db = db or SessionLocal()
+    photos = PhotoCache()
+    # Photos can be large, so rows are fetched a few pages at a time
+    rows = student_filter(
+        db.query(
+            Student.Matric, Student.Firstname, Student.Lastname, Student.course, Student.level,
+            Student.section, Student.photo_hash, Student.image, Student.qr_matrix, Student.qr_version,
+        ),
+        course, level, section,
+    ).order_by(Student.id).yield_per(CARDS_PER_SHEET * 5)
+    cards = (card_data(row, photos) for row in rows)
+    try:
+        if output_format == "pdf":
+            yield from stream_pdf(cards, layout)
+        else:
+            yield from stream_svg_pages(cards, layout)
+    except Exception as e:
+        logger.error(f"Card rendering failed: {e}")
+        raise
+    finally:
+        db.close()
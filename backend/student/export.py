@@ -0,0 +1,254 @@
+"""
+Streaming exports of students: a ZIP of QR codes, and CSV / NDJSON dumps.
+
+Students are read with a server-side cursor in chunks and every finished
+chunk is handed to the response straight away (QR codes are rendered on a
+thread pool first). Only one chunk of rows and images is held in memory at
+a time, however many students match.
+"""
+import base64
+import csv
+import io
+import json
+import logging
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Iterator, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from backend.database.config import SessionLocal
+from backend.qrcode.matrix import unpack_matrix
+from backend.qrcode.qservice import QRService
+from backend.security.config import settings
+from backend.student.blobstore import photo_store
+from backend.student.model import Student
+from backend.student.util import STUDENT_QR_ECC, STUDENT_QR_OPTIMIZE, student_filter, student_public_url
+
+logger = logging.getLogger(__name__)
+
+# No cache: an export touches every student once and would only evict hot entries
+_qr_service = QRService(
+    engine=settings.QR_ENGINE, max_size=settings.QR_MAX_SIZE, max_border=settings.QR_MAX_BORDER
+)
+
+EXPORT_FORMATS = ("svg", "png")
+
+DATA_EXPORT_FORMATS = ("csv", "ndjson")
+# Columns a data export can select, in their default order; photos are
+# only added on request (as data URLs, which dominate the size of a dump)
+DATA_EXPORT_FIELDS = (
+    "id", "Matric", "Firstname", "Lastname", "gender", "course", "level", "section",
+    "has_image", "photo_hash", "qr_content",
+)
+# One encoder for every NDJSON line (json.dumps builds one per call with these options)
+_ndjson_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+class ZipStream(io.RawIOBase):
+    """
+    Write-only, unseekable file object for ZipFile. Written bytes are kept
+    until drained, so the archive can be sent while it is being built
+    (ZipFile falls back to data descriptors when it can't seek back).
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def validate_export(output_format: str, size: int, renderer: str, border: int) -> None:
+    """Raise ValueError for render options the export doesn't support."""
+    if output_format not in EXPORT_FORMATS:
+        raise ValueError(f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+    _qr_service._validate_render(size, renderer, border, output_format)
+
+
+def _render_student(row, output_format: str, size: int, renderer: str, border: int):
+    if row.qr_matrix is not None:
+        modules = unpack_matrix(bytes(row.qr_matrix), row.qr_version)
+        return _qr_service.render_modules(modules, size, renderer, border, output_format)
+    # Not backfilled yet: encode the public URL the same way it would be stored
+    return _qr_service.create_qr(
+        student_public_url(row.Matric), size, renderer, STUDENT_QR_ECC, border, output_format, STUDENT_QR_OPTIMIZE
+    )
+
+
+def _entry_name(matric: str, output_format: str, taken: set) -> str:
+    # Matric numbers contain slashes (CSC/2019/001), which would become folders
+    stem = (matric or "student").replace("/", "_").replace("\\", "_")
+    name = f"{stem}.{output_format}"
+    suffix = 2
+    while name in taken:
+        name = f"{stem}-{suffix}.{output_format}"
+        suffix += 1
+    taken.add(name)
+    return name
+
+
+def stream_qr_zip(
+    course: Optional[str] = None,
+    level: Optional[str] = None,
+    section: Optional[str] = None,
+    output_format: str = "png",
+    size: int = 10,
+    renderer: str = "path",
+    border: int = 4,
+    chunk_size: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    db: Optional[Session] = None,
+) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive with one QR image per matching student, in pieces.
+
+    Uses its own session unless one is given, because the generator keeps
+    running after the request handler has returned.
+    """
+    chunk_size = chunk_size or settings.QR_EXPORT_CHUNK_SIZE
+    max_workers = max_workers or settings.QR_BATCH_WORKERS
+    db = db or SessionLocal()
+    # PNG is already deflate-compressed; SVG text compresses well
+    compression = zipfile.ZIP_DEFLATED if output_format == "svg" else zipfile.ZIP_STORED
+    exported_at = datetime.now().timetuple()[:6]
+
+    stream = ZipStream()
+    taken = set()
+    exported = 0
+    try:
+        rows = student_filter(
+            db.query(Student.id, Student.Matric, Student.qr_matrix, Student.qr_version),
+            course, level, section,
+        ).order_by(Student.id).yield_per(chunk_size)
+        rows = iter(rows)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                zipfile.ZipFile(stream, mode="w", compression=compression) as archive:
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                images = executor.map(
+                    lambda row: _render_student(row, output_format, size, renderer, border), chunk
+                )
+                for row, image in zip(chunk, images):
+                    info = zipfile.ZipInfo(_entry_name(row.Matric, output_format, taken), date_time=exported_at)
+                    info.compress_type = compression
+                    archive.writestr(info, image)
+                    exported += 1
+                    yield stream.drain()
+        # Central directory, written when the archive is closed
+        yield stream.drain()
+        logger.info(f"Exported {exported} student QR codes")
+    except Exception as e:
+        logger.error(f"QR export stopped after {exported} students: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def export_fields(fields: Optional[str]) -> List[str]:
+    """
+    Parse a comma-separated column list (all of DATA_EXPORT_FIELDS when
+    empty). Raises ValueError for unknown columns.
+    """
+    if not fields:
+        return list(DATA_EXPORT_FIELDS)
+    selected = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in selected if field not in DATA_EXPORT_FIELDS]
+    if unknown or not selected:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(DATA_EXPORT_FIELDS)}")
+    return selected
+
+
+def _photo_data_url(matric: str, photo_hash: Optional[str], photo_type: Optional[str], image: Optional[str]) -> str:
+    """A student's photo as a data URL ("" without one)."""
+    if photo_hash:
+        try:
+            data = photo_store.read(photo_hash)
+        except OSError:
+            logger.warning(f"Photo {photo_hash} of {matric} is missing from the blob store")
+            return ""
+        return f"data:{photo_type or 'application/octet-stream'};base64,{base64.b64encode(data).decode()}"
+    # Not migrated yet: the legacy column already holds a data URL
+    return image or ""
+
+
+def stream_students(
+    fields: Sequence[str],
+    output_format: str = "csv",
+    course: Optional[str] = None,
+    level: Optional[str] = None,
+    section: Optional[str] = None,
+    include_images: bool = False,
+    chunk_size: Optional[int] = None,
+    db: Optional[Session] = None,
+) -> Iterator[bytes]:
+    """
+    Yield the selected columns of every matching student in id order, as
+    CSV (with a header row) or NDJSON, one chunk of rows at a time. With
+    include_images an "image" column holds each photo as a data URL.
+
+    Uses its own session unless one is given, because the generator keeps
+    running after the request handler has returned.
+    """
+    chunk_size = chunk_size or settings.STUDENT_EXPORT_CHUNK_SIZE
+    db = db or SessionLocal()
+    names = list(fields) + (["image"] if include_images else [])
+    columns = [getattr(Student, field) for field in fields]
+    if include_images:
+        # _photo_data_url's arguments, labelled so a selected column isn't merged with them
+        columns += [
+            Student.Matric.label("_matric"), Student.photo_hash.label("_photo_hash"),
+            Student.photo_type.label("_photo_type"), Student.image.label("_image"),
+        ]
+
+    exported = 0
+    try:
+        rows = iter(
+            student_filter(db.query(*columns), course, level, section).order_by(Student.id).yield_per(chunk_size)
+        )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if output_format == "csv" else None
+        if writer:
+            writer.writerow(names)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            for row in chunk:
+                values = list(row[:len(fields)])
+                if include_images:
+                    values.append(_photo_data_url(*row[len(fields):]))
+                if writer:
+                    # Booleans as in the NDJSON output, not Python's True / False
+                    writer.writerow(["true" if value is True else "false" if value is False else value for value in values])
+                else:
+                    buffer.write(_ndjson_encoder.encode(dict(zip(names, values))))
+                    buffer.write("\n")
+            exported += len(chunk)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if exported == 0 and writer:
+            # Just the header row
+            yield buffer.getvalue().encode("utf-8")
+        logger.info(f"Exported {exported} students as {output_format}")
+    except Exception as e:
+        logger.error(f"Student export stopped after {exported} students: {e}")
+        raise
+    finally:
+        db.close()
+
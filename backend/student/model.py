@@ -1,19 +1,40 @@
 # model.py
 from datetime import datetime
 import uuid
-from sqlalchemy import JSON, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text, and_, or_
+from sqlalchemy.orm import column_property, deferred
 from backend.database.config import Base
 
 class Student(Base):
     __tablename__ = "Student"
+    __table_args__ = (
+        # Keyset pagination: ORDER BY (course, id) and course/level/section filters
+        Index("ix_student_course_id", "course", "id"),
+        Index("ix_student_course_level_section_id", "course", "level", "section", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    Matric = Column(String, index=True)
+    Matric = Column(String, unique=True, index=True)  # see backfill unique-matric for older databases
     Firstname = Column(String)
     Lastname = Column(String)
     gender = Column(String)
     course = Column(String, index=True)
     level = Column(String)
     section = Column(String)
-    image = Column(Text)  # Store base64 encoded image string
-    qr_code = Column(String)  # Store the SVG string
\ No newline at end of file
+    image = deferred(Column(Text))  # Legacy base64 data URL, emptied by the photo migration
+    photo_hash = Column(String(64), index=True)  # SHA-256 of the photo in the blob store
+    photo_type = Column(String(32))  # Photo content type
+    qr_code = Column(String)  # Store the SVG string
+    qr_content = Column(String)  # URL encoded into qr_matrix
+    qr_matrix = Column(LargeBinary)  # Bit-packed QR modules, see backend/qrcode/matrix.py
+    qr_version = Column(Integer)
+    qr_ecc = Column(String(1))
+    # Row version, bumped by every ORM update; stale writes fail instead of overwriting
+    version = Column(Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
+
+# Whether a photo is stored, computed in SQL so a legacy inline image isn't loaded
+Student.has_image = column_property(
+    or_(Student.photo_hash.isnot(None), and_(Student.image.isnot(None), Student.image != ""))
+)
@@ -0,0 +1,149 @@
+"""
+Render cache of the public student pages (/student/{matric}).
+
+A QR scan is answered from memory: each entry is the rendered page of one
+version of a student, filled on the first view from the primary (never a
+replica, which may not have the latest version yet). AdminStudentService drops
+a student's entry after every committed write, so this process never
+serves an outdated page. Writes made elsewhere (another worker, a script)
+are picked up when an entry is older than STUDENT_PAGE_CACHE_TTL: the
+student is read again and the page re-rendered only if its version moved.
+
+Unknown matric numbers can be cached too (STUDENT_PAGE_MISSING_TTL), so
+scans of a bad code don't reach the database either.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, NamedTuple, Optional, Union
+
+from backend.security.config import settings
+
+
+class StudentPage(NamedTuple):
+    version: int
+    body: bytes
+    etag: str
+    last_modified: str  # HTTP date the page of this version was first rendered
+    checked_at: float  # monotonic time it was last known current
+
+
+# Cached in place of a page for matric numbers with no student
+_MISSING = "missing"
+
+
+def make_student_page(version: int, body: bytes) -> StudentPage:
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    return StudentPage(version, body, etag, formatdate(usegmt=True), time.monotonic())
+
+
+def not_modified_since(if_modified_since: Optional[str], last_modified: str) -> bool:
+    """Whether an If-Modified-Since header is at or after last_modified."""
+    if not if_modified_since:
+        return False
+    try:
+        return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(last_modified)
+    except (TypeError, ValueError):
+        return False
+
+
+class StudentPageCache:
+    """
+    Bounded, thread-safe LRU cache of rendered student pages (and of
+    unknown matric numbers), keyed by matric number.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 30, missing_ttl: float = 30):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self._entries: "OrderedDict[str, Union[StudentPage, tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, see put()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, matric: str) -> Union[StudentPage, str, None]:
+        """
+        The current page of a student, "missing" if the student is known not
+        to exist, or None when the database has to be asked.
+        """
+        with self._lock:
+            entry = self._entries.get(matric)
+            if entry is not None:
+                if isinstance(entry, StudentPage):
+                    fresh = time.monotonic() - entry.checked_at <= self.ttl
+                else:
+                    fresh = time.monotonic() - entry[1] <= self.missing_ttl
+                if fresh:
+                    self._entries.move_to_end(matric)
+                    self.hits += 1
+                    return entry if isinstance(entry, StudentPage) else _MISSING
+            self.misses += 1
+            return None
+
+    def cached(self, matric: str, version: int) -> Optional[StudentPage]:
+        """The page rendered for this version of the student, if any, marked current again."""
+        with self._lock:
+            entry = self._entries.get(matric)
+            if not isinstance(entry, StudentPage) or entry.version != version:
+                return None
+            entry = entry._replace(checked_at=time.monotonic())
+            self._entries[matric] = entry
+            return entry
+
+    def put(self, matric: str, page: StudentPage, generation: int) -> None:
+        """
+        Cache a page read when self.generation was generation. Dropped if
+        anything was invalidated since, as the read may predate that write.
+        """
+        self._store(matric, page, generation)
+
+    def put_missing(self, matric: str, generation: int) -> None:
+        if self.missing_ttl > 0:
+            self._store(matric, (_MISSING, time.monotonic()), generation)
+
+    def _store(self, matric: str, entry: Any, generation: int) -> None:
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[matric] = entry
+            self._entries.move_to_end(matric)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *matrics: str) -> None:
+        """Forget the pages (or missing markers) of these matric numbers."""
+        with self._lock:
+            self.generation += 1
+            for matric in matrics:
+                self._entries.pop(matric, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            pages = [entry for entry in self._entries.values() if isinstance(entry, StudentPage)]
+            return {
+                "entries": len(self._entries),
+                "pages": len(pages),
+                "bytes": sum(len(page.body) for page in pages),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+student_pages = StudentPageCache(
+    settings.STUDENT_PAGE_CACHE_MAX_ENTRIES, settings.STUDENT_PAGE_CACHE_TTL, settings.STUDENT_PAGE_MISSING_TTL
+)
@@ -0,0 +1,78 @@
+"""
+Minimal streaming PDF writer.
+
+Objects are serialized as soon as they are complete and their byte offsets
+are remembered for the cross-reference table written at the end, so a
+document with many pages never has to be held in memory. Object numbers
+can be reserved up front for objects that are only written later (e.g.
+the page tree, once all pages are known).
+"""
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+# Points per millimetre
+MM = 72 / 25.4
+
+
+def pdf_string(text: str) -> str:
+    """Literal string for the standard fonts (WinAnsi / Latin-1), escaped."""
+    text = text.encode("latin-1", errors="replace").decode("latin-1")
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def pdf_color(color: str) -> str:
+    """'#rrggbb' as a PDF 'r g b' triple."""
+    return " ".join(f"{int(color[i:i + 2], 16) / 255:.3f}" for i in (1, 3, 5))
+
+
+class PdfWriter:
+    def __init__(self):
+        self._offsets: Dict[int, int] = {}
+        self._position = 0
+        self._count = 0
+
+    def _emit(self, data: bytes) -> bytes:
+        self._position += len(data)
+        return data
+
+    def reserve(self) -> int:
+        """Allocate an object number to write later."""
+        self._count += 1
+        return self._count
+
+    def header(self) -> bytes:
+        return self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def write(
+        self,
+        number: int,
+        body: str,
+        stream: Optional[bytes] = None,
+        compress: bool = True,
+    ) -> bytes:
+        """
+        Serialize object number. body is the object itself, or the entries
+        of the stream dictionary (without << >>) when stream is given.
+        """
+        self._offsets[number] = self._position
+        if stream is None:
+            return self._emit(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+        if compress:
+            stream = zlib.compress(stream, 6)
+            body += " /Filter /FlateDecode"
+        head = f"{number} 0 obj\n<< {body} /Length {len(stream)} >>\nstream\n".encode("latin-1")
+        return self._emit(head + stream + b"\nendstream\nendobj\n")
+
+    def add(self, body: str, stream: Optional[bytes] = None, compress: bool = True) -> Tuple[int, bytes]:
+        """Allocate a number and serialize the object in one go."""
+        number = self.reserve()
+        return number, self.write(number, body, stream, compress)
+
+    def close(self, root: int) -> bytes:
+        """Cross-reference table and trailer; root is the catalog object."""
+        xref_at = self._position
+        lines: List[str] = [f"xref\n0 {self._count + 1}\n", "0000000000 65535 f \n"]
+        for number in range(1, self._count + 1):
+            lines.append(f"{self._offsets[number]:010d} 00000 n \n")
+        lines.append(f"trailer\n<< /Size {self._count + 1} /Root {root} 0 R >>\nstartxref\n{xref_at}\n%%EOF\n")
+        return self._emit("".join(lines).encode("latin-1"))
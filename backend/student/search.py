@@ -0,0 +1,177 @@
+"""
+Indexed student search (PostgreSQL).
+
+Two indexes back every search:
+
+- search_vector, a tsvector kept up to date by a trigger, holding the
+  matric number and names (weight A), course (B) and level / section (C).
+  Queries match it word by word with prefix matching ("joh cen" finds
+  John Cena), ranked with ts_rank_cd. Students that predate the trigger
+  get theirs from `python -m backend.student.backfill search`.
+- GIN trigram indexes on the matric number, first name, last name, full
+  name and course, used for substring matches on the matric number and
+  for typo tolerance ("jonh" still finds John) via word similarity.
+
+Results are ordered by the best of the two scores, then by id, and paged
+with an opaque keyset cursor. Other databases fall back to unindexed
+ILIKE matching in id order.
+"""
+import base64
+import binascii
+import json
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, cast, func, literal, literal_column, or_, text
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.types import Float
+
+from backend.student.model import Student
+
+# Lowest word similarity (0-1) that counts as a typo match
+SEARCH_SIMILARITY_THRESHOLD = 0.4
+# Query words shorter than this can't form a trigram and only prefix-match
+_MIN_TRIGRAM_LENGTH = 3
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_FULL_NAME = '("Firstname" || \' \' || "Lastname")'
+
+# Kept in init_db_extensions order: column, trigger, indexes. DDL only: rows
+# that predate the trigger are filled by "backfill search", not at startup.
+SEARCH_SCHEMA = [
+    'ALTER TABLE "Student" ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    """
+    CREATE OR REPLACE FUNCTION student_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector =
+            setweight(to_tsvector('simple', translate(COALESCE(NEW."Matric", ''), '/-', '  ')), 'A') ||
+            setweight(to_tsvector('simple', COALESCE(NEW."Firstname", '') || ' ' || COALESCE(NEW."Lastname", '')), 'A') ||
+            setweight(to_tsvector('simple', COALESCE(NEW.course, '')), 'B') ||
+            setweight(to_tsvector('simple', COALESCE(NEW.level, '') || ' ' || COALESCE(NEW.section, '')), 'C');
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    'DROP TRIGGER IF EXISTS student_search_vector_trigger ON "Student"',
+    """
+    CREATE TRIGGER student_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF "Matric", "Firstname", "Lastname", course, level, section ON "Student"
+    FOR EACH ROW EXECUTE FUNCTION student_search_vector_update()
+    """,
+    'CREATE INDEX IF NOT EXISTS ix_student_search_vector ON "Student" USING gin (search_vector)',
+    'CREATE INDEX IF NOT EXISTS ix_student_matric_trgm ON "Student" USING gin ("Matric" gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_student_firstname_trgm ON "Student" USING gin ("Firstname" gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_student_lastname_trgm ON "Student" USING gin ("Lastname" gin_trgm_ops)',
+    f'CREATE INDEX IF NOT EXISTS ix_student_full_name_trgm ON "Student" USING gin ({_FULL_NAME} gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_student_course_trgm ON "Student" USING gin (course gin_trgm_ops)',
+]
+
+
+def encode_search_cursor(score: float, student_id: int) -> str:
+    key = json.dumps({"s": score, "id": student_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, int]:
+    """Raises ValueError for a cursor this module didn't produce."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(key["s"]), int(key["id"])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+
+
+def _prefix_tsquery(words: List[str]) -> str:
+    """'john ce' -> 'john:* & ce:*' (words are \\w+ only, so nothing needs quoting)."""
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def _contains(query: str) -> str:
+    """ILIKE pattern matching query anywhere, with its own wildcards escaped."""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def find_students(
+    db: Session,
+    query: str,
+    base: Optional[Query] = None,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> Tuple[List[Student], Optional[str]]:
+    """
+    One page of students matching query, best matches first. base is a
+    Student query to search within (loader options, filters). Returns the
+    students and the cursor of the next page (None on the last page).
+
+    Raises ValueError for an invalid cursor.
+    """
+    base = base if base is not None else db.query(Student)
+    words = [word.lower() for word in _WORD.findall(query)]
+    if not words:
+        return [], None
+    if db.get_bind().dialect.name != "postgresql":
+        return _search_fallback(base, query.strip(), cursor, limit)
+
+    phrase = " ".join(words)
+    full_name = literal_column(_FULL_NAME)
+    tsquery = func.to_tsquery("simple", _prefix_tsquery(words))
+    search_vector = literal_column('"Student".search_vector')
+
+    matches = [search_vector.op("@@")(tsquery)]
+    scores = [func.ts_rank_cd(search_vector, tsquery)]
+    if len(phrase) >= _MIN_TRIGRAM_LENGTH:
+        needle = literal(phrase)
+        # Trigram-indexed: part of the matric number, or a similar word in the name / course
+        matches += [
+            Student.Matric.ilike(_contains(query.strip()), escape="\\"),
+            needle.op("<%")(full_name),
+            needle.op("<%")(Student.course),
+        ]
+        scores += [
+            func.similarity(Student.Matric, needle),
+            func.word_similarity(needle, full_name),
+            func.word_similarity(needle, Student.course) * 0.5,
+        ]
+    score = cast(func.greatest(*scores), Float).label("score")
+
+    # For this transaction only: the threshold used by the <% operator (and
+    # its index scan), and no sequential scan. The planner costs the trigram
+    # operators like plain comparisons and, once a query matches a few
+    # percent of rows, prefers evaluating them on every row, which is several
+    # times slower than combining the GIN index scans.
+    db.execute(
+        text(
+            "SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true), "
+            "set_config('enable_seqscan', 'off', true)"
+        ),
+        {"threshold": str(SEARCH_SIMILARITY_THRESHOLD)},
+    )
+    ranked = base.add_columns(score).filter(or_(*matches))
+    if cursor:
+        last_score, last_id = decode_search_cursor(cursor)
+        ranked = ranked.filter(or_(score < last_score, and_(score == last_score, Student.id > last_id)))
+    rows = ranked.order_by(score.desc(), Student.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        student, last_score = rows[limit - 1]
+        next_cursor = encode_search_cursor(last_score, student.id)
+    return [student for student, _ in rows[:limit]], next_cursor
+
+
+def _search_fallback(base: Query, query: str, cursor: Optional[str], limit: int) -> Tuple[List[Student], Optional[str]]:
+    """Unranked substring match for databases without pg_trgm / tsvector."""
+    pattern = _contains(query)
+    full_name = Student.Firstname + " " + Student.Lastname
+    matches = base.filter(or_(
+        Student.Matric.ilike(pattern, escape="\\"),
+        full_name.ilike(pattern, escape="\\"),
+        Student.course.ilike(pattern, escape="\\"),
+    ))
+    if cursor:
+        _, last_id = decode_search_cursor(cursor)
+        matches = matches.filter(Student.id > last_id)
+    rows = matches.order_by(Student.id).limit(limit + 1).all()
+    next_cursor = encode_search_cursor(0.0, rows[limit - 1].id) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,290 @@
+"""
+In-memory prefix index for type-ahead suggestions.
+
+Every student is indexed under three keys, the case-folded matric number,
+last name and first name, kept in one sorted list of "<key>\\0<id>"
+strings. A prefix lookup is a binary search for the first key at or after
+the prefix followed by a short forward scan, so answering a keystroke
+costs O(log n + k) and never touches the database.
+
+The index is built at startup and kept current by AdminStudentService
+after each committed register / update / delete. It is per process:
+writes made elsewhere (another worker, a bulk import, a script) are picked
+up by a rebuild once the index is older than SUGGEST_INDEX_MAX_AGE.
+Past SUGGEST_INDEX_MAX_STUDENTS students it stops growing and reports
+itself incomplete, and callers fall back to the database.
+"""
+import bisect
+import logging
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from backend.security.config import settings
+from backend.student.model import Student
+
+logger = logging.getLogger(__name__)
+
+# (id, Matric, Firstname, Lastname)
+SuggestRow = Tuple[int, str, str, str]
+
+_SEPARATOR = "\0"
+# Rows read per round trip when building from the database
+_BUILD_CHUNK_SIZE = 5000
+
+
+def suggest_key(value: Optional[str]) -> str:
+    """The form keys and prefixes are compared in."""
+    return (value or "").replace(_SEPARATOR, "").strip().casefold()
+
+
+class SuggestIndex:
+    """
+    Bounded, thread-safe sorted prefix index of students.
+
+    Holds at most max_students students; adding more marks the index
+    incomplete rather than growing it.
+    """
+
+    def __init__(self, max_students: int = 200_000):
+        if max_students < 1:
+            raise ValueError("max_students must be at least 1")
+        self.max_students = max_students
+        self._lock = threading.Lock()
+        self._keys: List[str] = []
+        # id -> "Matric\0Firstname\0Lastname"; one string per student keeps it compact
+        self._students: Dict[int, str] = {}
+        self._object_bytes = 0
+        # Changes made while a rebuild reads the table, replayed onto its result
+        self._journal: Optional[List[Tuple[str, Any]]] = None
+        self.complete = False
+        self.built_at: Optional[float] = None
+        self.build_seconds = 0.0
+        self.lookups = 0
+
+    @staticmethod
+    def _entries(student_id: int, fields: str) -> List[str]:
+        keys = {suggest_key(value) for value in fields.split(_SEPARATOR)}
+        return [f"{key}{_SEPARATOR}{student_id}" for key in keys if key]
+
+    @staticmethod
+    def _pack(row: SuggestRow) -> str:
+        return _SEPARATOR.join((value or "").replace(_SEPARATOR, "") for value in row[1:])
+
+    @staticmethod
+    def _row_bytes(fields: str, entries: List[str]) -> int:
+        # The id and packed fields, each entry string and its list slot
+        return sys.getsizeof(2 ** 40) + sys.getsizeof(fields) + sum(sys.getsizeof(entry) + 8 for entry in entries)
+
+    def _insert(self, row: SuggestRow) -> None:
+        """Add or replace a student. Caller holds the lock."""
+        student_id = row[0]
+        self._remove(student_id)
+        if len(self._students) >= self.max_students:
+            if self.complete:
+                logger.warning(f"Suggestion index is full ({self.max_students} students); using the database")
+            self.complete = False
+            return
+        fields = self._pack(row)
+        entries = self._entries(student_id, fields)
+        for entry in entries:
+            bisect.insort(self._keys, entry)
+        self._students[student_id] = fields
+        self._object_bytes += self._row_bytes(fields, entries)
+
+    def _remove(self, student_id: int) -> None:
+        """Caller holds the lock."""
+        fields = self._students.pop(student_id, None)
+        if fields is None:
+            return
+        entries = self._entries(student_id, fields)
+        for entry in entries:
+            i = bisect.bisect_left(self._keys, entry)
+            if i < len(self._keys) and self._keys[i] == entry:
+                del self._keys[i]
+        self._object_bytes -= self._row_bytes(fields, entries)
+
+    def add(self, student_id: int, matric: str, firstname: str, lastname: str) -> None:
+        """Index a student, replacing what was indexed for the same id."""
+        row = (student_id, matric, firstname, lastname)
+        with self._lock:
+            self._insert(row)
+            if self._journal is not None:
+                self._journal.append(("add", row))
+
+    def add_many(self, rows: Iterable[SuggestRow]) -> None:
+        """add() for a batch of (id, Matric, Firstname, Lastname) rows: one re-sort instead of an insert each."""
+        rows = list(rows)
+        with self._lock:
+            for row in rows:
+                self._remove(row[0])
+            for row in rows:
+                if len(self._students) >= self.max_students:
+                    if self.complete:
+                        logger.warning(f"Suggestion index is full ({self.max_students} students); using the database")
+                    self.complete = False
+                    break
+                fields = self._pack(row)
+                entries = self._entries(row[0], fields)
+                self._keys.extend(entries)
+                self._students[row[0]] = fields
+                self._object_bytes += self._row_bytes(fields, entries)
+            # Two sorted runs: Timsort merges them in linear time
+            self._keys.sort()
+            if self._journal is not None:
+                self._journal.extend(("add", row) for row in rows)
+
+    def remove(self, student_id: int) -> None:
+        with self._lock:
+            self._remove(student_id)
+            if self._journal is not None:
+                self._journal.append(("remove", student_id))
+
+    def build(self, load: Callable[[], Iterable[SuggestRow]]) -> None:
+        """
+        Replace the contents with the rows load() yields. Lookups keep using
+        the old contents until the new ones are ready, and add / remove calls
+        made in the meantime are applied to the result.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self._journal = []
+        try:
+            students: Dict[int, str] = {}
+            keys: List[str] = []
+            object_bytes = 0
+            complete = True
+            for row in load():
+                if len(students) >= self.max_students:
+                    complete = False
+                    break
+                fields = self._pack(row)
+                entries = self._entries(row[0], fields)
+                keys.extend(entries)
+                students[row[0]] = fields
+                object_bytes += self._row_bytes(fields, entries)
+            keys.sort()
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+
+        with self._lock:
+            self._keys, self._students, self._object_bytes = keys, students, object_bytes
+            self.complete = complete
+            for action, value in self._journal:
+                if action == "add":
+                    self._insert(value)
+                else:
+                    self._remove(value)
+            self._journal = None
+            self.built_at = time.monotonic()
+            self.build_seconds = time.perf_counter() - started
+        if not complete:
+            logger.warning(f"Suggestion index holds only the first {self.max_students} students; using the database")
+
+    def is_stale(self, max_age: float) -> bool:
+        """True if never built or built more than max_age seconds ago (0 means never stale once built)."""
+        if self.built_at is None:
+            return True
+        return max_age > 0 and time.monotonic() - self.built_at > max_age
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Up to limit students with a matric number, last name or first name
+        starting with prefix (case-insensitive), in key order.
+        """
+        prefix = suggest_key(prefix)
+        if not prefix or limit < 1:
+            return []
+        found: Dict[int, str] = {}
+        with self._lock:
+            self.lookups += 1
+            i = bisect.bisect_left(self._keys, prefix)
+            while i < len(self._keys) and len(found) < limit:
+                entry = self._keys[i]
+                if not entry.startswith(prefix):
+                    break
+                student_id = int(entry.rpartition(_SEPARATOR)[2])
+                found.setdefault(student_id, self._students[student_id])
+                i += 1
+        suggestions = []
+        for student_id, fields in found.items():
+            matric, firstname, lastname = fields.split(_SEPARATOR)
+            suggestions.append({"id": student_id, "Matric": matric, "Firstname": firstname, "Lastname": lastname})
+        return suggestions
+
+    def __len__(self) -> int:
+        return len(self._students)
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and memory usage, for monitoring."""
+        with self._lock:
+            return {
+                "students": len(self._students),
+                "keys": len(self._keys),
+                "max_students": self.max_students,
+                "complete": self.complete,
+                # Approximate: strings, tuples and the list / dict themselves
+                "bytes": self._object_bytes + sys.getsizeof(self._keys) + sys.getsizeof(self._students),
+                "lookups": self.lookups,
+                "age_seconds": round(time.monotonic() - self.built_at, 1) if self.built_at is not None else None,
+                "build_seconds": round(self.build_seconds, 3),
+            }
+
+
+suggest_index = SuggestIndex(settings.SUGGEST_INDEX_MAX_STUDENTS)
+_refresh_lock = threading.Lock()
+
+
+def load_suggest_index(db: Session, index: SuggestIndex = suggest_index) -> None:
+    """(Re)build the index from the Student table."""
+    def rows() -> Iterable[SuggestRow]:
+        query = db.query(Student.id, Student.Matric, Student.Firstname, Student.Lastname)
+        for row in query.yield_per(_BUILD_CHUNK_SIZE):
+            yield tuple(row)
+
+    index.build(rows)
+    logger.info(f"Suggestion index built: {index.stats()}")
+
+
+def suggest_from_database(db: Session, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """The same lookup as SuggestIndex.suggest, run against the table, for when the index is incomplete."""
+    key = suggest_key(prefix)
+    if not key or limit < 1:
+        return []
+    pattern = key.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    rows = db.query(Student.id, Student.Matric, Student.Firstname, Student.Lastname).filter(or_(
+        Student.Matric.ilike(pattern, escape="\\"),
+        Student.Lastname.ilike(pattern, escape="\\"),
+        Student.Firstname.ilike(pattern, escape="\\"),
+    )).order_by(Student.Matric).limit(limit).all()
+    return [
+        {"id": row.id, "Matric": row.Matric, "Firstname": row.Firstname, "Lastname": row.Lastname}
+        for row in rows
+    ]
+
+
+def refresh_suggest_index(session_factory: Callable[[], Session], index: SuggestIndex = suggest_index) -> bool:
+    """
+    Rebuild the index in a background thread if it is stale. Returns False
+    if it is current or a rebuild is already running.
+    """
+    if not index.is_stale(settings.SUGGEST_INDEX_MAX_AGE) or not _refresh_lock.acquire(blocking=False):
+        return False
+
+    def rebuild() -> None:
+        try:
+            with session_factory() as db:
+                load_suggest_index(db, index)
+        except Exception as e:
+            logger.error(f"Failed to rebuild the suggestion index: {str(e)}")
+        finally:
+            _refresh_lock.release()
+
+    threading.Thread(target=rebuild, name="suggest-index", daemon=True).start()
+    return True
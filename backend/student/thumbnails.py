@@ -0,0 +1,78 @@
+"""
+Fixed-size JPEG thumbnails of student photos.
+
+Thumbnails are made when a photo is stored and kept in the blob store as
+variants of the original (<digest>.w128.jpg), so they share its lifetime
+and need no columns of their own. A missing one (a photo stored before
+thumbnails existed, or a newly added size) is made on first request.
+"""
+import io
+import logging
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from backend.student.blobstore import photo_store
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels. The dashboard shows photos at 96-128 CSS px
+# (256 covers high-density screens) and the public page at up to 256.
+THUMBNAIL_SIZES = (64, 128, 256, 512)
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_MEDIA_TYPE = "image/jpeg"
+
+
+def thumbnail_size(requested: int) -> int:
+    """Smallest stored size at least as large as requested (or the largest)."""
+    return next((size for size in THUMBNAIL_SIZES if size >= requested), THUMBNAIL_SIZES[-1])
+
+
+def _variant(size: int) -> str:
+    return f"w{size}.jpg"
+
+
+def render_thumbnail(data: bytes, size: int) -> bytes:
+    """JPEG that fits in size x size, keeping the aspect ratio; never upscaled."""
+    with Image.open(io.BytesIO(data)) as source:
+        picture = ImageOps.exif_transpose(source)
+        picture.thumbnail((size, size), Image.LANCZOS)
+    if picture.mode in ("RGBA", "LA", "P"):
+        # JPEG has no alpha: flatten transparent areas onto white
+        picture = picture.convert("RGBA")
+        background = Image.new("RGB", picture.size, "white")
+        background.paste(picture, mask=picture.getchannel("A"))
+        picture = background
+    output = io.BytesIO()
+    picture.convert("RGB").save(output, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def make_thumbnails(digest: str, data: Optional[bytes] = None, overwrite: bool = False) -> int:
+    """
+    Write every thumbnail size for the stored photo digest. data is the
+    original's bytes when the caller already has them. Returns the number
+    of thumbnails written; unreadable images are logged and skipped.
+    """
+    written = 0
+    for size in THUMBNAIL_SIZES:
+        if not overwrite and photo_store.variant_path(digest, _variant(size)).is_file():
+            continue
+        try:
+            if data is None:
+                data = photo_store.read(digest)
+            photo_store.put_variant(digest, _variant(size), render_thumbnail(data, size))
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            logger.warning(f"Cannot make thumbnails of photo {digest}: {e}")
+            break
+        written += 1
+    return written
+
+
+def thumbnail_path(digest: str, size: int) -> Optional[Path]:
+    """Path of the thumbnail nearest to size, made now if missing; None if it can't be made."""
+    path = photo_store.variant_path(digest, _variant(thumbnail_size(size)))
+    if not path.is_file():
+        make_thumbnails(digest)
+    return path if path.is_file() else None
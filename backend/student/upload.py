@@ -0,0 +1,162 @@
+"""
+Validation and normalization of uploaded student photos.
+
+Uploads are decoded incrementally: base64 data URLs in fixed-size chunks,
+multipart files as they arrive. The real format is checked from the magic
+bytes of the first chunk, and decoding stops as soon as the size limit is
+passed, so an oversized or non-image upload is rejected before it is
+buffered in full. Accepted photos are re-encoded at a capped resolution,
+which bounds what is stored per student whatever was uploaded.
+
+Normalization is CPU-bound; call it from a worker thread, not the event loop.
+"""
+import base64
+import binascii
+import io
+from typing import AsyncIterator, NamedTuple, Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from backend.security.config import settings
+
+# Magic numbers of the accepted upload formats
+UPLOAD_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+# Pillow format names for the types above, plus WebP (RIFF....WEBP)
+_PILLOW_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+_OUTPUT_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+# Base64 characters decoded per step; a multiple of 4 so chunks decode independently
+_CHUNK_CHARS = 64 * 1024
+_WHITESPACE = (" ", "\n", "\r", "\t")
+# Enough to tell every format above apart
+_SNIFF_BYTES = 12
+
+
+class PhotoUpload(NamedTuple):
+    data: bytes
+    media_type: str
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Content type from the first bytes of a file, or None if it isn't an accepted image."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return next((kind for signature, kind in UPLOAD_SIGNATURES if head.startswith(signature)), None)
+
+
+def _too_large(max_bytes: int) -> ValueError:
+    return ValueError(f"Image exceeds the maximum size of {max_bytes / (1024 * 1024):.3g}MB")
+
+
+class UploadReader:
+    """
+    Collects an upload chunk by chunk, rejecting it (ValueError) as soon as
+    it is over max_bytes or its first bytes aren't a known image format.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes or settings.PHOTO_MAX_UPLOAD_BYTES
+        self.media_type: Optional[str] = None
+        self._buffer = bytearray()
+
+    def feed(self, chunk: bytes) -> None:
+        if len(self._buffer) + len(chunk) > self.max_bytes:
+            raise _too_large(self.max_bytes)
+        self._buffer += chunk
+        if self.media_type is None and len(self._buffer) >= _SNIFF_BYTES:
+            self._sniff()
+
+    def _sniff(self) -> None:
+        self.media_type = sniff_image_type(bytes(self._buffer[:_SNIFF_BYTES]))
+        if self.media_type is None:
+            raise ValueError("Unsupported image format. Use JPG, PNG, GIF or WebP.")
+
+    def finish(self) -> PhotoUpload:
+        if self.media_type is None:
+            if len(self._buffer) < _SNIFF_BYTES:
+                raise ValueError("Image data too small to be valid")
+            self._sniff()
+        return PhotoUpload(bytes(self._buffer), self.media_type)
+
+
+def decode_upload(image: str, max_bytes: Optional[int] = None) -> PhotoUpload:
+    """
+    Decode a base64 image (data URL or bare base64) in chunks.
+
+    Raises:
+        ValueError: If the data is not valid base64, too large, or not an image.
+    """
+    if "," in image:
+        header, encoded = image.split(",", 1)
+        if not header.startswith("data:image/") or not header.endswith(";base64"):
+            raise ValueError("Invalid image data format. Must be a valid image data URL.")
+    else:
+        encoded = image
+    # Line-wrapped base64 would misalign the chunks (a substring test is far faster than a regex)
+    if any(space in encoded for space in _WHITESPACE):
+        encoded = "".join(encoded.split())
+
+    reader = UploadReader(max_bytes)
+    # Every 4 characters are 3 bytes: reject oversized uploads without decoding anything
+    if len(encoded) // 4 * 3 - encoded[-2:].count("=") > reader.max_bytes:
+        raise _too_large(reader.max_bytes)
+    try:
+        for start in range(0, len(encoded), _CHUNK_CHARS):
+            reader.feed(base64.b64decode(encoded[start:start + _CHUNK_CHARS], validate=True))
+    except binascii.Error as e:
+        raise ValueError(f"Invalid base64 image data: {str(e)}")
+    return reader.finish()
+
+
+async def read_upload(chunks: AsyncIterator[bytes], max_bytes: Optional[int] = None) -> PhotoUpload:
+    """Collect a streamed (e.g. multipart) upload, validating it as it arrives."""
+    reader = UploadReader(max_bytes)
+    async for chunk in chunks:
+        reader.feed(chunk)
+    return reader.finish()
+
+
+def normalize_photo(upload: PhotoUpload) -> PhotoUpload:
+    """
+    Re-encode a validated upload as PHOTO_FORMAT at PHOTO_QUALITY, no larger
+    than PHOTO_MAX_DIMENSION on its longest side, with EXIF orientation
+    applied and metadata dropped.
+
+    Raises:
+        ValueError: If the image can't be decoded or has too many pixels.
+    """
+    output_format = settings.PHOTO_FORMAT.upper()
+    limit = settings.PHOTO_MAX_DIMENSION
+    try:
+        with Image.open(io.BytesIO(upload.data), formats=_PILLOW_FORMATS) as source:
+            # Checked from the header, before any pixel data is decoded
+            if source.width * source.height > settings.PHOTO_MAX_PIXELS:
+                raise ValueError(f"Image is too large ({source.width}x{source.height} pixels)")
+            # draft() lets JPEG decode straight at a reduced scale
+            source.draft("RGB", (limit, limit))
+            picture = ImageOps.exif_transpose(source)
+            picture.thumbnail((limit, limit), Image.LANCZOS)
+    except UnidentifiedImageError:
+        raise ValueError("Invalid image: the file could not be decoded")
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Invalid image: {str(e)}")
+
+    if picture.mode in ("RGBA", "LA", "P"):
+        # Flatten transparent areas onto white
+        picture = picture.convert("RGBA")
+        background = Image.new("RGB", picture.size, "white")
+        background.paste(picture, mask=picture.getchannel("A"))
+        picture = background
+    output = io.BytesIO()
+    picture.convert("RGB").save(output, output_format, quality=settings.PHOTO_QUALITY, optimize=True)
+    return PhotoUpload(output.getvalue(), _OUTPUT_TYPES[output_format])
+
+
+def prepare_photo(image: str) -> PhotoUpload:
+    """Decode, validate and normalize a base64 upload."""
+    return normalize_photo(decode_upload(image))
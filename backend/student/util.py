@@ -0,0 +1,115 @@
+import base64
+import binascii
+import hashlib
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from backend.qrcode.matrix import pack_matrix
+from backend.qrcode.qservice import QRService
+from backend.security.config import settings
+from backend.student.blobstore import photo_store
+from backend.student.model import Student
+from backend.student.thumbnails import make_thumbnails
+from backend.student.upload import PhotoUpload, sniff_image_type
+
+# ECC level used for the QR codes stored on student records
+STUDENT_QR_ECC = "Q"
+# Student URLs are mostly alphanumeric / numeric once the host is upper-cased,
+# so segment-optimized encoding usually saves a version or more
+STUDENT_QR_OPTIMIZE = True
+
+_qr_service = QRService(engine=settings.QR_ENGINE)
+
+
+def student_public_url(matric: str) -> str:
+    """Canonical URL of a student's public details page."""
+    return f"{settings.PUBLIC_BASE_URL.rstrip('/')}/student/{matric}"
+
+
+def encode_student_qr(student: Student) -> None:
+    """
+    Encode the student's public URL and store the bit-packed module matrix,
+    version and ECC level on the row. Does nothing if the stored matrix
+    already encodes the current URL.
+    """
+    content = student_public_url(student.Matric)
+    if student.qr_matrix is not None and student.qr_content == content:
+        return
+
+    encoded = _qr_service.encode_matrix(content, STUDENT_QR_ECC, STUDENT_QR_OPTIMIZE)
+    student.qr_content = content
+    student.qr_matrix = pack_matrix(encoded.modules)
+    student.qr_version = encoded.version
+    student.qr_ecc = encoded.error_correction
+
+
+class StudentImage(NamedTuple):
+    media_type: str
+    etag: str
+    data: Optional[bytes] = None  # legacy photos decoded from the image column
+    path: Optional[Path] = None  # photos in the blob store
+
+
+def decode_image_data(image: str) -> StudentImage:
+    """
+    Decode a stored image (a data URL, or bare base64) into its bytes,
+    content type and a strong ETag.
+
+    Raises:
+        ValueError: If the stored data is not valid base64.
+    """
+    media_type = None
+    if ',' in image:
+        header, encoded = image.split(',', 1)
+        if header.startswith('data:') and ';' in header:
+            media_type = header[5:header.index(';')]
+    else:
+        encoded = image
+    try:
+        data = base64.b64decode(encoded)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 image data: {str(e)}")
+    if not media_type:
+        media_type = sniff_image_type(data[:12]) or "application/octet-stream"
+    # The blob store digest is the same hash, so the ETag survives the migration
+    return StudentImage(media_type, f'"{hashlib.sha256(data).hexdigest()}"', data=data)
+
+
+def student_etag(student: Student) -> str:
+    """Strong ETag of a student record: its id and row version."""
+    return f'"{student.id}.{student.version}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match (or If-Match) header value against a strong ETag."""
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def set_student_photo(student: Student, photo: Optional[PhotoUpload]) -> None:
+    """
+    Save a normalized photo (see backend/student/upload.py) and its
+    thumbnails to the blob store and point the row at it, or clear the
+    photo when there is none. The inline image column is emptied either way.
+    """
+    if photo:
+        student.photo_hash = photo_store.put(photo.data)
+        student.photo_type = photo.media_type
+        make_thumbnails(student.photo_hash, photo.data)
+    else:
+        student.photo_hash = None
+        student.photo_type = None
+    student.image = None
+
+
+def student_filter(query, course: Optional[str] = None, level: Optional[str] = None, section: Optional[str] = None):
+    """Apply the optional course / level / section filters to a Student query."""
+    if course:
+        query = query.filter(Student.course == course)
+    if level:
+        query = query.filter(Student.level == level)
+    if section:
+        query = query.filter(Student.section == section)
+    return query
@@ -1,17 +1,22 @@
 import os
-from fastapi import FastAPI, Request, Depends
+from typing import Optional
+from fastapi import FastAPI, Request, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from backend.admin.adminservice import AdminStudentService
-from backend.database.config import get_db
+from backend.database.config import SessionLocal, async_engine, get_async_db, replicas
+from backend.database.routing import replica_sticky_middleware
 from backend.security.config import settings
 from fastapi.exceptions import RequestValidationError, HTTPException
 from backend.api import QRroute, admin, student
 from starlette.middleware.base import BaseHTTPMiddleware
 from backend.database.base import init_database, test_database_connection
+from backend.student.pages import make_student_page, not_modified_since, student_pages
+from backend.student.suggest import load_suggest_index
+from backend.student.util import etag_matches
 from backend.security.exceptions import(
     custom_exception_handler,
     custom_validation_exception_handler,
@@ -85,6 +90,11 @@ def create_application() -> FastAPI:
     app.add_middleware(BaseHTTPMiddleware, dispatch=logging_middleware)
     app.add_middleware(PasswordChangeMiddleware)
     app.add_middleware(BaseHTTPMiddleware, dispatch=authentication_middleware)  # Auth first
+    if replicas:
+        # Outermost, so the sessions of the middleware above are routed too
+        app.add_middleware(
+            BaseHTTPMiddleware, dispatch=replica_sticky_middleware(settings.DATABASE_REPLICA_STICKY_SECONDS)
+        )
     # Frontend paths setup
     frontend_path = os.path.join(os.path.dirname(__file__), "frontend")
     
@@ -140,14 +150,52 @@ def create_application() -> FastAPI:
         """Serve search students page"""
         search_file = os.path.join(frontend_path, "search_students.html")
         return FileResponse(search_file)
+    @app.get("/student/{student_matric:path}/image", include_in_schema=False)
+    async def student_details_image(
+        student_matric: str,
+        size: Optional[int] = Query(None, ge=1),
+        if_none_match: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_async_db)
+    ):
+        """Photo shown on the public student page"""
+        return await admin.student_image_response(db, student_matric, if_none_match, "public, max-age=300", size)
+
     @app.get("/student/{student_matric:path}")
-    async def student_details(request: Request, student_matric: str, db: Session = Depends(get_db)):
-        service = AdminStudentService(db)
-        try:
-          student = service.get_student_by_id(student_matric)
-        except Exception as e:
+    async def student_details(
+        request: Request,
+        student_matric: str,
+        if_none_match: Optional[str] = Header(None),
+        if_modified_since: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_async_db)
+    ):
+        """Public student page (the QR code target), rendered once per student version"""
+        page = student_pages.lookup(student_matric)
+        if page == "missing":
             raise HTTPException(status_code=404, detail="Student not found")
-        return templates.TemplateResponse("student_details.html", {"request": request, "student": student})
+        if page is None:
+            generation = student_pages.generation
+            try:
+                student = await AdminStudentService(db).get_current_student(student_matric)
+            except Exception as e:
+                if isinstance(e, HTTPException) and e.status_code == 404:
+                    student_pages.put_missing(student_matric, generation)
+                raise HTTPException(status_code=404, detail="Student not found")
+            page = student_pages.cached(student_matric, student.version)
+            if page is None:
+                body = templates.get_template("student_details.html").render(request=request, student=student)
+                page = make_student_page(student.version, body.encode("utf-8"))
+                student_pages.put(student_matric, page, generation)
+
+        headers = {
+            "ETag": page.etag,
+            "Last-Modified": page.last_modified,
+            "Cache-Control": f"public, max-age={settings.STUDENT_PAGE_MAX_AGE}",
+        }
+        if etag_matches(if_none_match, page.etag) or (
+            if_none_match is None and not_modified_since(if_modified_since, page.last_modified)
+        ):
+            return Response(status_code=304, headers=headers)
+        return Response(content=page.body, media_type="text/html; charset=utf-8", headers=headers)
 
     
     # Main index route
@@ -167,10 +215,21 @@ app = create_application()
 async def startup_event():
     """Initialize application on startup"""
     try:
-        init_database()
+        await init_database()
         if not test_database_connection():
             logger.error("Failed to connect to database during startup")
             raise Exception("Database connection failed")
+        # Reads stay on the primary until a replica passes its first check
+        await replicas.start(settings.DATABASE_REPLICA_CHECK_INTERVAL)
+        try:
+            # Type-ahead index; suggestions come from the database until it is built
+            with SessionLocal() as db:
+                load_suggest_index(db)
+        except Exception as e:
+            logger.error(f"Failed to build the suggestion index: {e}")
+        if QRroute.qr_pool is not None:
+            # Warm start: spawn the QR workers before the first request
+            QRroute.qr_pool.start()
         logger.info("Application startup complete")
     except Exception as e:
         logger.error(f"Application startup failed: {e}")
@@ -180,6 +239,10 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on application shutdown"""
     try:
+        if QRroute.qr_pool is not None:
+            QRroute.qr_pool.shutdown()
+        await replicas.close()
+        await async_engine.dispose()
         logger.info("Application shutdown complete")
     except Exception as e:
         logger.error(f"Application shutdown failed: {e}")